@@ -1,15 +1,24 @@
 """CrewAI Agents package for medical call center"""
 
-from .call_center_crew import (
-    consultation_agent,
-    appointment_agent,
-    service_info_agent,
-    create_call_center_crew
-)
+from .call_center_crew import create_call_center_crew, get_agent, get_llm
+from .crew_pool import CrewPool, CrewPoolExhausted, KickoffCancelled, get_crew_pool
 
 __all__ = [
     "consultation_agent",
     "appointment_agent",
     "service_info_agent",
-    "create_call_center_crew"
+    "create_call_center_crew",
+    "get_agent",
+    "get_llm",
+    "CrewPool",
+    "CrewPoolExhausted",
+    "KickoffCancelled",
+    "get_crew_pool"
 ]
+
+
+def __getattr__(name: str):
+    # Agents are built lazily; see call_center_crew.get_agent
+    if name in ("consultation_agent", "appointment_agent", "service_info_agent"):
+        return get_agent(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,102 +1,307 @@
-"""CrewAI Agents for medical call center with Ollama"""
+"""CrewAI Agents for medical call center with Ollama
 
-from crewai import Agent, Task, Crew
-from crewai_tools import tool
-from langchain_ollama import OllamaLLM
-from typing import Optional
+crewai, crewai_tools and langchain_ollama are imported, and the LLM, tools and
+agents built, on first use rather than at import time, so the API starts fast
+and still starts when Ollama is unreachable.
+"""
+
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional
 import logging
 import os
+import threading
+
+from ..config import ISSUE_ROUTING, settings
+from ..metrics import instrument_tool
+
+if TYPE_CHECKING:
+    from crewai import Agent, Crew
 
 logger = logging.getLogger(__name__)
 
-# Initialize Ollama LLM
 ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 ollama_model = os.getenv("OLLAMA_MODEL", "mistral")
 
-logger.info(f"Initializing Ollama LLM with model: {ollama_model}")
-logger.info(f"Ollama Base URL: {ollama_base_url}")
 
-llm = OllamaLLM(
-    model=ollama_model,
-    base_url=ollama_base_url,
-    temperature=0.7,
-    top_p=0.9
-)
+def get_llm(model: Optional[str] = None):
+    """Shared Ollama LLM for `model`, OLLAMA_MODEL by default"""
+    return _build_llm(model or ollama_model)
+
+
+@lru_cache(maxsize=None)
+def _build_llm(model: str):
+    import httpx
+    from langchain_ollama import OllamaLLM
+
+    logger.info(f"Initializing Ollama LLM with model: {model}")
+    logger.info(f"Ollama Base URL: {ollama_base_url}")
+
+    # One shared HTTP connection pool per model for every agent, with the model kept loaded between calls
+    return OllamaLLM(
+        model=model,
+        base_url=ollama_base_url,
+        temperature=0.7,
+        top_p=0.9,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
+        client_kwargs={
+            "timeout": settings.OLLAMA_REQUEST_TIMEOUT,
+            "limits": httpx.Limits(
+                max_connections=settings.OLLAMA_POOL_SIZE,
+                max_keepalive_connections=settings.OLLAMA_POOL_SIZE
+            )
+        }
+    )
+
+
+# Tools for agents (plain functions, wrapped as CrewAI tools by get_tools)
+def _describe_slots(slots) -> str:
+    return "; ".join(f"{slot.doctor_id} on {slot.date} at {slot.time}" for slot in slots) or "none in the booking horizon"
+
+
+def check_doctor_availability(date: str, time: str, doctor_id: Optional[str] = None,
+                              specialty: Optional[str] = None) -> str:
+    """Check doctor availability for a specific date and time; lists the next free slots otherwise"""
+    from ..scheduling import get_scheduler, parse_when
+
+    try:
+        start = parse_when(date, time)
+    except ValueError:
+        return f"Could not understand the date/time {date} {time}. Use YYYY-MM-DD and HH:MM."
+    scheduler = get_scheduler()
+    if doctor_id is not None:
+        if scheduler.is_free(doctor_id, start):
+            return f"Doctor {doctor_id} is available on {date} at {time}. Status: Available"
+        slots = scheduler.find_slots(doctor_id=doctor_id, after=start, limit=3)
+        return f"Doctor {doctor_id} is not available on {date} at {time}. Next free slots: {_describe_slots(slots)}"
+    slots = scheduler.find_slots(specialty=specialty, after=start, limit=3)
+    if slots and slots[0].start == start:
+        return f"Doctor {slots[0].doctor_id} is available on {date} at {time}. Status: Available"
+    return f"No doctor is available on {date} at {time}. Next free slots: {_describe_slots(slots)}"
 
 
-# Tools for agents
-@tool
-def check_doctor_availability(date: str, time: str, doctor_id: Optional[str] = None) -> str:
-    """Check doctor availability for a specific date and time"""
-    return f"Doctor availability checked for {date} at {time}. Status: Available"
+def book_appointment(patient_name: str, doctor_id: str, date: str, time: str,
+                     phone_number: Optional[str] = None) -> str:
+    """Book an appointment with a doctor for the caller (their phone number is used when none is given)"""
+    from pydantic import ValidationError
 
+    from ..models import PatientInfo
+    from ..scheduling import SlotUnavailable, get_scheduler, parse_when
 
-@tool
-def book_appointment(patient_name: str, doctor_id: str, date: str, time: str) -> str:
-    """Book an appointment with a doctor"""
-    return f"Appointment booked for {patient_name} with doctor {doctor_id} on {date} at {time}"
+    try:
+        start = parse_when(date, time)
+    except ValueError:
+        return f"Could not understand the date/time {date} {time}. Use YYYY-MM-DD and HH:MM."
+    phone_number = phone_number or getattr(_kickoff, "phone_number", None)
+    if not phone_number:
+        return "Could not book: the patient's phone number is needed to book an appointment."
+    try:
+        patient = PatientInfo(name=patient_name, phone_number=phone_number)
+    except ValidationError:
+        return f"Could not book: '{patient_name}' / '{phone_number}' is not a valid patient name and phone number."
+    scheduler = get_scheduler()
+    try:
+        appointment = scheduler.book(doctor_id, start, patient)
+    except KeyError:
+        return f"Unknown doctor {doctor_id}"
+    except SlotUnavailable as e:
+        slots = scheduler.find_slots(doctor_id=doctor_id, after=start, limit=3)
+        return f"Could not book: {e}. Next free slots: {_describe_slots(slots)}"
+    return (f"Appointment booked for {patient_name} with doctor {doctor_id} on {appointment.date} at "
+            f"{appointment.time}. Confirmation number: {appointment.confirmation_number}")
 
 
-@tool
 def get_service_info(service_type: str) -> str:
-    """Get information about medical services"""
-    services = {
-        "consultation": "General consultation - 30 mins - Free initial",
-        "dental": "Dental checkup - 45 mins - $50",
-        "lab_tests": "Lab tests - 15 mins - $100",
-        "follow_up": "Follow-up visit - 20 mins - $30",
-        "physical": "Physical examination - 30 mins - $60"
-    }
-    return services.get(service_type, "Service not found")
+    """Get information about medical services by id, name, specialty or a close spelling"""
+    from ..service_catalog import describe_service, service_catalog
+
+    catalog = service_catalog.current()
+    matches = catalog.search(service_type, limit=3)
+    if not matches:
+        return f"Service not found. Available services: {', '.join(service.name for service in catalog.services)}"
+    return "; ".join(describe_service(service) for service in matches)
 
 
-@tool
 def schedule_callback(patient_name: str, phone: str, callback_time: str) -> str:
     """Schedule a callback for the patient"""
     return f"Callback scheduled for {patient_name} ({phone}) at {callback_time}"
 
 
+# The kickoff running on this thread: its caller's phone number and the tools called so far
+_kickoff = threading.local()
+
+
+@contextmanager
+def kickoff_scope(call_data: dict) -> Iterator[List[str]]:
+    """
+    Run a kickoff for `call_data` on this thread: book_appointment books for
+    the caller's phone number, and the yielded list collects the names of
+    the tools called inside the block, in call order.
+    """
+    calls: List[str] = []
+    previous = getattr(_kickoff, "calls", None), getattr(_kickoff, "phone_number", None)
+    _kickoff.calls, _kickoff.phone_number = calls, call_data.get("phone_number")
+    try:
+        yield calls
+    finally:
+        _kickoff.calls, _kickoff.phone_number = previous
+
+
+def _track_tool(func: Callable) -> Callable:
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        calls = getattr(_kickoff, "calls", None)
+        if calls is not None:
+            calls.append(func.__name__)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def get_tools() -> Dict[str, object]:
+    """Wrap the tool functions as timed CrewAI tools that kickoff_scope can see"""
+    from crewai_tools import tool
+
+    return {
+        func.__name__: tool(instrument_tool(_track_tool(func)))
+        for func in (check_doctor_availability, book_appointment, get_service_info, schedule_callback)
+    }
+
+
 # Define Agents
-consultation_agent = Agent(
-    role="Medical Consultation Coordinator",
-    goal="Guide patients through medical consultations and help schedule appropriate doctor appointments",
-    backstory="""You are an experienced medical consultation coordinator with deep knowledge of patient care 
-    processes and medical services. You listen carefully to patient symptoms and concerns, ask clarifying questions, 
-    and recommend appropriate medical services and doctor specialties.""",
-    tools=[check_doctor_availability, schedule_callback],
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-
-appointment_agent = Agent(
-    role="Appointment Booking Specialist",
-    goal="Efficiently book and manage patient appointments with doctors and medical services",
-    backstory="""You are a professional appointment scheduler with expertise in calendar management and 
-    patient scheduling. You confirm patient availability, check doctor schedules, and book appointments 
-    with attention to detail. You always provide confirmation numbers and send reminders.""",
-    tools=[check_doctor_availability, book_appointment],
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-
-service_info_agent = Agent(
-    role="Medical Services Information Specialist",
-    goal="Provide comprehensive, accurate information about available medical services, procedures, and costs",
-    backstory="""You are knowledgeable about all medical services offered, procedures, duration, costs, 
-    and availability. You explain services clearly to patients, answer questions about benefits and 
-    contraindications, and help patients choose the right services for their needs.""",
-    tools=[get_service_info],
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-
-def create_call_center_crew(call_data: dict) -> Crew:
+def build_consultation_agent(model: Optional[str] = None) -> "Agent":
+    from crewai import Agent
+
+    tools = get_tools()
+    return Agent(
+        role="Medical Consultation Coordinator",
+        goal="Guide patients through medical consultations and help schedule appropriate doctor appointments",
+        backstory="""You are an experienced medical consultation coordinator with deep knowledge of patient care 
+        processes and medical services. You listen carefully to patient symptoms and concerns, ask clarifying questions, 
+        and recommend appropriate medical services and doctor specialties.""",
+        tools=[tools["check_doctor_availability"], tools["schedule_callback"]],
+        llm=get_llm(model),
+        verbose=True,
+        allow_delegation=False
+    )
+
+
+def build_appointment_agent(model: Optional[str] = None) -> "Agent":
+    from crewai import Agent
+
+    tools = get_tools()
+    return Agent(
+        role="Appointment Booking Specialist",
+        goal="Efficiently book and manage patient appointments with doctors and medical services",
+        backstory="""You are a professional appointment scheduler with expertise in calendar management and 
+        patient scheduling. You confirm patient availability, check doctor schedules, and book appointments 
+        with attention to detail. You always provide confirmation numbers and send reminders.""",
+        tools=[tools["check_doctor_availability"], tools["book_appointment"]],
+        llm=get_llm(model),
+        verbose=True,
+        allow_delegation=False
+    )
+
+
+def build_service_info_agent(model: Optional[str] = None) -> "Agent":
+    from crewai import Agent
+
+    tools = get_tools()
+    return Agent(
+        role="Medical Services Information Specialist",
+        goal="Provide comprehensive, accurate information about available medical services, procedures, and costs",
+        backstory="""You are knowledgeable about all medical services offered, procedures, duration, costs, 
+        and availability. You explain services clearly to patients, answer questions about benefits and 
+        contraindications, and help patients choose the right services for their needs.""",
+        tools=[tools["get_service_info"]],
+        llm=get_llm(model),
+        verbose=True,
+        allow_delegation=False
+    )
+
+
+AGENT_BUILDERS = {
+    "consultation_agent": build_consultation_agent,
+    "appointment_agent": build_appointment_agent,
+    "service_info_agent": build_service_info_agent,
+}
+
+
+@lru_cache(maxsize=None)
+def get_agent(agent_name: str, model: Optional[str] = None) -> "Agent":
+    """Shared agent instance used by create_call_center_crew"""
+    return AGENT_BUILDERS[agent_name](model)
+
+
+def __getattr__(name: str):
+    # consultation_agent, appointment_agent and service_info_agent are built on first access
+    if name in AGENT_BUILDERS:
+        return get_agent(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Task templates per issue type; {placeholders} are filled from call inputs at kickoff
+TASK_TEMPLATES = {
+    "consultation": (
+        "Handle consultation request for patient: {patient_name}. Issue: {description}\n\n{context}",
+        "Consultation guidance and recommended next steps"
+    ),
+    "appointment": (
+        "Book appointment for patient: {patient_name} (phone {phone_number}) on {preferred_date}. "
+        "Request: {description}\n\n{context}",
+        "Appointment confirmation with details and confirmation number"
+    ),
+    "service_info": (
+        "Provide service information for patient inquiry: {description}\n\n{context}",
+        "Detailed service information and recommendations"
+    ),
+    "other": (
+        "Handle general inquiry for patient: {patient_name}. Description: {description}\n\n{context}",
+        "Guidance and recommended actions"
+    ),
+}
+
+
+def crew_inputs(call_data: dict) -> dict:
+    """Per-call values interpolated into the task templates"""
+    from ..context import FIRST_MESSAGE
+
+    return {
+        "patient_name": call_data.get("patient_name") or "Patient",
+        "description": call_data.get("description") or "Not specified",
+        "preferred_date": call_data.get("preferred_date") or "available date",
+        "phone_number": call_data.get("phone_number") or "not given",
+        # Rendered by ConversationContextManager, the same block the streaming prompt gets
+        "context": call_data.get("context") or FIRST_MESSAGE,
+    }
+
+
+def build_crew(issue_type: str, agent: Optional["Agent"] = None, inputs: Optional[dict] = None,
+               model: Optional[str] = None) -> "Crew":
+    """
+    Build a single-task crew for an issue type routed through ISSUE_ROUTING.
+
+    Without `inputs` the task description keeps its {placeholders} so the crew
+    can be reused with `crew.kickoff(inputs=...)`. `model` picks the Ollama
+    model a newly built agent runs on.
+    """
+    from crewai import Crew, Task
+
+    agent_name = ISSUE_ROUTING.get(issue_type, ISSUE_ROUTING["other"])
+    description, expected_output = TASK_TEMPLATES.get(issue_type, TASK_TEMPLATES["other"])
+    if inputs is not None:
+        description = description.format(**inputs)
+    agent = agent or AGENT_BUILDERS[agent_name](model)
+    return Crew(
+        agents=[agent],
+        tasks=[Task(description=description, agent=agent, expected_output=expected_output)],
+        verbose=settings.CREW_VERBOSE,
+        memory=settings.CREW_MEMORY,
+        cache=settings.CREW_CACHE
+    )
+
+
+def create_call_center_crew(call_data: dict) -> "Crew":
     """
     Create a dynamic crew based on the type of call
     
@@ -107,52 +312,5 @@ def create_call_center_crew(call_data: dict) -> Crew:
         Crew object configured for the call type
     """
     issue_type = call_data.get("issue_type", "other")
-    patient_name = call_data.get("patient_name", "Patient")
-    
-    if issue_type == "consultation":
-        tasks = [
-            Task(
-                description=f"Handle consultation request for patient: {patient_name}. Issue: {call_data.get('description', 'General consultation')}",
-                agent=consultation_agent,
-                expected_output="Consultation guidance and recommended next steps"
-            )
-        ]
-        agents = [consultation_agent]
-    elif issue_type == "appointment":
-        tasks = [
-            Task(
-                description=f"Book appointment for patient: {patient_name} on {call_data.get('preferred_date', 'available date')}",
-                agent=appointment_agent,
-                expected_output="Appointment confirmation with details and confirmation number"
-            )
-        ]
-        agents = [appointment_agent]
-    elif issue_type == "service_info":
-        tasks = [
-            Task(
-                description=f"Provide service information for patient inquiry: {call_data.get('description', 'general inquiry')}",
-                agent=service_info_agent,
-                expected_output="Detailed service information and recommendations"
-            )
-        ]
-        agents = [service_info_agent]
-    else:
-        # Default: use consultation agent
-        tasks = [
-            Task(
-                description=f"Handle general inquiry for patient: {patient_name}. Description: {call_data.get('description', 'Not specified')}",
-                agent=consultation_agent,
-                expected_output="Guidance and recommended actions"
-            )
-        ]
-        agents = [consultation_agent]
-    
-    crew = Crew(
-        agents=agents,
-        tasks=tasks,
-        verbose=True,
-        memory=True,
-        cache=True
-    )
-    
-    return crew
+    agent = get_agent(ISSUE_ROUTING.get(issue_type, ISSUE_ROUTING["other"]), call_data.get("model"))
+    return build_crew(issue_type, agent=agent, inputs=crew_inputs(call_data))
@@ -0,0 +1,189 @@
+"""Reusable crew instances per issue type"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..config import ISSUE_ROUTING, settings
+
+logger = logging.getLogger(__name__)
+
+
+class CrewPoolExhausted(RuntimeError):
+    """Raised when no crew for an issue type frees up within the wait timeout"""
+
+
+class KickoffCancelled(RuntimeError):
+    """Raised inside a kickoff whose caller no longer wants the answer"""
+
+
+class CrewAnswer(str):
+    """A crew's final answer; `tools_used` names the tools the crew called to produce it"""
+    tools_used: Tuple[str, ...] = ()
+
+    @classmethod
+    def of(cls, text: str, tools_used: Sequence[str]) -> "CrewAnswer":
+        answer = cls(text)
+        answer.tools_used = tuple(tools_used)
+        return answer
+
+
+class CrewPool:
+    """
+    Pool of prebuilt crews keyed by issue type and model.
+
+    Each crew has its own agent instances and is handed to one call at a time;
+    per-call values are passed through `kickoff(inputs=...)`, so the
+    expensive Crew/Task/memory setup happens once per pooled instance instead
+    of once per call. At most `size` crews exist per issue type and model,
+    which also caps how many calls of that type run at once on the model.
+    Crews for the default model are built with `factory(issue_type)`, others
+    with `factory(issue_type, model=model)`.
+    """
+
+    def __init__(self, factory: Optional[Callable[..., object]] = None, size: int = 2):
+        if factory is None:
+            from .call_center_crew import build_crew
+            factory = build_crew
+        self._factory = factory
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[object]] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "discarded": 0,
+            "construction_seconds": 0.0,
+            "construction_max_seconds": 0.0,
+            "in_use": 0,
+        }
+
+    @staticmethod
+    def pool_key(issue_type: Optional[str], model: Optional[str] = None) -> str:
+        key = issue_type if issue_type in ISSUE_ROUTING else "other"
+        return f"{key}@{model}" if model else key
+
+    def _slots_for(self, key: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.size)
+                self._idle[key] = []
+            return self._slots[key]
+
+    def _build(self, key: str):
+        started = time.perf_counter()
+        issue_type, _, model = key.partition("@")
+        crew = self._factory(issue_type, model=model) if model else self._factory(issue_type)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["construction_seconds"] += elapsed
+            self._stats["construction_max_seconds"] = max(self._stats["construction_max_seconds"], elapsed)
+        logger.info(f"Built crew for '{key}' in {elapsed:.3f}s")
+        return crew
+
+    @contextmanager
+    def acquire(self, issue_type: Optional[str], timeout: Optional[float] = None,
+                model: Optional[str] = None) -> Iterator[object]:
+        """Check out a crew for exclusive use, building one on a pool miss"""
+        key = self.pool_key(issue_type, model)
+        slots = self._slots_for(key)
+        if not slots.acquire(timeout=timeout):
+            raise CrewPoolExhausted(f"No crew available for '{key}' within {timeout}s")
+        try:
+            with self._lock:
+                crew = self._idle[key].pop() if self._idle[key] else None
+                self._stats["hits" if crew is not None else "misses"] += 1
+                self._stats["in_use"] += 1
+            if crew is None:
+                crew = self._build(key)
+            try:
+                yield crew
+            except BaseException:
+                # A failed kickoff may leave task/memory state behind; let the next call rebuild
+                with self._lock:
+                    self._stats["discarded"] += 1
+                raise
+            else:
+                self._reset(crew)
+                with self._lock:
+                    self._idle[key].append(crew)
+            finally:
+                with self._lock:
+                    self._stats["in_use"] -= 1
+        finally:
+            slots.release()
+
+    @staticmethod
+    def _reset(crew) -> None:
+        # Short-term memory must not carry one caller's details into the next call
+        if getattr(crew, "memory", False) and hasattr(crew, "reset_memories"):
+            try:
+                crew.reset_memories(command_type="short")
+            except Exception as e:
+                logger.warning(f"Could not reset crew memory: {str(e)}")
+
+    def kickoff(self, call_data: dict, timeout: Optional[float] = None,
+                cancelled: Optional[threading.Event] = None) -> str:
+        """
+        Run a call through a pooled crew and return the crew's final answer.
+
+        Setting `cancelled` stops the crew at its next agent step with
+        KickoffCancelled; the interrupted crew is discarded, not pooled.
+        `call_data["model"]`, when set, picks the model the crew runs on.
+        The answer is a CrewAnswer listing the tools the crew called.
+        """
+        from .call_center_crew import crew_inputs, kickoff_scope
+
+        with self.acquire(call_data.get("issue_type"), timeout=timeout, model=call_data.get("model")) as crew:
+            if cancelled is None:
+                with kickoff_scope(call_data) as used:
+                    return CrewAnswer.of(str(crew.kickoff(inputs=crew_inputs(call_data))), used)
+            if cancelled.is_set():
+                raise KickoffCancelled("Kickoff cancelled before it started")
+
+            def check_cancelled(_step) -> None:
+                if cancelled.is_set():
+                    raise KickoffCancelled("Kickoff cancelled")
+
+            crew.step_callback = check_cancelled
+            try:
+                with kickoff_scope(call_data) as used:
+                    return CrewAnswer.of(str(crew.kickoff(inputs=crew_inputs(call_data))), used)
+            finally:
+                crew.step_callback = None
+
+    def warm(self, issue_types: Iterable[str] = ISSUE_ROUTING, model: Optional[str] = None) -> None:
+        """Prebuild one crew per issue type (on `model`) so first calls are pool hits"""
+        for issue_type in issue_types:
+            key = self.pool_key(issue_type, model)
+            self._slots_for(key)
+            with self._lock:
+                if self._idle[key]:
+                    continue
+            crew = self._build(key)
+            with self._lock:
+                self._idle[key].append(crew)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = sum(len(crews) for crews in self._idle.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_crew_pool: Optional[CrewPool] = None
+_crew_pool_lock = threading.Lock()
+
+
+def get_crew_pool() -> CrewPool:
+    """Process-wide crew pool sized by CREW_POOL_SIZE"""
+    global _crew_pool
+    with _crew_pool_lock:
+        if _crew_pool is None:
+            _crew_pool = CrewPool(size=settings.CREW_POOL_SIZE)
+        return _crew_pool
@@ -0,0 +1,257 @@
+"""Batch processing of JSONL call records for overnight voicemail/callback replays
+
+Each input line is a CallRequest as JSON (extra fields, such as those in a
+request log, are ignored). Records are planned before anything runs:
+
+- records sharing a phone number form one chain and run in file order, so a
+  caller's turns keep their conversation order;
+- chains are grouped by routing tier, specialty and intent. Template groups
+  run first, and each crew group sends one leader ahead so the rest of the
+  group can be answered from the response cache.
+
+At most `concurrency` chains run at once, and results stream back as JSONL
+lines carrying the input line number and a per-record status. From the
+command line, `--processes` shards chains across processes by phone number
+so CPU-bound template work scales with cores::
+
+    python -m app.batch callbacks.jsonl --processes 4 --output results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import sys
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import settings
+from .executor import CallExecutor, CallQueueFull, CallTimeout
+from .router import CREW, TieredRouter, call_router
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class BatchRecord:
+    line: int
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class _Chain:
+    """One caller's records, in input order"""
+    session: str
+    group: Tuple[str, str, str]
+    records: List[BatchRecord] = field(default_factory=list)
+
+
+def parse_records(lines: Iterable[str]) -> Iterator[BatchRecord]:
+    """Number the non-blank lines of a JSONL stream, keeping parse errors as records"""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield BatchRecord(line_number, error=f"invalid JSON: {e}")
+            continue
+        if not isinstance(data, dict):
+            yield BatchRecord(line_number, error="record is not a JSON object")
+            continue
+        yield BatchRecord(line_number, data=data)
+
+
+def plan_chains(records: Iterable[BatchRecord], router: TieredRouter = call_router,
+                crew_enabled: Optional[bool] = None) -> List[_Chain]:
+    """Chain records per phone number and order the chains by routing group"""
+    chains: Dict[str, _Chain] = {}
+    for record in records:
+        data = record.data or {}
+        session = str(data.get("phone_number") or f"line-{record.line}")
+        chain = chains.get(session)
+        if chain is None:
+            decision = router.decide(str(data.get("issue_type") or ""), data.get("description"), 0, crew_enabled)
+            # Template groups sort ahead of crew groups
+            tier = "1" if decision.tier == CREW else "0"
+            chain = chains[session] = _Chain(session, (tier, decision.specialty, decision.intent))
+        chain.records.append(record)
+    return sorted(chains.values(), key=lambda chain: chain.group)
+
+
+class BatchProcessor:
+    """
+    Runs planned chains through `handler` with bounded parallelism.
+
+    `handler` takes one record's JSON object and returns the result fields;
+    it raises ValueError for invalid records and CallQueueFull/CallTimeout
+    like handle_call. Busy executors are retried after their Retry-After
+    hint, up to `max_retries` times, instead of failing the record.
+    """
+
+    def __init__(self, handler: Handler, concurrency: int = 8, router: TieredRouter = call_router,
+                 max_retries: int = 5):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.router = router
+        self.max_retries = max_retries
+
+    @classmethod
+    def from_settings(cls, handler: Handler, app_settings=settings) -> "BatchProcessor":
+        return cls(handler, concurrency=app_settings.BATCH_CONCURRENCY)
+
+    async def _process(self, record: BatchRecord) -> Dict[str, Any]:
+        if record.error is not None:
+            return {"line": record.line, "status": "invalid", "error": record.error}
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self.handler(record.data)
+                return {"line": record.line, **result}
+            except CallQueueFull as e:
+                if attempt == self.max_retries:
+                    return {"line": record.line, "status": "busy", "error": str(e)}
+                await asyncio.sleep(e.retry_after)
+            except CallTimeout:
+                return {"line": record.line, "status": "timeout", "error": "Call processing timed out"}
+            except ValueError as e:
+                return {"line": record.line, "status": "invalid", "error": str(e)}
+            except Exception as e:
+                logger.error(f"Error processing batch line {record.line}: {str(e)}")
+                return {"line": record.line, "status": "failed", "error": "Error processing call"}
+
+    async def run_chains(self, chains: List[_Chain]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield results in completion order"""
+        results: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        slots = asyncio.Semaphore(self.concurrency)
+        leaders: Dict[Tuple[str, str, str], asyncio.Event] = {}
+
+        async def run_chain(chain: _Chain, follow: Optional[asyncio.Event], lead: Optional[asyncio.Event]):
+            if follow is not None:
+                await follow.wait()
+            async with slots:
+                for record in chain.records:
+                    await results.put(await self._process(record))
+                    if lead is not None:
+                        lead.set()
+                        lead = None
+
+        tasks = []
+        for chain in chains:
+            follow = lead = None
+            if chain.group[0] == "1":
+                follow = leaders.get(chain.group)
+                if follow is None:
+                    lead = leaders[chain.group] = asyncio.Event()
+            tasks.append(asyncio.ensure_future(run_chain(chain, follow, lead)))
+
+        async def close_when_done():
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                await results.put(None)
+
+        closer = asyncio.ensure_future(close_when_done())
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            closer.cancel()
+
+    async def run(self, records: Iterable[BatchRecord]) -> AsyncIterator[Dict[str, Any]]:
+        async for result in self.run_chains(plan_chains(records, self.router)):
+            yield result
+
+
+def _shard(session: str, processes: int) -> int:
+    return zlib.crc32(session.encode("utf-8")) % processes
+
+
+def _run_shard(chains: List[_Chain], concurrency: int, output, forked: bool = False) -> None:
+    from . import main as app_main
+
+    if forked:
+        # Worker threads do not survive fork, so the inherited executor could never run a call
+        app_main.call_executor = CallExecutor.from_settings()
+        app_main.call_recorder.after_fork()
+        app_main.call_ids.after_fork()
+
+    async def run():
+        async for result in BatchProcessor(app_main.handle_batch_record, concurrency).run_chains(chains):
+            output.put(result)
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    asyncio.run(run())
+    # The process may exit as soon as results are read; get recorded turns on disk first
+    app_main.call_recorder.flush()
+    output.put(None)
+
+
+def run_parallel(records: Iterable[BatchRecord], processes: int, concurrency: int) -> Iterator[Dict[str, Any]]:
+    """Process records across `processes` worker processes, yielding results as they finish"""
+    chains = plan_chains(records)
+    if processes == 1:
+        output = queue.Queue()
+        workers = [threading.Thread(target=_run_shard, args=(chains, concurrency, output), daemon=True)]
+    else:
+        shards: List[List[_Chain]] = [[] for _ in range(processes)]
+        for chain in chains:
+            shards[_shard(chain.session, processes)].append(chain)
+        # Fork where available so workers inherit the already-imported app
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        output = context.Queue()
+        workers = [context.Process(target=_run_shard, args=(shard, concurrency, output, True))
+                   for shard in shards if shard]
+    for worker in workers:
+        worker.start()
+    running = len(workers)
+    while running:
+        result = output.get()
+        if result is None:
+            running -= 1
+            continue
+        yield result
+    for worker in workers:
+        worker.join()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of CallRequest records, or - for stdin")
+    parser.add_argument("--output", help="write JSONL results here instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY,
+                        help="callers processed at once per process")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        records = list(parse_records(source))
+    sink = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    counts: Dict[str, int] = {}
+    try:
+        for result in run_parallel(records, max(1, args.processes), args.concurrency):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            sink.write(json.dumps(result) + "\n")
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    print(f"{len(records)} records: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
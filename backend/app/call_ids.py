@@ -0,0 +1,61 @@
+"""Sortable, collision-free per-turn call IDs"""
+
+import secrets
+import threading
+import time
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+
+
+def encode_ulid(value: int) -> str:
+    """A 128-bit value as 26 Crockford base32 characters, most significant first"""
+    chars = []
+    for _ in range(26):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class CallIdGenerator:
+    """
+    ULID-style call IDs: a 48-bit millisecond timestamp followed by 80
+    random bits, so IDs sort by creation time and IDs minted by different
+    workers at the same millisecond do not collide. Within one millisecond
+    (or if the clock steps back) the random part is incremented instead of
+    redrawn, which keeps the IDs of one process strictly increasing.
+    """
+
+    def __init__(self, prefix: str = "CALL-"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms > self._last_ms:
+                self._random = secrets.randbits(_RANDOM_BITS)
+            else:
+                ms = self._last_ms
+                self._random += 1
+                if self._random >> _RANDOM_BITS:
+                    # 2**80 IDs in one millisecond: borrow the next one
+                    ms += 1
+                    self._random = secrets.randbits(_RANDOM_BITS - 1)
+            self._last_ms = ms
+            value = ms << _RANDOM_BITS | self._random
+        return self.prefix + encode_ulid(value)
+
+    def after_fork(self) -> None:
+        """Draw fresh random bits in a forked worker instead of continuing the parent's sequence"""
+        self._lock = threading.Lock()
+        self._last_ms = -1
+
+
+call_ids = CallIdGenerator()
+
+
+def new_call_id() -> str:
+    return call_ids.new()
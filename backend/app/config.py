@@ -18,26 +18,111 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     WORKERS: int = 1
+    SHUTDOWN_GRACE_SECONDS: int = 30  # how long workers drain in-flight calls on SIGTERM
     
     # Ollama Settings (LOCAL LLM)
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "mistral")
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request
+    OLLAMA_POOL_SIZE: int = 10  # keep-alive connections to OLLAMA_BASE_URL
+    OLLAMA_MAX_IN_FLIGHT: int = 4  # concurrent requests sent to Ollama
+    OLLAMA_REQUEST_TIMEOUT: float = 120  # seconds
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 512
+    STREAM_LLM_RESPONSES: bool = False  # streamed turns the router escalates come from Ollama; others use templates
+    
+    # Model Routing (per-turn model choice among AVAILABLE_MODELS)
+    MODEL_ROUTING: bool = False  # pick the model per turn by complexity instead of always OLLAMA_MODEL
+    MODEL_ROUTING_MODELS: Optional[str] = None  # comma-separated AVAILABLE_MODELS keys pulled into Ollama; all by default
+    MODEL_LATENCY_SLO_SECONDS: float = 10  # p95 turn latency above which turns move to a faster model
+    MODEL_LATENCY_WINDOW: int = 20  # recent turns per model the p95 is taken over
+    MODEL_PROBE_SECONDS: float = 30  # a model over its SLO gets one turn this often to re-measure it
     
     # CrewAI Settings
     CREW_VERBOSE: bool = True
     CREW_MEMORY: bool = True
     CREW_CACHE: bool = True
+    CREW_POOL_SIZE: int = 2  # pooled crews (and concurrent kickoffs) per issue type
     
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    METRICS_ENABLED: bool = True  # per-stage timings and counters served on /metrics
+    METRICS_TOGGLE_TOKEN: Optional[str] = None  # bearer token PUT /metrics/enabled requires; unset disables it
     
     # Call Center Settings
     CALL_TIMEOUT: int = 300  # seconds
     MAX_CONCURRENT_CALLS: int = 10
-    ENABLE_CALL_RECORDING: bool = False
+    CALL_QUEUE_SIZE: int = 50  # calls allowed to wait for a free slot before answering 503
+    USE_CREW: bool = False  # answer /api/call/process with the CrewAI crew instead of templates
+    WARMUP_ON_STARTUP: bool = False  # build crews and load the Ollama model before serving
+    ENABLE_CALL_RECORDING: bool = False  # keep every turn in the transcript log under RECORDING_DIR
+    BATCH_CONCURRENCY: int = 8  # callers processed at once by /api/call/batch and app.batch
+    BATCH_MAX_RECORDS: int = 100000  # larger uploads are rejected with 413
+    VOICE_SPECULATION_MIN_CHARS: int = 12  # interim transcripts shorter than this are not speculated on
+    VOICE_SPECULATION_DEBOUNCE_MS: float = 150  # wait for interim text to settle before speculating
+    
+    # Session Storage
+    SESSION_BACKEND: str = "auto"  # memory, sql, or auto (sql when WORKERS > 1)
+    SESSION_DB_URL: str = "sqlite:///./sessions.db"
+    SESSION_MAX_TURNS: int = 50
+    SESSION_MAX_SESSIONS: int = 10000
+    SESSION_IDLE_TTL: int = 1800  # seconds
+    SESSION_MAX_BYTES: Optional[int] = 64 * 1024 * 1024
+    CONTEXT_WINDOW_TURNS: int = 3  # recent turns included verbatim in LLM prompts
+    CONTEXT_MAX_TOKENS: Optional[int] = None  # context budget, defaults to LLM_MAX_TOKENS
+    
+    # Call Recording (append-only transcript log)
+    RECORDING_DIR: str = "./recordings"
+    RECORDING_SEGMENT_BYTES: int = 64 * 1024 * 1024  # segment files are sealed at this size
+    RECORDING_COMMIT_INTERVAL_MS: float = 50  # minimum gap between group commits
+    RECORDING_BATCH_MAX: int = 256  # turns per compressed block; smaller blocks mean faster lookups
+    RECORDING_QUEUE_SIZE: int = 100000  # turns waiting for the writer before new ones are dropped
+    RECORDING_FSYNC: bool = True
+    RECORDING_EXPORT_TOKEN: Optional[str] = None  # bearer token GET /api/recordings requires; unset disables it
+    
+    # Response Cache (crew answers reused for similar requests)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_TTL: int = 3600  # seconds
+    RESPONSE_CACHE_SIMILARITY: float = 0.85  # cosine similarity needed for a hit
+    
+    # Idempotent Retries (Idempotency-Key header on the call, stream and batch endpoints)
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # stored responses kept per worker, oldest dropped first
+    IDEMPOTENCY_TTL: int = 86400  # seconds a stored response can be replayed
+    IDEMPOTENCY_BACKEND: str = "auto"  # memory, sql, or auto (sql when WORKERS > 1)
+    IDEMPOTENCY_DB_URL: str = "sqlite:///./sessions.db"  # keys shared by the workers
+    IDEMPOTENCY_LEASE_SECONDS: float = 30  # a running key is taken over after its worker stops renewing it this long
+    
+    # Tiered Routing (templates first, crew only when needed)
+    ROUTER_CONFIDENCE_THRESHOLD: float = 0.5  # below this the call escalates to the crew
+    SPECULATIVE_AGENTS: bool = False  # run the top candidate agents at once when the issue type is ambiguous
+    SPECULATIVE_TOP_K: int = 3  # most agents run for one call
+    SPECULATIVE_MARGIN: float = 0.25  # candidates scoring within this of the best one are run too
+    SPECULATIVE_BUDGET_SECONDS: float = 60  # agent time a call may spend beyond its primary agent
+    SPECULATIVE_MIN_ANSWER_CHARS: int = 20  # shorter answers fail validation
+    
+    # Specialty Classification
+    SPECIALTY_KEYWORDS_FILE: Optional[str] = None  # JSON {specialty: [keywords]}
+    DEFAULT_SPECIALTY: str = "general"
+    
+    # Deterministic Response Templates
+    RESPONSE_TEMPLATES_FILE: Optional[str] = None  # JSON {locale: {...}} in the RESPONSE_TEMPLATES shape
+    RESPONSE_LOCALE: str = "en"
+    
+    # Service Catalog
+    SERVICE_CATALOG_FILE: Optional[str] = None  # JSON [{id, name, specialty, duration, cost, description}]
+    SERVICE_CATALOG_RELOAD_SECONDS: float = 5  # how often SERVICE_CATALOG_FILE is checked for changes
+    SERVICE_CATALOG_MAX_AGE: int = 60  # Cache-Control max-age for /api/services, in seconds
+    
+    # Appointment Scheduling
+    SCHEDULE_DB_URL: Optional[str] = "sqlite:///./appointments.db"  # None keeps bookings in memory only
+    SCHEDULE_DOCTORS_FILE: Optional[str] = None  # JSON [{id, name, specialty, working_days}]
+    SCHEDULE_HORIZON_DAYS: int = 90  # bookable days from today
+    SCHEDULE_DAY_START: str = "08:00"
+    SCHEDULE_DAY_END: str = "18:00"
+    SCHEDULE_SLOT_MINUTES: int = 15  # booking granularity
+    SCHEDULE_DEFAULT_DURATION: int = 30  # minutes, when no service is given
     
     class Config:
         env_file = ".env"
@@ -82,6 +167,117 @@ ISSUE_ROUTING = {
 }
 
 
+# How well the deterministic templates (specialty booking offers, greetings)
+# fit calls handled by each agent; the router scales template confidence by it.
+# Billing and service questions need an answer, not a booking offer.
+TEMPLATE_AGENT_FIT = {
+    "consultation_agent": 1.0,
+    "appointment_agent": 1.0,
+    "service_info_agent": 0.4
+}
+
+
+# Specialty keyword table used when SPECIALTY_KEYWORDS_FILE is not set.
+# Order matters: when several specialties match, the earliest one wins.
+SPECIALTY_KEYWORDS = {
+    "cardiology": ["heart", "cardiac", "cardiologist", "chest pain", "heart disease"],
+    "gastroenterology": ["stomach", "digestive", "abdominal", "gut", "gastro"],
+    "neurology": ["headache", "migraine", "brain", "neurologist", "headaches"],
+    "orthopedics": ["bone", "joint", "fracture", "arthritis", "knee", "back pain"],
+    "general": ["appointment", "consultation", "checkup", "visit"]
+}
+
+
+# Deterministic responses per locale, extended by RESPONSE_TEMPLATES_FILE.
+# Specialties answer with "book" when the description contains a booking cue
+# and "default" otherwise; other calls get the general "greeting" on the first
+# turn and "followup" after. A template's next_steps is "schedule" when its
+# text contains a schedule cue, unless it names one explicitly.
+RESPONSE_TEMPLATES = {
+    "en": {
+        "fallback_name": "there",
+        "booking_cues": ["appointment", "book"],
+        "schedule_cues": ["appointment"],
+        "next_steps": {
+            "schedule": ["Choose preferred appointment time", "Confirm specialist preference", "Receive appointment confirmation"],
+            "details": ["Provide more details if needed", "Proceed to book appointment", "Receive appointment confirmation"]
+        },
+        "templates": {
+            "cardiology": {
+                "book": "Thank you {patient_name}. I understand you want to book a cardiology appointment. We have experienced cardiologists available. Would you prefer a morning, afternoon, or evening appointment? Also, do you have any specific dates in mind?",
+                "default": "Thank you {patient_name}. I understand you're experiencing heart-related issues. This requires a cardiologist's evaluation. I can help you schedule an appointment with our cardiology specialist. When would be the best time for you to visit?"
+            },
+            "gastroenterology": {
+                "book": "Thank you {patient_name}. I'll help you book an appointment with our gastroenterologist. We have available slots next week. Would you prefer morning or afternoon? Any particular days that work best for you?",
+                "default": "Thank you {patient_name}. Digestive issues require proper evaluation by a specialist. I recommend scheduling a consultation with our gastroenterologist. They can provide a comprehensive assessment and treatment plan. Would you like to book an appointment?"
+            },
+            "neurology": {
+                "book": "Thank you {patient_name}. Our neurologists have several availability slots. Would you prefer this week or next week? What time of day works best for you?",
+                "default": "Thank you {patient_name}. Neurological concerns should be evaluated by a specialist. I can connect you with our experienced neurologist. They can help diagnose and treat your condition. Shall we schedule an appointment?"
+            },
+            "orthopedics": {
+                "book": "Thank you {patient_name}. Our orthopedic specialists are available for appointments. We have slots available Tuesday through Saturday. Which day suits you best?",
+                "default": "Thank you {patient_name}. Bone and joint issues require professional orthopedic care. I can help you schedule an evaluation with our orthopedic specialist. They'll assess your condition and recommend treatment. Would you like to proceed with booking?"
+            },
+            "general": {
+                "followup": "Thank you {patient_name}. Based on what you've shared, I recommend booking a general consultation. Our doctors can assess your condition and refer you to a specialist if needed. Are you interested in scheduling an appointment this week?",
+                "greeting": "Hello {patient_name}! Thank you for contacting us. I'm here to help you with your medical needs. Could you tell me more about what brings you in today?"
+            }
+        }
+    }
+}
+
+
+# Doctor roster used when SCHEDULE_DOCTORS_FILE is not set.
+# working_days are weekday numbers (Monday is 0) and default to Monday-Friday.
+DEFAULT_DOCTORS = [
+    {"id": "DR-CARD-01", "name": "Dr. Ana Petrovic", "specialty": "cardiology"},
+    {"id": "DR-CARD-02", "name": "Dr. Marko Jovanovic", "specialty": "cardiology", "working_days": [1, 2, 3, 4, 5]},
+    {"id": "DR-GAST-01", "name": "Dr. Ivana Nikolic", "specialty": "gastroenterology"},
+    {"id": "DR-NEUR-01", "name": "Dr. Stefan Ilic", "specialty": "neurology"},
+    {"id": "DR-ORTH-01", "name": "Dr. Milica Djordjevic", "specialty": "orthopedics"},
+    {"id": "DR-ORTH-02", "name": "Dr. Nikola Pavlovic", "specialty": "orthopedics", "working_days": [1, 2, 3, 4, 5]},
+    {"id": "DR-GEN-01", "name": "Dr. Jelena Markovic", "specialty": "general"},
+    {"id": "DR-GEN-02", "name": "Dr. Luka Stojanovic", "specialty": "general"},
+]
+
+
+# Service catalog used when SERVICE_CATALOG_FILE is not set, in the Service model's shape.
+# duration is in minutes; cost is in dollars, 0 for free and omitted when priced on request.
+DEFAULT_SERVICES = [
+    {"id": "consultation", "name": "General Consultation", "specialty": "general", "duration": 30, "cost": 0,
+     "description": "Free initial consultation"},
+    {"id": "cardiology", "name": "Cardiology", "specialty": "cardiology", "duration": 45},
+    {"id": "gastroenterology", "name": "Gastroenterology", "specialty": "gastroenterology", "duration": 45},
+    {"id": "neurology", "name": "Neurology", "specialty": "neurology", "duration": 45},
+    {"id": "orthopedics", "name": "Orthopedics", "specialty": "orthopedics", "duration": 45},
+    {"id": "dental", "name": "Dental Checkup", "specialty": "dental", "duration": 45, "cost": 50},
+    {"id": "lab_tests", "name": "Lab Tests", "specialty": "general", "duration": 15, "cost": 100},
+    {"id": "follow_up", "name": "Follow-up Visit", "specialty": "general", "duration": 20, "cost": 30},
+    {"id": "physical", "name": "Physical Examination", "specialty": "general", "duration": 30, "cost": 60},
+]
+
+
+# Caller intents and the words that signal them
+INTENT_KEYWORDS = {
+    "book": ["book", "booking", "schedule", "appointment", "appointments", "reserve", "slot"],
+    "billing": ["cost", "price", "pay", "bill", "billing", "insurance"],
+    "service": ["service", "services", "information", "info"],
+    "cancel": ["cancel"],
+    "reschedule": ["reschedule"]
+}
+
+
+# Issue type whose agent handles each intent, for speculative agent selection
+INTENT_ISSUE_TYPES = {
+    "book": "appointment",
+    "cancel": "appointment",
+    "reschedule": "appointment",
+    "billing": "service_info",
+    "service": "service_info"
+}
+
+
 # Ollama Model Information
 AVAILABLE_MODELS = {
     "mistral": {
@@ -106,3 +302,28 @@ AVAILABLE_MODELS = {
         "recommended": False
     }
 }
+
+
+# Ranks for the AVAILABLE_MODELS speed and quality labels, higher is better
+MODEL_SPEED_RANKS = {
+    "Slow": 0,
+    "Moderate": 1,
+    "Fast": 2,
+    "Very Fast": 3
+}
+
+MODEL_QUALITY_RANKS = {
+    "Poor": 0,
+    "Fair": 1,
+    "Good": 2,
+    "Excellent": 3
+}
+
+
+# Base complexity of a turn per issue type, 0 (any model will do) to 1 (needs the best model)
+ISSUE_COMPLEXITY = {
+    "consultation": 0.6,
+    "appointment": 0.3,
+    "service_info": 0.2,
+    "other": 0.4
+}
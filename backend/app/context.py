@@ -0,0 +1,146 @@
+"""Incremental per-session conversation context for LLM prompts"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from .config import settings
+from .session_store import SessionStore, Turn
+
+FIRST_MESSAGE = "(first message in conversation)"
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prompts)"""
+    return len(text) // 4 + 1
+
+
+def summarize_turns(turns: List[Turn], max_words: int = 20) -> List[str]:
+    """Default summarizer: one line per turn with the start of what the patient said"""
+    lines = []
+    for turn in turns:
+        said = (turn.get("user") or "").strip()
+        if not said:
+            continue
+        match = _FIRST_SENTENCE.match(said)
+        words = (match.group(1) if match else said).split()
+        clipped = " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+        lines.append(f"- Patient said: {clipped}")
+    return lines
+
+
+@dataclass
+class _SessionContext:
+    summary: List[str] = field(default_factory=list)
+    summarized_upto: int = 0  # absolute index of the first turn not yet folded into the summary
+    omitted: bool = False  # turns were trimmed from the store before they could be summarized
+    started: float = 0.0  # start time of the stored session this state was built from
+    rendered_total: int = -1
+    rendered: str = ""
+
+
+class ConversationContextManager:
+    """
+    Render the context block for a session's next LLM prompt.
+
+    The last `window` turns are included verbatim; older turns are folded
+    into a rolling summary exactly once, when they fall out of the window.
+    The summary comes first so the prompt prefix stays byte-identical from
+    turn to turn until the summary changes, which lets the backend reuse its
+    KV cache. Rendered text is cached per session and only rebuilt when the
+    session gains a turn; a session the store evicted and started over (in
+    any worker) has a new start time and is rebuilt from scratch. The whole
+    block is kept under `max_tokens`.
+    """
+
+    def __init__(self, store: SessionStore, window: int = 3, max_tokens: int = 512,
+                 summarizer: Callable[[List[Turn]], List[str]] = summarize_turns, max_sessions: int = 10000):
+        self.store = store
+        self.window = window
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, store: SessionStore, app_settings=settings) -> "ConversationContextManager":
+        return cls(
+            store,
+            window=app_settings.CONTEXT_WINDOW_TURNS,
+            max_tokens=app_settings.CONTEXT_MAX_TOKENS or app_settings.LLM_MAX_TOKENS,
+            max_sessions=app_settings.SESSION_MAX_SESSIONS,
+        )
+
+    def _state(self, session_id: str) -> _SessionContext:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = _SessionContext()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return state
+
+    def _fold(self, session_id: str, state: _SessionContext, total: int) -> List[Turn]:
+        """Summarize turns that left the window and return the turns still in it"""
+        window_start = max(0, total - self.window)
+        fetch = total - min(state.summarized_upto, window_start)
+        turns = self.store.get_turns(session_id, limit=fetch)
+        # The store may have trimmed turns we never saw; they can no longer be summarized
+        first_available = total - len(turns)
+        if state.summarized_upto < first_available:
+            state.omitted = True
+            state.summarized_upto = first_available
+        if state.summarized_upto < window_start:
+            fresh = turns[state.summarized_upto - first_available:window_start - first_available]
+            state.summary.extend(self.summarizer(fresh))
+            state.summarized_upto = window_start
+        return turns[window_start - first_available:]
+
+    def _render(self, state: _SessionContext, window_turns: List[Turn]) -> str:
+        header = "Previous messages in this conversation:\n"
+        recent = [f"- Patient: {turn.get('user') or ''}\n- Agent: {turn.get('agent') or ''}\n" for turn in window_turns]
+        budget = self.max_tokens - estimate_tokens(header)
+        # Recent turns matter most: drop the oldest of them only if they alone blow the budget
+        while recent and sum(estimate_tokens(text) for text in recent) > budget:
+            recent.pop(0)
+        budget -= sum(estimate_tokens(text) for text in recent)
+        summary = list(state.summary)
+        if state.omitted:
+            summary.insert(0, "- (earlier messages omitted)")
+        while summary and estimate_tokens("Summary of earlier messages:\n" + "\n".join(summary)) > budget:
+            summary.pop(0)
+        parts = []
+        if summary:
+            parts.append("Summary of earlier messages:\n" + "\n".join(summary) + "\n")
+        parts.append(header)
+        parts.extend(recent)
+        return "".join(parts)
+
+    def render(self, session_id: str) -> str:
+        """Context for the session's next turn, built incrementally and cached"""
+        started, total = self.store.version(session_id)
+        if total == 0:
+            return FIRST_MESSAGE
+        state = self._state(session_id)
+        if started != state.started:
+            # A new conversation, or the state was never built; nothing cached belongs to it
+            state = _SessionContext(started=started)
+            with self._lock:
+                self._sessions[session_id] = state
+        if state.rendered_total == total:
+            return state.rendered
+        window_turns = self._fold(session_id, state, total)
+        state.rendered = self._render(state, window_turns)
+        state.rendered_total = total
+        return state.rendered
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,172 @@
+"""Bounded off-loop execution of blocking crew/LLM work with admission control"""
+
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CallQueueFull(RuntimeError):
+    """Raised when MAX_CONCURRENT_CALLS are running and the wait queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Call queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CallTimeout(RuntimeError):
+    """Raised when a call does not finish within CALL_TIMEOUT"""
+
+
+class CallExecutor:
+    """
+    Runs blocking call work on a dedicated thread pool.
+
+    At most `max_concurrent` calls run at once and at most `max_queue` more
+    may wait for a slot; anything beyond that is rejected immediately with
+    CallQueueFull so the API can answer 503 instead of piling up requests.
+    Callers stop waiting after `timeout` seconds and the call's `cancelled`
+    event is set, so a crew stops at its next agent step. Python threads
+    cannot be interrupted, so a timed-out call keeps its slot until the
+    worker returns; that keeps the pool honest about how much work is
+    really in flight.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="call-worker")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "failed": 0,
+            "wait_count": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "CallExecutor":
+        return cls(
+            max_concurrent=app_settings.MAX_CONCURRENT_CALLS,
+            max_queue=app_settings.CALL_QUEUE_SIZE,
+            timeout=app_settings.CALL_TIMEOUT,
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        return self._slots
+
+    def _retry_after(self) -> int:
+        with self._lock:
+            completed = self._stats["completed"]
+            average = self._stats["run_seconds_total"] / completed if completed else 1.0
+            backlog = self._queued + self._running
+        return max(1, math.ceil(average * backlog / self.max_concurrent))
+
+    def check_admission(self) -> None:
+        """Raise CallQueueFull if a call started now would be rejected, without taking a slot"""
+        if self._semaphore().locked() and self._queued >= self.max_queue:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise CallQueueFull(self._retry_after())
+
+    async def acquire(self) -> float:
+        """Wait for a free slot and return the time spent queued"""
+        self.check_admission()
+        slots = self._semaphore()
+        enqueued = time.perf_counter()
+        self._queued += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._queued -= 1
+        waited = time.perf_counter() - enqueued
+        with self._lock:
+            self._running += 1
+            self._stats["wait_count"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return waited
+
+    def idle_slots(self) -> int:
+        """How many calls started now would run without queueing"""
+        with self._lock:
+            return max(0, self.max_concurrent - self._running - self._queued)
+
+    def release(self, run_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._running -= 1
+            if run_seconds is not None:
+                self._stats["completed"] += 1
+                self._stats["run_seconds_total"] += run_seconds
+        self._semaphore().release()
+
+    async def run(self, func: Callable[..., Any], *args: Any, cancelled: Optional[threading.Event] = None,
+                  **kwargs: Any) -> Any:
+        """
+        Run `func(*args, cancelled=event, **kwargs)` on the worker pool,
+        enforcing admission control and the timeout. `func` must stop soon
+        after the event is set; it is set when the call times out or the
+        awaiting task is cancelled. Pass `cancelled` to cancel it yourself.
+        """
+        if cancelled is None:
+            cancelled = threading.Event()
+        await self.acquire()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = self._pool.submit(functools.partial(func, *args, cancelled=cancelled, **kwargs))
+
+        def _finished(done_future) -> None:
+            # Runs on the worker thread; hand the slot back on the event loop
+            outcome = None if done_future.cancelled() or done_future.exception() else time.perf_counter() - started
+            loop.call_soon_threadsafe(self.release, outcome)
+
+        future.add_done_callback(_finished)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            cancelled.set()
+            with self._lock:
+                self._stats["timed_out"] += 1
+            logger.warning(f"Call exceeded CALL_TIMEOUT of {self.timeout}s, cancelling it")
+            raise CallTimeout(f"Call did not finish within {self.timeout}s")
+        except asyncio.CancelledError:
+            # The request went away (client disconnect, speculative loser); stop the work too
+            cancelled.set()
+            raise
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = self._queued
+            stats["running"] = self._running
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["wait_count"] if stats["wait_count"] else 0.0
+        return stats
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+call_executor = CallExecutor.from_settings()
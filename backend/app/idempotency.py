@@ -0,0 +1,360 @@
+"""Idempotency-Key handling: a retried request gets the stored response instead of a second run"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(ValueError):
+    """Raised when a key is reused with a different request body"""
+
+
+def request_fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    result: "asyncio.Future[Any]"
+    expires: float
+
+
+@dataclass
+class Claim:
+    """What `begin` found for a key: a result to replay, or the right to run the request"""
+    key: str
+    replayed: bool
+    result: Any = None
+    entry: Optional[_Entry] = field(default=None, repr=False)
+    owner: Optional[str] = None
+    heartbeat: Optional["asyncio.Task[None]"] = field(default=None, repr=False)
+
+
+class _KeyTable:
+    """
+    Idempotency keys in SQL, shared by every worker pointing at the database.
+
+    A row is inserted by the worker that runs the request and holds its
+    result once the run finishes; a failed run deletes it. The runner renews
+    `heartbeat` while it works, so a row left by a worker that died can be
+    taken over.
+    """
+
+    # Expired rows are deleted with the key they block, and in a full sweep every N claims
+    SWEEP_INTERVAL = 100
+
+    def __init__(self, url: str):
+        from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine, event
+
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args, future=True)
+        if url.startswith("sqlite"):
+            @event.listens_for(self.engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, _record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+        metadata = MetaData()
+        self.keys = Table(
+            "idempotency_keys", metadata,
+            Column("key", String(320), primary_key=True),
+            Column("fingerprint", String(64), nullable=False),
+            Column("owner", String(32), nullable=False),
+            Column("result", Text),  # JSON, NULL while the request is running
+            Column("heartbeat", Float, nullable=False),
+            Column("expires", Float, nullable=False, index=True),
+        )
+        metadata.create_all(self.engine)
+        self._claims = 0
+
+    def claim(self, key: str, fingerprint: str, owner: str, now: float, expires: float):
+        """Insert the key for `owner` and return None, or return the row another request holds"""
+        from sqlalchemy import select
+        from sqlalchemy.exc import IntegrityError
+
+        keys = self.keys.c
+        self._claims += 1
+        with self.engine.begin() as conn:
+            expired = keys.expires <= now
+            conn.execute(self.keys.delete().where(
+                expired if self._claims % self.SWEEP_INTERVAL == 0 else (keys.key == key) & expired
+            ))
+        while True:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(self.keys.insert().values(
+                        key=key, fingerprint=fingerprint, owner=owner, result=None, heartbeat=now, expires=expires
+                    ))
+                return None
+            except IntegrityError:
+                with self.engine.connect() as conn:
+                    row = conn.execute(select(self.keys).where(keys.key == key)).first()
+                if row is not None:
+                    return row
+                # Released between the insert and the read; try again
+
+    def take_over(self, key: str, stale_owner: str, owner: str, now: float) -> bool:
+        keys = self.keys.c
+        with self.engine.begin() as conn:
+            taken = conn.execute(
+                self.keys.update()
+                .where(keys.key == key, keys.owner == stale_owner, keys.result.is_(None))
+                .values(owner=owner, heartbeat=now)
+            )
+        return taken.rowcount == 1
+
+    def renew(self, key: str, owner: str, now: float) -> None:
+        keys = self.keys.c
+        with self.engine.begin() as conn:
+            conn.execute(self.keys.update().where(keys.key == key, keys.owner == owner).values(heartbeat=now))
+
+    def finish(self, key: str, owner: str, result: str) -> None:
+        keys = self.keys.c
+        with self.engine.begin() as conn:
+            conn.execute(self.keys.update().where(keys.key == key, keys.owner == owner).values(result=result))
+
+    def release(self, key: str, owner: str) -> None:
+        keys = self.keys.c
+        with self.engine.begin() as conn:
+            conn.execute(self.keys.delete().where(keys.key == key, keys.owner == owner, keys.result.is_(None)))
+
+
+class IdempotencyCache:
+    """
+    Results of recent requests by idempotency key, bounded by count and age.
+
+    The first request with a key runs; duplicates that arrive while it is
+    running wait for the same result, and later retries get the stored one.
+    A failed run is not stored, so the client's next retry runs again.
+    Reusing a key with a different request raises IdempotencyConflict.
+
+    Results are kept per process, and with `db_url` also in a table every
+    worker shares, so a retry that lands on another worker is replayed too;
+    results must then be JSON-serializable. A worker waiting on a key another
+    worker is running polls the table, and takes the key over when its
+    runner has not renewed it for `lease` seconds. Table reads and writes run
+    on worker threads, since SQLite may wait on another worker's lock.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, db_url: Optional[str] = None,
+                 lease: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lease = lease
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = _KeyTable(db_url) if db_url else None
+        self._writes: "set[asyncio.Task[None]]" = set()
+        self._stats = {
+            "runs": 0,
+            "replays": 0,
+            "joined_in_flight": 0,
+            "conflicts": 0,
+            "failed_runs": 0,
+            "evictions": 0,
+            "shared_replays": 0,
+            "shared_waits": 0,
+            "takeovers": 0,
+        }
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "IdempotencyCache":
+        backend = app_settings.IDEMPOTENCY_BACKEND
+        if backend == "auto":
+            # Per-process memory cannot see retries that land on another uvicorn worker
+            backend = "sql" if app_settings.WORKERS > 1 else "memory"
+        if backend not in ("memory", "sql"):
+            raise ValueError(f"Unknown IDEMPOTENCY_BACKEND: {backend}")
+        return cls(
+            max_entries=app_settings.IDEMPOTENCY_CACHE_SIZE,
+            ttl=app_settings.IDEMPOTENCY_TTL,
+            db_url=app_settings.IDEMPOTENCY_DB_URL if backend == "sql" else None,
+            lease=app_settings.IDEMPOTENCY_LEASE_SECONDS,
+        )
+
+    def after_fork(self) -> None:
+        # Futures belong to the parent's event loop, and pooled connections to the parent process
+        with self._lock:
+            self._entries.clear()
+        if self._table is not None:
+            self._table.engine.dispose(close=False)
+
+    async def run(self, key: str, fingerprint: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Result of `compute()` for `key`, running it at most once at a time.
+        Returns (result, replayed), where replayed is True when the result
+        came from an earlier or concurrent request with the same key.
+        """
+        claim = await self.begin(key, fingerprint)
+        if claim.replayed:
+            return claim.result, True
+        try:
+            result = await compute()
+        except BaseException as e:
+            self.abandon(claim, e)
+            raise
+        self.finish(claim, result)
+        return result, False
+
+    async def begin(self, key: str, fingerprint: str) -> Claim:
+        """
+        Replay the stored result for `key`, or claim the key for this request.
+        An owning claim must end with `finish` or `abandon`; use it when the
+        result is produced piece by piece, such as a streamed response.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= now:
+                del self._entries[key]
+                entry = None
+            owner = entry is None
+            if owner:
+                entry = _Entry(fingerprint, asyncio.get_running_loop().create_future(), now + self.ttl)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            elif entry.fingerprint != fingerprint:
+                self._stats["conflicts"] += 1
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            else:
+                self._entries.move_to_end(key)
+                self._stats["replays" if entry.result.done() else "joined_in_flight"] += 1
+
+        if not owner:
+            if entry.result.done() and not entry.result.cancelled() and entry.result.exception() is None:
+                return Claim(key, True, entry.result.result())
+            try:
+                return Claim(key, True, await asyncio.shield(entry.result))
+            except asyncio.CancelledError:
+                if not entry.result.cancelled():
+                    raise
+                # The request we joined was cancelled before finishing; run it ourselves
+                return await self.begin(key, fingerprint)
+
+        claim = Claim(key, False, entry=entry, owner=uuid.uuid4().hex)
+        if self._table is not None:
+            try:
+                stored = await self._claim_shared(key, fingerprint, claim.owner)
+            except BaseException as e:
+                self._forget(claim, e)
+                raise
+            if stored is not None:
+                entry.result.set_result(stored[0])
+                with self._lock:
+                    self._stats["shared_replays"] += 1
+                return Claim(key, True, stored[0])
+            claim.heartbeat = asyncio.get_running_loop().create_task(self._renew(key, claim.owner))
+        with self._lock:
+            self._stats["runs"] += 1
+        return claim
+
+    def finish(self, claim: Claim, result: Any) -> None:
+        """Store the result of an owning claim for later retries"""
+        if claim.entry is None or claim.entry.result.done():
+            return
+        if claim.heartbeat is not None:
+            claim.heartbeat.cancel()
+        if self._table is not None:
+            # The response is already made; if the write fails only retries on other workers run it again
+            self._write("store the result for", self._table.finish, claim.key, claim.owner, json.dumps(result))
+        claim.entry.result.set_result(result)
+
+    def abandon(self, claim: Claim, error: Optional[BaseException] = None) -> None:
+        """Release an owning claim whose run failed or was cut short, so a retry runs again"""
+        if claim.entry is None or claim.entry.result.done():
+            return
+        if claim.heartbeat is not None:
+            claim.heartbeat.cancel()
+        if self._table is not None:
+            self._write("release", self._table.release, claim.key, claim.owner)
+        self._forget(claim, error)
+
+    def _write(self, action: str, write: Callable[..., None], key: str, *args: Any) -> None:
+        """Run a table write on a worker thread without making the caller wait for it"""
+
+        async def run() -> None:
+            try:
+                await asyncio.to_thread(write, key, *args)
+            except Exception as e:
+                logger.error(f"Could not {action} idempotency key {key}: {e}")
+
+        task = asyncio.get_running_loop().create_task(run())
+        # Held until done so the write is not garbage collected mid-flight
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _forget(self, claim: Claim, error: Optional[BaseException]) -> None:
+        with self._lock:
+            if self._entries.get(claim.key) is claim.entry:
+                del self._entries[claim.key]
+            self._stats["failed_runs"] += 1
+        if error is None or isinstance(error, asyncio.CancelledError):
+            claim.entry.result.cancel()
+        else:
+            # Requests already waiting on this run fail with it; retries after this run again
+            claim.entry.result.set_exception(error)
+            claim.entry.result.exception()  # retrieved here, so asyncio does not warn when nobody waited
+
+    async def _claim_shared(self, key: str, fingerprint: str, owner: str) -> Optional[Tuple[Any]]:
+        """None once this worker owns `key` in the table, or (result,) when another run stored one"""
+        delay = 0.02
+        waited = False
+        while True:
+            now = time.time()
+            row = await asyncio.to_thread(self._table.claim, key, fingerprint, owner, now, now + self.ttl)
+            if row is None:
+                return None
+            if row.fingerprint != fingerprint:
+                with self._lock:
+                    self._stats["conflicts"] += 1
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            if row.result is not None:
+                return (json.loads(row.result),)
+            if row.heartbeat < now - self.lease and await asyncio.to_thread(
+                self._table.take_over, key, row.owner, owner, now
+            ):
+                logger.warning(f"Took over idempotency key {key} from a worker that stopped renewing it")
+                with self._lock:
+                    self._stats["takeovers"] += 1
+                return None
+            if not waited:
+                waited = True
+                with self._lock:
+                    self._stats["shared_waits"] += 1
+            # Another worker is running the request
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def _renew(self, key: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self._table.renew, key, owner, time.time())
+            except Exception as e:
+                logger.error(f"Could not renew idempotency key {key}: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+idempotency_cache = IdempotencyCache.from_settings()
@@ -0,0 +1,168 @@
+"""Shared, connection-pooled client for the Ollama HTTP API"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import settings
+from .metrics import record_llm
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    """
+    Thin Ollama client shared by every caller in the process.
+
+    - One `requests.Session` keeps up to `pool_size` keep-alive connections
+      to OLLAMA_BASE_URL, so calls do not pay a TCP handshake each time.
+    - At most `max_in_flight` requests run against Ollama at once; extra
+      callers wait instead of overloading a CPU-bound model server.
+    - Identical concurrent `generate` calls share one request (single flight).
+    - Every request carries `keep_alive` so the model stays loaded between calls.
+    """
+
+    def __init__(self, base_url: str, model: str, keep_alive: str = "30m", pool_size: int = 10,
+                 max_in_flight: int = 4, timeout: float = 120, options: Optional[Dict[str, Any]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.options = options or {}
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending_generate: Dict[Tuple, Future] = {}
+        self._stats = {"requests": 0, "coalesced": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "OllamaClient":
+        return cls(
+            base_url=app_settings.OLLAMA_BASE_URL,
+            model=app_settings.OLLAMA_MODEL,
+            keep_alive=app_settings.OLLAMA_KEEP_ALIVE,
+            pool_size=app_settings.OLLAMA_POOL_SIZE,
+            max_in_flight=app_settings.OLLAMA_MAX_IN_FLIGHT,
+            timeout=app_settings.OLLAMA_REQUEST_TIMEOUT,
+            options={"temperature": app_settings.LLM_TEMPERATURE, "num_predict": app_settings.LLM_MAX_TOKENS},
+        )
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        payload.setdefault("model", self.model)
+        payload.setdefault("keep_alive", self.keep_alive)
+        started = time.perf_counter()
+        response = self._session.post(f"{self.base_url}{path}", json=payload, stream=stream, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            # A streamed error body would otherwise keep its pooled connection
+            response.close()
+            raise
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["seconds"] += time.perf_counter() - started
+        return response
+
+    def _generate(self, prompt: str, options: Dict[str, Any], model: Optional[str]) -> str:
+        with self._in_flight:
+            started = time.perf_counter()
+            response = self._post("/api/generate", {
+                "model": model or self.model, "prompt": prompt, "stream": False, "options": options
+            })
+            body = response.json()
+        record_llm("generate", time.perf_counter() - started,
+                   body.get("prompt_eval_count"), body.get("eval_count"))
+        return body["response"]
+
+    def generate(self, prompt: str, model: Optional[str] = None, **options: Any) -> str:
+        """Return the full completion for `prompt` from `model` (the client's model by default)"""
+        options = {**self.options, **options}
+        key = (model or self.model, prompt, json.dumps(options, sort_keys=True))
+        with self._lock:
+            shared = self._pending_generate.get(key)
+            if shared is None:
+                future: Future = Future()
+                self._pending_generate[key] = future
+            else:
+                self._stats["coalesced"] += 1
+        if shared is not None:
+            return shared.result()
+        try:
+            future.set_result(self._generate(prompt, options, model))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._pending_generate[key]
+        return future.result()
+
+    # LangChain-style aliases so the client can stand in for OllamaLLM
+    def invoke(self, prompt: str, model: Optional[str] = None, **options: Any) -> str:
+        return self.generate(prompt, model, **options)
+
+    def stream(self, prompt: str, model: Optional[str] = None, **options: Any) -> Iterator[str]:
+        """
+        Yield completion tokens as Ollama produces them.
+
+        The request holds an in-flight slot and a pooled connection until the
+        generator finishes; callers that stop early must close() it.
+        """
+        with self._in_flight:
+            started = time.perf_counter()
+            response = self._post(
+                "/api/generate",
+                {"model": model or self.model, "prompt": prompt, "stream": True,
+                 "options": {**self.options, **options}},
+                stream=True,
+            )
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("response"):
+                        yield event["response"]
+                    if event.get("done"):
+                        record_llm("stream", time.perf_counter() - started,
+                                   event.get("prompt_eval_count"), event.get("eval_count"))
+                        break
+            finally:
+                # Also runs on close() after a barge-in, timeout or disconnect
+                response.close()
+
+    def warm(self, model: Optional[str] = None) -> None:
+        """Load the model (the client's model by default) into memory ahead of the first call"""
+        model = model or self.model
+        with self._in_flight:
+            # An empty prompt makes Ollama load the model and return immediately
+            self._post("/api/generate", {"model": model, "prompt": "", "stream": False})
+        logger.info(f"Ollama model {model} loaded (keep_alive={self.keep_alive})")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """Process-wide Ollama client built from settings on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient.from_settings()
+        return _client
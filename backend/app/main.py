@@ -1,9 +1,34 @@
 """FastAPI application for AI Call Center Assistant with conversation memory"""
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Annotated, AsyncIterator, Optional, List, Dict, Tuple
+from contextlib import aclosing
+from datetime import datetime
+import asyncio
 import logging
+import secrets
+import time
+
+from .batch import BatchProcessor, parse_records
+from .call_ids import call_ids, new_call_id
+from .config import settings
+from .context import ConversationContextManager
+from .executor import CallQueueFull, CallTimeout, call_executor
+from .idempotency import Claim, IdempotencyConflict, idempotency_cache, request_fingerprint
+from .metrics import observe_stage, record_call, registry, stage, stats_collector
+from .model_router import model_router
+from .recording import call_recorder
+from .response_cache import history_fingerprint, response_cache
+from .response_templates import ResponseTemplate, response_templates
+from .router import CREW, RouteDecision, call_router
+from .service_catalog import etag_matches, service_catalog
+from .session_store import create_session_store
+from .specialty import specialty_matcher
+from .speculative import speculative_crew
+from .streaming import build_agent_prompt, iter_sentences, ndjson_event, stream_llm
+from .voice import VoiceSession, voice_stats
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,7 +47,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-conversation_history: Dict[str, List[Dict[str, str]]] = {}
+session_store = create_session_store()
+context_manager = ConversationContextManager.from_settings(session_store)
+
+# Resolved on first use so the API starts without crewai/Ollama
+streaming_llm = None
+crew_pool = None
+
+# Sent in place of the trailer when a streamed turn fails; such streams are not kept for retries
+STREAM_ERROR = ndjson_event({"type": "error", "detail": "Error processing call"})
+
+# Component stats are read through the module globals at scrape time so swapped-in
+# components (and lazily built ones) are picked up
+registry.register_collector("service_catalog_stats", "Service catalog size and reloads",
+                            stats_collector(lambda: service_catalog.stats()))
+registry.register_collector("session_store_stats", "Session store size and evictions",
+                            stats_collector(lambda: session_store.stats()))
+registry.register_collector("call_executor_stats", "Call admission queue and slot usage",
+                            stats_collector(lambda: call_executor.stats()))
+registry.register_collector("call_router_stats", "Calls per routing tier",
+                            stats_collector(lambda: call_router.stats()))
+registry.register_collector("call_recorder_stats", "Transcript log writes, compression and dropped turns",
+                            stats_collector(lambda: call_recorder.stats()))
+registry.register_collector("idempotency_stats", "Idempotency-Key runs, replays and conflicts",
+                            stats_collector(lambda: idempotency_cache.stats()))
+registry.register_collector("model_router_stats", "Turns per model, latency SLO fallbacks and probes",
+                            stats_collector(lambda: model_router.stats()))
+registry.register_collector("response_cache_stats", "Response cache hits, misses and size",
+                            stats_collector(lambda: response_cache.stats()))
+registry.register_collector("speculative_crew_stats", "Speculative agent runs, cancellations and wasted agent time",
+                            stats_collector(lambda: speculative_crew.stats()))
+registry.register_collector("voice_session_stats", "Voice session turns, speculation hits and barge-ins",
+                            stats_collector(voice_stats.stats))
+registry.register_collector("crew_pool_stats", "Pooled crew usage",
+                            stats_collector(lambda: crew_pool.stats() if crew_pool is not None else {}))
+registry.register_collector("ollama_client_stats", "Ollama client requests and batching",
+                            stats_collector(lambda: streaming_llm.stats() if hasattr(streaming_llm, "stats") else {}))
+
+class MetricsToggle(BaseModel):
+    enabled: bool
 
 class CallRequest(BaseModel):
     patient_name: str
@@ -37,66 +100,99 @@ class CallResponse(BaseModel):
     assistant_response: str
     next_steps: Optional[List[str]] = None
 
+def get_streaming_llm():
+    global streaming_llm
+    if streaming_llm is None:
+        from .llm_client import get_ollama_client
+        streaming_llm = get_ollama_client()
+    return streaming_llm
+
+def get_crew_pool():
+    global crew_pool
+    if crew_pool is None:
+        from .agents.crew_pool import get_crew_pool as get_shared_crew_pool
+        crew_pool = get_shared_crew_pool()
+    return crew_pool
+
 def extract_specialty(description: str) -> str:
-    description_lower = description.lower() if description else ""
-    
-    specialties = {
-        "cardiology": ["heart", "cardiac", "cardiologist", "chest pain", "heart disease"],
-        "gastroenterology": ["stomach", "digestive", "abdominal", "gut", "gastro"],
-        "neurology": ["headache", "migraine", "brain", "neurologist", "headaches"],
-        "orthopedics": ["bone", "joint", "fracture", "arthritis", "knee", "back pain"],
-        "general": ["appointment", "consultation", "checkup", "visit"]
-    }
-    
-    for specialty, keywords in specialties.items():
-        if any(keyword in description_lower for keyword in keywords):
-            return specialty
-    return "general"
+    return specialty_matcher.classify(description)
 
 def get_conversation_context(session_id: str) -> str:
-    history = conversation_history.get(session_id, [])
-    if len(history) <= 1:
-        return "(first message in conversation)"
-    context = "Previous messages in this conversation:\n"
-    for msg in history[-4:-1]:  # Last 3 messages
-        context += f"- Patient: {msg.get('user', '')}\n- Agent: {msg.get('agent', '')}\n"
-    return context
-
-def generate_smart_response(patient_name: str, description: str, specialty: str, session_id: str) -> str:
-    context = get_conversation_context(session_id)
-    history = conversation_history.get(session_id, [])
-    
-    patient_name = patient_name.strip() if patient_name else "there"
-    
-    if specialty == "cardiology":
-        if "appointment" in description.lower() or "book" in description.lower():
-            return f"Thank you {patient_name}. I understand you want to book a cardiology appointment. We have experienced cardiologists available. Would you prefer a morning, afternoon, or evening appointment? Also, do you have any specific dates in mind?"
-        else:
-            return f"Thank you {patient_name}. I understand you're experiencing heart-related issues. This requires a cardiologist's evaluation. I can help you schedule an appointment with our cardiology specialist. When would be the best time for you to visit?"
-    
-    elif specialty == "gastroenterology":
-        if "appointment" in description.lower() or "book" in description.lower():
-            return f"Thank you {patient_name}. I'll help you book an appointment with our gastroenterologist. We have available slots next week. Would you prefer morning or afternoon? Any particular days that work best for you?"
-        else:
-            return f"Thank you {patient_name}. Digestive issues require proper evaluation by a specialist. I recommend scheduling a consultation with our gastroenterologist. They can provide a comprehensive assessment and treatment plan. Would you like to book an appointment?"
-    
-    elif specialty == "neurology":
-        if "appointment" in description.lower() or "book" in description.lower():
-            return f"Thank you {patient_name}. Our neurologists have several availability slots. Would you prefer this week or next week? What time of day works best for you?"
-        else:
-            return f"Thank you {patient_name}. Neurological concerns should be evaluated by a specialist. I can connect you with our experienced neurologist. They can help diagnose and treat your condition. Shall we schedule an appointment?"
-    
-    elif specialty == "orthopedics":
-        if "appointment" in description.lower() or "book" in description.lower():
-            return f"Thank you {patient_name}. Our orthopedic specialists are available for appointments. We have slots available Tuesday through Saturday. Which day suits you best?"
-        else:
-            return f"Thank you {patient_name}. Bone and joint issues require professional orthopedic care. I can help you schedule an evaluation with our orthopedic specialist. They'll assess your condition and recommend treatment. Would you like to proceed with booking?"
-    
-    else:
-        if len(history) > 1:
-            return f"Thank you {patient_name}. Based on what you've shared, I recommend booking a general consultation. Our doctors can assess your condition and refer you to a specialist if needed. Are you interested in scheduling an appointment this week?"
-        else:
-            return f"Hello {patient_name}! Thank you for contacting us. I'm here to help you with your medical needs. Could you tell me more about what brings you in today?"
+    return context_manager.render(session_id)
+
+def template_response(decision: RouteDecision, history_length: int) -> ResponseTemplate:
+    """The deterministic response for this turn; render it with the caller's name"""
+    return response_templates.select(
+        decision.specialty, decision.text, history_length, lowered=True
+    )
+
+def get_next_steps(response_text: str) -> Tuple[str, ...]:
+    """Next steps for a crew reply; template replies carry their own"""
+    return response_templates.next_steps_for(response_text)
+
+def choose_model(call_request: CallRequest, decision: RouteDecision, history_length: int) -> Optional[str]:
+    """Model for an LLM-served turn; None keeps OLLAMA_MODEL"""
+    if not model_router.enabled:
+        return None
+    choice = model_router.choose(decision.issue_type, call_request.description, history_length)
+    logger.info(f"Turn served by {choice.model} ({choice.reason})")
+    return choice.model
+
+async def load_history(session_id: str) -> int:
+    """Turns kept for the session, seeding an empty one from the transcript log after a restart"""
+    history_length = session_store.turn_count(session_id)
+    if history_length == 0 and call_recorder.enabled:
+        # Reading the log is blocking file I/O, so it runs off the event loop
+        turns = await asyncio.to_thread(
+            call_recorder.restore, session_id, session_store.max_turns, time.time() - session_store.idle_ttl
+        )
+        for turn in turns:
+            session_store.append_turn(session_id, turn)
+        history_length = session_store.turn_count(session_id)
+    return history_length
+
+def append_turn(session_id: str, turn: Dict[str, str]) -> None:
+    session_store.append_turn(session_id, turn)
+    call_recorder.record(session_id, turn)
+
+def busy_response(error: CallQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="All agents are busy, please retry shortly",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def warm_up() -> None:
+    """Build the LLM-backed components the current settings will use"""
+    models = model_router.models if model_router.enabled else [None]
+    if settings.USE_CREW:
+        for model in models:
+            get_crew_pool().warm(model=model)
+    if settings.USE_CREW or settings.STREAM_LLM_RESPONSES:
+        from .llm_client import get_ollama_client
+        for model in models:
+            get_ollama_client().warm(model)
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if not settings.WARMUP_ON_STARTUP:
+        return
+    started = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        # Serve anyway; components are still built lazily on first use
+        logger.warning(f"Warm-up failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    call_executor.shutdown()
+
+@app.on_event("shutdown")
+async def close_recorder():
+    # Queued turns are written before the process exits
+    await asyncio.get_running_loop().run_in_executor(None, call_recorder.close, settings.SHUTDOWN_GRACE_SECONDS)
 
 @app.get("/")
 async def root():
@@ -110,56 +206,438 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
-@app.post("/api/call/process")
-async def process_call(call_request: CallRequest) -> CallResponse:
-    try:
-        session_id = call_request.phone_number
-        logger.info(f"Processing call from {call_request.patient_name}")
-        
-        specialty = extract_specialty(call_request.description or "")
-        response_text = generate_smart_response(
-            patient_name=call_request.patient_name,
-            description=call_request.description or "",
-            specialty=specialty,
-            session_id=session_id
-        )
-        
-        if session_id not in conversation_history:
-            conversation_history[session_id] = []
-        
-        conversation_history[session_id].append({
+async def handle_call(call_request: CallRequest) -> CallResponse:
+    """Serve one call turn; raises CallQueueFull/CallTimeout when the crew tier is overloaded"""
+    session_id = call_request.phone_number
+    call_id = new_call_id()
+    logger.info(f"Processing call {call_id} from {call_request.patient_name}")
+    
+    history_length = await load_history(session_id)
+    with stage("routing"):
+        decision = call_router.route(call_request.issue_type, call_request.description, history_length)
+    specialty = decision.specialty
+    record_call(specialty, decision.issue_type, decision.tier)
+    logger.info(f"Call served by {decision.tier} tier ({decision.reason}, confidence {decision.confidence:.2f})")
+    if decision.tier == CREW:
+        with stage("response_cache"):
+            history = history_fingerprint(session_store.get_turns(session_id)) if history_length else ""
+            response_text = response_cache.lookup(
+                specialty, decision.issue_type, call_request.description or "", call_request.patient_name,
+                preferred_date=call_request.preferred_date, history=history
+            )
+        if response_text is None:
+            model = choose_model(call_request, decision, history_length)
+            started = time.perf_counter()
+            with stage("context"):
+                context = get_conversation_context(session_id)
+            call_data = {
+                "issue_type": decision.issue_type,
+                "patient_name": call_request.patient_name,
+                "phone_number": call_request.phone_number,
+                "description": call_request.description,
+                "preferred_date": call_request.preferred_date,
+                "context": context,
+                "model": model
+            }
+            try:
+                with stage("crew_kickoff"):
+                    if settings.SPECULATIVE_AGENTS:
+                        speculation = await speculative_crew.run(call_executor, get_crew_pool().kickoff, call_data)
+                        response_text = speculation.answer
+                    else:
+                        response_text = await call_executor.run(get_crew_pool().kickoff, call_data)
+            except CallTimeout:
+                # A timed-out turn counts against the model's latency SLO too
+                model_router.observe(model, time.perf_counter() - started)
+                raise
+            elapsed = time.perf_counter() - started
+            model_router.observe(model, elapsed)
+            response_cache.store(
+                specialty, decision.issue_type, call_request.description or "",
+                call_request.patient_name, response_text, cost=elapsed,
+                preferred_date=call_request.preferred_date, history=history,
+                tools_used=getattr(response_text, "tools_used", ())
+            )
+        next_steps = get_next_steps(response_text)
+    else:
+        with stage("template_response"):
+            template = template_response(decision, history_length)
+            response_text = template.render(call_request.patient_name)
+        next_steps = template.next_steps
+    
+    with stage("history_append"):
+        append_turn(session_id, {
             "user": call_request.description,
             "agent": response_text
         })
-        
-        next_steps = []
-        if "appointment" in response_text.lower():
-            next_steps = ["Choose preferred appointment time", "Confirm specialist preference", "Receive appointment confirmation"]
-        else:
-            next_steps = ["Provide more details if needed", "Proceed to book appointment", "Receive appointment confirmation"]
-        
+    
+    with stage("response_build"):
         response = CallResponse(
-            call_id=f"CALL-{hash(session_id)}",
+            call_id=call_id,
             status="processed",
             assistant_response=response_text,
             next_steps=next_steps
         )
-        return response
+    return response
+
+@app.post("/api/call/process")
+async def process_call(call_request: CallRequest, response: Response = None,
+                       idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None) -> CallResponse:
+    """
+    Serve one call turn. With an Idempotency-Key header, a retry of the same
+    request gets the stored response (marked Idempotent-Replayed) instead of
+    a second turn.
+    """
+    async def run_call() -> dict:
+        # Stored as JSON, so a retry that reaches another worker can be replayed there
+        return (await handle_call(call_request)).model_dump(mode="json")
+
+    try:
+        if idempotency_key is None:
+            return await handle_call(call_request)
+        result, replayed = await idempotency_cache.run(
+            f"process:{call_request.phone_number}:{idempotency_key}",
+            request_fingerprint(call_request.model_dump_json()),
+            run_call,
+        )
+        if replayed:
+            logger.info(f"Replayed call {result['call_id']} for a retried request")
+            if response is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+        return CallResponse.model_validate(result)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except CallQueueFull as e:
+        raise busy_response(e)
+    except CallTimeout:
+        raise HTTPException(status_code=504, detail="Call processing timed out")
     except Exception as e:
         logger.error(f"Error processing call: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing call")
 
+async def claim_idempotency_key(key: str, body: str) -> Claim:
+    """Claim an Idempotency-Key for a streamed response; 422 when it was used for another request"""
+    try:
+        return await idempotency_cache.begin(key, request_fingerprint(body))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def replay_stream(claim: Claim) -> StreamingResponse:
+    logger.info(f"Replayed {len(claim.result)} streamed lines for a retried request")
+    return StreamingResponse(iter(claim.result), media_type="application/x-ndjson",
+                             headers={"Idempotent-Replayed": "true"})
+
+class ClaimedStreamingResponse(StreamingResponse):
+    """
+    NDJSON response that gives up its idempotency claim however the response
+    ends; `replayable` finishes the claim first when the body was sent in full.
+    A client that disconnects before the body starts never runs the body
+    generator, so the claim is released here instead.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], claim: Optional[Claim]):
+        super().__init__(replayable(content, claim), media_type="application/x-ndjson")
+        self.claim = claim
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.claim is not None:
+                idempotency_cache.abandon(self.claim)  # no-op once the stream finished it
+
+async def replayable(lines: AsyncIterator[bytes], claim: Optional[Claim]) -> AsyncIterator[bytes]:
+    """Pass streamed lines through; with a claim, keep them for retries once the stream ends without an error"""
+    if claim is None:
+        async for line in lines:
+            yield line
+        return
+    sent: List[bytes] = []
+    try:
+        async for line in lines:
+            sent.append(line)
+            yield line
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client went away mid-stream; its retry runs the request again
+        idempotency_cache.abandon(claim)
+        raise
+    except Exception as e:
+        idempotency_cache.abandon(claim, e)
+        raise
+    if sent and sent[-1] == STREAM_ERROR:
+        idempotency_cache.abandon(claim)
+    else:
+        # Stored as text so the shared table can hold it as JSON
+        idempotency_cache.finish(claim, [line.decode("utf-8") for line in sent])
+
+async def handle_batch_record(data: dict) -> dict:
+    """Batch handler: validate one JSONL record and serve it like /api/call/process"""
+    call_request = CallRequest.model_validate(data)  # ValidationError is a ValueError
+    response = await handle_call(call_request)
+    return response.model_dump()
+
+@app.post("/api/call/batch")
+async def process_call_batch(request: Request,
+                             idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None
+                             ) -> StreamingResponse:
+    """
+    Process a JSONL body of CallRequest records, streaming one JSONL result
+    per record. With an Idempotency-Key header, a retry of the same body
+    replays the results of the first complete run.
+    """
+    body = (await request.body()).decode("utf-8")
+    records = list(parse_records(body.splitlines()))
+    if len(records) > settings.BATCH_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {settings.BATCH_MAX_RECORDS} records")
+    claim = None
+    if idempotency_key is not None:
+        claim = await claim_idempotency_key(f"batch:{idempotency_key}", body)
+        if claim.replayed:
+            return replay_stream(claim)
+    logger.info(f"Processing batch of {len(records)} calls")
+    processor = BatchProcessor.from_settings(handle_batch_record)
+
+    async def results():
+        async for result in processor.run(records):
+            yield ndjson_event(result)
+
+    return ClaimedStreamingResponse(results(), claim)
+
+async def response_chunks(call_request: CallRequest, decision: RouteDecision,
+                          template: Optional[ResponseTemplate] = None) -> AsyncIterator[str]:
+    """
+    Response text for one turn, yielded as it is produced.
+
+    The crew tier streams from the LLM and expects the caller to hold an
+    executor slot; the template tier yields `template` (selected here when not
+    given) one sentence at a time.
+    """
+    session_id = call_request.phone_number
+    description = call_request.description or ""
+    if decision.tier == CREW:
+        with stage("context"):
+            prompt = build_agent_prompt(
+                issue_type=decision.issue_type,
+                patient_name=call_request.patient_name,
+                description=description,
+                context=get_conversation_context(session_id)
+            )
+        model = choose_model(call_request, decision, session_store.turn_count(session_id))
+        started = time.perf_counter()
+        # Closed on the way out, so a timeout or an early stop ends the LLM request
+        async with aclosing(stream_llm(get_streaming_llm(), prompt, model)) as chunks:
+            async for chunk in chunks:
+                if time.perf_counter() - started > call_executor.timeout:
+                    model_router.observe(model, time.perf_counter() - started)
+                    raise CallTimeout(f"Call did not finish within {call_executor.timeout}s")
+                yield chunk
+        elapsed = time.perf_counter() - started
+        observe_stage("llm_stream", elapsed)
+        model_router.observe(model, elapsed)
+    else:
+        if template is None:
+            template = template_response(decision, session_store.turn_count(session_id))
+        for sentence in iter_sentences(template.render(call_request.patient_name)):
+            yield sentence
+
+def finish_turn(call_request: CallRequest, response_text: str,
+                template: Optional[ResponseTemplate] = None) -> dict:
+    """Record a streamed turn in the session and return the trailer sent after the last chunk"""
+    session_id = call_request.phone_number
+    with stage("history_append"):
+        append_turn(session_id, {
+            "user": call_request.description,
+            "agent": response_text
+        })
+    return {
+        "call_id": new_call_id(),
+        "status": "processed",
+        "next_steps": template.next_steps if template is not None else get_next_steps(response_text)
+    }
+
+@app.post("/api/call/process/stream")
+async def process_call_stream(call_request: CallRequest,
+                              idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None
+                              ) -> StreamingResponse:
+    """
+    Stream the assistant response as NDJSON chunks, ending with a call
+    trailer. With an Idempotency-Key header, a retry of the same request
+    replays the events of the first complete stream.
+    """
+    session_id = call_request.phone_number
+    description = call_request.description or ""
+    claim = None
+    if idempotency_key is not None:
+        claim = await claim_idempotency_key(
+            f"stream:{session_id}:{idempotency_key}", call_request.model_dump_json()
+        )
+        if claim.replayed:
+            return replay_stream(claim)
+    logger.info(f"Streaming call from {call_request.patient_name}")
+    try:
+        history_length = await load_history(session_id)
+        with stage("routing"):
+            decision = call_router.route(
+                call_request.issue_type, description, history_length, crew_enabled=settings.STREAM_LLM_RESPONSES
+            )
+        record_call(decision.specialty, decision.issue_type, decision.tier)
+        use_llm = decision.tier == CREW
+        template = None if use_llm else template_response(decision, history_length)
+        if use_llm:
+            # Check admission before the response starts so an overloaded server can still answer 503;
+            # the slot itself is taken in events(), which only runs once the body is being sent
+            call_executor.check_admission()
+    except BaseException as e:
+        if claim is not None:
+            # Duplicates waiting on this request run it themselves
+            idempotency_cache.abandon(claim)
+        if isinstance(e, CallQueueFull):
+            raise busy_response(e)
+        raise
+
+    async def events():
+        parts = []
+        acquired = False
+        try:
+            if use_llm:
+                await call_executor.acquire()
+                acquired = True
+            started = time.perf_counter()
+            async with aclosing(response_chunks(call_request, decision, template)) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield ndjson_event({"type": "chunk", "text": chunk})
+        except Exception as e:
+            logger.error(f"Error streaming call: {str(e)}")
+            yield STREAM_ERROR
+            return
+        finally:
+            if acquired:
+                call_executor.release(time.perf_counter() - started)
+
+        yield ndjson_event({"type": "done", **finish_turn(call_request, "".join(parts), template)})
+
+    return ClaimedStreamingResponse(events(), claim)
+
+@app.websocket("/api/call/session")
+async def voice_session(websocket: WebSocket):
+    """
+    Persistent voice channel for one call.
+
+    The client opens with {"type": "start", patient_name, phone_number,
+    issue_type}, then sends {"type": "transcript", "text", "final"} for every
+    speech recognition result, interim ones included. The server answers with
+    "chunk" events and a "done" trailer per turn, and "cancelled" when the
+    caller talks over a response.
+    """
+    await websocket.accept()
+    try:
+        start = await websocket.receive_json()
+        caller = CallRequest.model_validate({**start, "description": None})
+    except (ValidationError, ValueError, TypeError):
+        await websocket.send_json({"type": "error", "detail": "Expected a start message with caller details"})
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        return
+    session_id = caller.phone_number
+    await load_history(session_id)
+    logger.info(f"Voice session opened for {caller.patient_name}")
+
+    async def produce(text: str) -> AsyncIterator[str]:
+        call_request = caller.model_copy(update={"description": text})
+        decision = call_router.decide(
+            caller.issue_type, text, session_store.turn_count(session_id), crew_enabled=settings.STREAM_LLM_RESPONSES
+        )
+        if decision.tier != CREW:
+            async for chunk in response_chunks(call_request, decision):
+                yield chunk
+            return
+        await call_executor.acquire()
+        started = time.perf_counter()
+        try:
+            async with aclosing(response_chunks(call_request, decision)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            call_executor.release(time.perf_counter() - started)
+
+    def commit(text: str, response_text: str) -> dict:
+        call_request = caller.model_copy(update={"description": text})
+        history_length = session_store.turn_count(session_id)
+        with stage("routing"):
+            decision = call_router.route(
+                caller.issue_type, text, history_length, crew_enabled=settings.STREAM_LLM_RESPONSES
+            )
+        record_call(decision.specialty, decision.issue_type, decision.tier)
+        template = None if decision.tier == CREW else template_response(decision, history_length)
+        return finish_turn(call_request, response_text, template)
+
+    session = VoiceSession.from_settings(websocket.send_json, produce, commit)
+    await websocket.send_json({"type": "ready", "session_id": session_id})
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError):
+                # Not JSON, or a binary frame; the frame is consumed, so the session goes on
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object message"})
+                continue
+            if message.get("type") == "transcript":
+                await session.transcript(str(message.get("text") or ""), bool(message.get("final")))
+            elif message.get("type") == "end":
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
+        logger.info(f"Voice session closed for {caller.patient_name}: {session.stats()}")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of call, stage, tool and LLM metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+def require_bearer(token: Optional[str], authorization: Optional[str], disabled: str) -> None:
+    """404 while `token` is unset, 401 unless the request carries it as a bearer token"""
+    if not token:
+        raise HTTPException(status_code=404, detail=disabled)
+    expected = f"Bearer {token}"
+    if not authorization or not secrets.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="A valid bearer token is required",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+@app.put("/metrics/enabled")
+async def toggle_metrics(toggle: MetricsToggle, authorization: Annotated[Optional[str], Header()] = None):
+    """Switch metric recording on or off without restarting"""
+    require_bearer(settings.METRICS_TOGGLE_TOKEN, authorization, "Runtime metrics toggling is disabled")
+    registry.enabled = toggle.enabled
+    logger.info(f"Metrics recording {'enabled' if toggle.enabled else 'disabled'}")
+    return {"enabled": registry.enabled}
+
+@app.get("/api/recordings")
+async def export_recordings(phone_number: Optional[str] = None, since: Optional[datetime] = None,
+                            until: Optional[datetime] = None,
+                            authorization: Annotated[Optional[str], Header()] = None) -> StreamingResponse:
+    """Recorded turns as NDJSON, optionally for one caller and/or a [since, until) time range"""
+    require_bearer(settings.RECORDING_EXPORT_TOKEN if call_recorder.enabled else None, authorization,
+                   "Recording export is disabled")
+    records = call_recorder.export(
+        phone_number, since.timestamp() if since else None, until.timestamp() if until else None
+    )
+    return StreamingResponse((ndjson_event(record) for record in records), media_type="application/x-ndjson")
+
 @app.get("/api/services")
-async def get_services():
-    services = [
-        {"id": "1", "name": "Cardiology", "duration": "45 mins"},
-        {"id": "2", "name": "Gastroenterology", "duration": "45 mins"},
-        {"id": "3", "name": "Neurology", "duration": "45 mins"},
-        {"id": "4", "name": "Orthopedics", "duration": "45 mins"},
-        {"id": "5", "name": "General Consultation", "duration": "30 mins"},
-    ]
-    return {"services": services}
+async def get_services(request: Request) -> Response:
+    """The service catalog, pre-serialized; answers 304 when the caller's ETag is current"""
+    catalog = service_catalog.current()
+    headers = {"ETag": catalog.etag, "Cache-Control": service_catalog.cache_control}
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(catalog.body, media_type="application/json", headers=headers)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from .server import serve
+    serve()
@@ -0,0 +1,222 @@
+"""Lightweight in-process metrics with Prometheus text exposition"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+# Seconds; spans template turns (microseconds) up to slow CPU-only LLM calls
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(row)) for labels, row in self._values.items()]
+        names = self.labelnames + ("le",)
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {row[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds counters/histograms plus gauge collectors and renders them for /metrics.
+
+    Recording is a no-op while `enabled` is False, so instrumentation can be
+    switched off at runtime without touching call sites.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[object] = []
+        self._collectors: List[Tuple[str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, help_text: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """Register a gauge family whose samples are read from `collect()` at scrape time"""
+        self._collectors.append((name, help_text, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, collect in self._collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for suffix, labels, value in collect():
+                label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                lines.append(f"{name}{suffix}{label_text} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+stage_seconds = registry.histogram(
+    "call_stage_seconds", "Time spent in each call processing stage", ("stage",)
+)
+calls_total = registry.counter(
+    "calls_total", "Processed calls by specialty, issue type and serving tier", ("specialty", "issue_type", "tier")
+)
+tool_seconds = registry.histogram(
+    "agent_tool_seconds", "Agent tool call latency", ("tool",)
+)
+llm_seconds = registry.histogram(
+    "llm_request_seconds", "Ollama request latency", ("endpoint",)
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens processed by Ollama", ("kind",)
+)
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stage_seconds.observe(time.perf_counter() - self.started, self.name)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """Time a block into call_stage_seconds{stage=name}"""
+    return _Stage(name) if registry.enabled else _NO_STAGE
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage timed by the caller, for spans a `with` block cannot wrap"""
+    if registry.enabled:
+        stage_seconds.observe(seconds, name)
+
+
+def record_call(specialty: str, issue_type: str, tier: str) -> None:
+    if registry.enabled:
+        calls_total.inc(specialty, issue_type, tier)
+
+
+def record_llm(endpoint: str, seconds: float, prompt_tokens: Optional[int] = None,
+               completion_tokens: Optional[int] = None) -> None:
+    if not registry.enabled:
+        return
+    llm_seconds.observe(seconds, endpoint)
+    if prompt_tokens:
+        llm_tokens.inc("prompt", amount=prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc("completion", amount=completion_tokens)
+
+
+def instrument_tool(func: Callable) -> Callable:
+    """Wrap an agent tool so each call is timed into agent_tool_seconds"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            tool_seconds.observe(time.perf_counter() - started, func.__name__)
+    return wrapper
+
+
+def stats_collector(stats: Callable[[], Dict[str, float]], **labels: str) -> Callable[[], Iterator[Sample]]:
+    """Expose a component's stats() dict as gauge samples labelled by stat name"""
+    def collect() -> Iterator[Sample]:
+        for key, value in stats().items():
+            if isinstance(value, (int, float)):
+                yield "", {**labels, "stat": key}, value
+    return collect
@@ -0,0 +1,186 @@
+"""Per-turn model choice: small models for simple turns, larger ones for complex turns"""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional
+
+from .config import AVAILABLE_MODELS, ISSUE_COMPLEXITY, MODEL_QUALITY_RANKS, MODEL_SPEED_RANKS, settings
+
+logger = logging.getLogger(__name__)
+
+# Descriptions this short are answers like "yes, Tuesday works"
+_CONFIRMATION_WORDS = 4
+# Turns measured before a model's p95 is trusted; one slow model load should not exile it
+_MIN_SAMPLES = 5
+
+
+def turn_complexity(issue_type: str, description: Optional[str], history_length: int) -> float:
+    """
+    0 for a turn any model can answer, 1 for one that needs the best model.
+
+    The issue type sets the base (ISSUE_COMPLEXITY); a long description or a
+    long conversation adds to it, a short confirmation-style reply takes
+    away from it.
+    """
+    score = ISSUE_COMPLEXITY.get(issue_type, ISSUE_COMPLEXITY["other"])
+    words = len((description or "").split())
+    if words <= _CONFIRMATION_WORDS:
+        score -= 0.3
+    else:
+        score += min(0.3, words / 200)
+    score += min(0.2, history_length * 0.02)
+    return min(1.0, max(0.0, score))
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """An AVAILABLE_MODELS entry with its speed and quality labels as ranks"""
+    name: str
+    speed: int
+    quality: int
+
+
+def model_ladder(models: Iterable[str]) -> List[ModelProfile]:
+    """
+    The models worth routing to, fastest first and best last.
+
+    A model that another one matches or beats on both speed and quality is
+    left out. Raises ValueError for models missing from AVAILABLE_MODELS.
+    """
+    profiles = []
+    for name in dict.fromkeys(models):
+        if name not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model '{name}'; add it to AVAILABLE_MODELS")
+        info = AVAILABLE_MODELS[name]
+        profiles.append(ModelProfile(name, MODEL_SPEED_RANKS[info["speed"]], MODEL_QUALITY_RANKS[info["quality"]]))
+    kept: List[ModelProfile] = []
+    # Best first; each model kept must be faster than every better one
+    for profile in sorted(profiles, key=lambda profile: (-profile.quality, -profile.speed)):
+        if not kept or profile.speed > kept[-1].speed:
+            kept.append(profile)
+    return kept[::-1]
+
+
+def _p95(latencies: Iterable[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+@dataclass
+class ModelChoice:
+    """The model serving a turn, and why"""
+    model: str
+    preferred: str
+    complexity: float
+    reason: str
+
+
+class ModelRouter:
+    """
+    Pick the model for each LLM-served turn.
+
+    Turn complexity selects a rung on the model ladder: simple turns go to
+    the fastest model, complex ones to the best. When the selected model's
+    p95 over its last `window` turns is above `slo_seconds`, the turn moves
+    down to the next faster model that is within the SLO (the fastest one
+    when none is). A model over its SLO still gets one turn every
+    `probe_seconds`, and a probe that comes back within the SLO clears its
+    old measurements.
+    """
+
+    def __init__(self, models: Iterable[str], slo_seconds: float = 10, window: int = 20,
+                 probe_seconds: float = 30, enabled: bool = True):
+        self.ladder = model_ladder(models)
+        if not self.ladder:
+            raise ValueError("No models to route between")
+        self.slo_seconds = slo_seconds
+        self.probe_seconds = probe_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {
+            profile.name: deque(maxlen=window) for profile in self.ladder
+        }
+        self._last_used: Dict[str, float] = {}
+        self._probing: set = set()
+        self._turns: Dict[str, int] = {profile.name: 0 for profile in self.ladder}
+        self._stats = {"turns": 0, "fallbacks": 0, "probes": 0}
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "ModelRouter":
+        if app_settings.MODEL_ROUTING_MODELS:
+            models = [name.strip() for name in app_settings.MODEL_ROUTING_MODELS.split(",") if name.strip()]
+        else:
+            models = list(AVAILABLE_MODELS)
+        return cls(
+            models,
+            slo_seconds=app_settings.MODEL_LATENCY_SLO_SECONDS,
+            window=app_settings.MODEL_LATENCY_WINDOW,
+            probe_seconds=app_settings.MODEL_PROBE_SECONDS,
+            enabled=app_settings.MODEL_ROUTING,
+        )
+
+    @property
+    def models(self) -> List[str]:
+        return [profile.name for profile in self.ladder]
+
+    def _over_slo(self, model: str) -> bool:
+        latencies = self._latencies[model]
+        return len(latencies) >= _MIN_SAMPLES and _p95(latencies) > self.slo_seconds
+
+    def choose(self, issue_type: str, description: Optional[str], history_length: int) -> ModelChoice:
+        complexity = turn_complexity(issue_type, description, history_length)
+        rung = min(len(self.ladder) - 1, int(complexity * len(self.ladder)))
+        preferred = self.ladder[rung].name
+        now = time.monotonic()
+        with self._lock:
+            model, reason = self.ladder[0].name, "every model is over the latency SLO"
+            for profile in reversed(self.ladder[:rung + 1]):
+                if not self._over_slo(profile.name):
+                    model, reason = profile.name, f"complexity {complexity:.2f}"
+                    break
+                if now - self._last_used.get(profile.name, 0.0) >= self.probe_seconds:
+                    model, reason = profile.name, "probing a model over the latency SLO"
+                    self._probing.add(model)
+                    self._stats["probes"] += 1
+                    break
+            if model != preferred:
+                self._stats["fallbacks"] += 1
+                if reason.startswith("complexity"):
+                    reason = f"{preferred} is over the latency SLO"
+            self._last_used[model] = now
+            self._turns[model] += 1
+            self._stats["turns"] += 1
+        return ModelChoice(model=model, preferred=preferred, complexity=complexity, reason=reason)
+
+    def observe(self, model: Optional[str], seconds: float) -> None:
+        """Record how long a turn on `model` took; None (routing off) is ignored"""
+        if model is None or model not in self._latencies:
+            return
+        with self._lock:
+            latencies = self._latencies[model]
+            if model in self._probing:
+                self._probing.discard(model)
+                if seconds <= self.slo_seconds:
+                    logger.info(f"Model {model} is back within the latency SLO ({seconds:.2f}s)")
+                    latencies.clear()
+            latencies.append(seconds)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            latencies = self._latencies[model]
+            return _p95(latencies) if latencies else None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            for name, latencies in self._latencies.items():
+                stats[f"turns:{name}"] = self._turns[name]
+                stats[f"p95_seconds:{name}"] = _p95(latencies) if latencies else 0.0
+                stats[f"over_slo:{name}"] = int(self._over_slo(name))
+        return stats
+
+
+model_router = ModelRouter.from_settings()
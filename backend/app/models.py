@@ -19,7 +19,7 @@ class IssueType(str, Enum):
 class PatientInfo(BaseModel):
     """Patient information model"""
     name: str = Field(..., min_length=1, max_length=100)
-    phone_number: str = Field(..., regex=r'^[+]?[0-9\-\s()]+$')
+    phone_number: str = Field(..., pattern=r'^[+]?[0-9\-\s()]+$')
     email: Optional[str] = None
     date_of_birth: Optional[str] = None
     medical_id: Optional[str] = None
@@ -71,6 +71,7 @@ class Service(BaseModel):
     id: str
     name: str
     description: Optional[str] = None
+    specialty: Optional[str] = None
     duration: int  # in minutes
     cost: Optional[float] = None
     availability: Optional[List[str]] = None
@@ -86,6 +87,7 @@ class Appointment(BaseModel):
     duration: int
     status: str  # scheduled, completed, cancelled
     confirmation_number: str
+    doctor_id: Optional[str] = None
     notes: Optional[str] = None
 
 
@@ -0,0 +1,447 @@
+"""Durable call transcript log: compressed, append-only segments with a per-phone index
+
+    python -m app.recording export --phone +15551234567 --since 2026-01-01 > calls.jsonl
+
+Turns are queued by `record()` and written by a background thread. Each
+commit writes everything queued so far as one block: a fixed header (first
+and last timestamp, sizes, CRC), where each caller's turns sit in the
+block, and the turns as zlib-compressed JSON lines. Commits are spaced at least
+`commit_interval` apart, so under load many turns share one write and fsync
+(group commit) while a lone turn is written at once.
+
+Blocks are appended to segment files named after their start time and the
+writing process, so every worker appends to its own files and nothing is
+ever rewritten. A segment is sealed once it reaches `segment_bytes`. The
+index maps each phone number to the blocks holding its turns and keeps each
+block's time range; it is rebuilt at startup from the block headers alone,
+and a torn block at the end of a segment (a crash mid-write) is skipped.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Turn = Dict[str, str]
+
+_MAGIC = b"CTL1"
+# magic, phone list length, payload length, CRC32 of both, first and last timestamp.
+# The phone list has a "phone<TAB>first line<TAB>line count" entry per caller in the block.
+_HEADER = struct.Struct("<4sIIIdd")
+_SUFFIX = ".seg"
+
+
+@dataclass(frozen=True)
+class _Block:
+    segment: str
+    offset: int
+    size: int
+    first_ts: float
+    last_ts: float
+
+
+class _Flush:
+    """Queue marker: set once every record queued before it is on disk"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+def _encode(records: List[tuple]) -> Tuple[bytes, bytes, Dict[str, Tuple[int, int]]]:
+    """Phone list and payload for one block; each caller's turns are stored together, in time order"""
+    records = sorted(records, key=lambda record: record[1])
+    spans: Dict[str, Tuple[int, int]] = {}
+    lines = []
+    for ts, session, user, agent in records:
+        start, count = spans.get(session, (len(lines), 0))
+        spans[session] = (start, count + 1)
+        lines.append(json.dumps({"ts": ts, "session": session, "user": user, "agent": agent}, ensure_ascii=False))
+    keys = "\n".join(f"{session}\t{start}\t{count}" for session, (start, count) in spans.items())
+    return keys.encode("utf-8"), zlib.compress("\n".join(lines).encode("utf-8"), 6), spans
+
+
+def _decode_keys(keys: bytes) -> Dict[str, Tuple[int, int]]:
+    spans = {}
+    for line in keys.decode("utf-8").split("\n") if keys else ():
+        session, start, count = line.rsplit("\t", 2)
+        spans[session] = (int(start), int(count))
+    return spans
+
+
+class CallRecorder:
+    """
+    Append-only transcript log in `directory`.
+
+    `record()` never blocks a request: when `queue_size` turns are already
+    waiting for the writer, new ones are dropped and counted. `history()`,
+    `export()` and `flush()` may be called from any thread.
+    """
+
+    def __init__(self, directory: str, enabled: bool = True, segment_bytes: int = 64 * 1024 * 1024,
+                 commit_interval: float = 0.05, batch_max: int = 256, queue_size: int = 100000,
+                 fsync: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.batch_max = batch_max
+        self.queue_size = queue_size
+        self.fsync = fsync
+        self._index_lock = threading.Lock()
+        self._blocks: Dict[str, List[_Block]] = {}  # segment -> blocks in file order
+        self._by_session: Dict[str, List[Tuple[_Block, Tuple[int, int]]]] = {}  # phone -> (block, line span)
+        self._scanned: Dict[str, int] = {}  # segment -> bytes indexed
+        self._opened = False
+        self._restored: set = set()
+        self._reset_writer()
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "CallRecorder":
+        return cls(
+            app_settings.RECORDING_DIR,
+            enabled=app_settings.ENABLE_CALL_RECORDING,
+            segment_bytes=app_settings.RECORDING_SEGMENT_BYTES,
+            commit_interval=app_settings.RECORDING_COMMIT_INTERVAL_MS / 1000,
+            batch_max=app_settings.RECORDING_BATCH_MAX,
+            queue_size=app_settings.RECORDING_QUEUE_SIZE,
+            fsync=app_settings.RECORDING_FSYNC,
+        )
+
+    def _reset_writer(self) -> None:
+        self._queue: "queue.Queue" = queue.Queue(self.queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._own: set = set()
+        self._file = None
+        self._segment: Optional[str] = None
+        self._segment_size = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "records": 0,
+            "blocks": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "dropped": 0,
+            "segments_written": 0,
+            "commit_seconds_total": 0.0,
+            "commit_seconds_max": 0.0,
+        }
+
+    def after_fork(self) -> None:
+        """Give a forked worker its own writer and segments; the parent's index is kept"""
+        self._index_lock = threading.Lock()
+        self._reset_writer()
+
+    # Writing
+
+    def record(self, session_id: str, turn: Turn) -> None:
+        """Queue a turn for the log; returns immediately"""
+        if not self.enabled:
+            return
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), session_id, turn.get("user"), turn.get("agent")))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+                dropped = self._stats["dropped"]
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Call recording queue is full, {dropped} turns dropped so far")
+
+    def _start(self) -> None:
+        with self._writer_lock:
+            if self._writer is None:
+                self._open()
+                self._writer = threading.Thread(target=self._run, name="call-recorder", daemon=True)
+                self._writer.start()
+
+    def _run(self) -> None:
+        last_commit = 0.0
+        while True:
+            item = self._queue.get()
+            # Space commits out so turns arriving meanwhile share the next write and fsync
+            wait = last_commit + self.commit_interval - time.monotonic()
+            if wait > 0 and self._queue.qsize() < self.batch_max:
+                time.sleep(wait)
+            batch: List[tuple] = []
+            markers: List[_Flush] = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _Flush):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_max:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    logger.error(f"Could not write {len(batch)} recorded turns: {str(e)}")
+                last_commit = time.monotonic()
+            for marker in markers:
+                marker.done.set()
+            if stop:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _roll(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = f"{int(time.time() * 1000):013d}-{os.getpid()}{_SUFFIX}"
+        self._segment = name
+        self._segment_size = 0
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._own.add(name)
+        with self._index_lock:
+            self._blocks[name] = []
+            self._scanned[name] = 0
+        with self._stats_lock:
+            self._stats["segments_written"] += 1
+
+    def _commit(self, batch: List[tuple]) -> None:
+        started = time.perf_counter()
+        keys, payload, spans = _encode(batch)
+        header = _HEADER.pack(_MAGIC, len(keys), len(payload), zlib.crc32(payload, zlib.crc32(keys)),
+                              batch[0][0], batch[-1][0])
+        if self._file is None or self._segment_size >= self.segment_bytes:
+            self._roll()
+        offset = self._segment_size
+        self._file.write(header + keys + payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        size = _HEADER.size + len(keys) + len(payload)
+        self._segment_size += size
+        block = _Block(self._segment, offset, size, batch[0][0], batch[-1][0])
+        with self._index_lock:
+            self._add_block(block, spans)
+            self._scanned[self._segment] = self._segment_size
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["records"] += len(batch)
+            self._stats["blocks"] += 1
+            self._stats["raw_bytes"] += sum(len(record[2] or "") + len(record[3] or "") for record in batch)
+            self._stats["stored_bytes"] += size
+            self._stats["commit_seconds_total"] += elapsed
+            self._stats["commit_seconds_max"] = max(self._stats["commit_seconds_max"], elapsed)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every turn recorded so far is on disk"""
+        if self._writer is None:
+            return True
+        marker = _Flush()
+        self._queue.put(marker, timeout=timeout)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write out queued turns and stop the writer"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(_STOP, timeout=timeout)
+            writer.join(timeout)
+
+    # Index
+
+    def _add_block(self, block: _Block, spans: Dict[str, Tuple[int, int]]) -> None:
+        self._blocks.setdefault(block.segment, []).append(block)
+        for session_id, span in spans.items():
+            self._by_session.setdefault(session_id, []).append((block, span))
+
+    def _open(self) -> None:
+        if not self._opened:
+            os.makedirs(self.directory, exist_ok=True)
+            self._opened = True
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Index blocks appended since the last look, including other workers' segments"""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(_SUFFIX) or name in self._own:
+                continue
+            path = os.path.join(self.directory, name)
+            with self._index_lock:
+                scanned = self._scanned.get(name, 0)
+            if os.path.getsize(path) > scanned:
+                self._scan(name, path, scanned)
+
+    def _scan(self, name: str, path: str, offset: int) -> None:
+        with open(path, "rb") as fh:
+            fh.seek(offset)
+            while True:
+                header = fh.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, keys_len, payload_len, crc, first_ts, last_ts = _HEADER.unpack(header)
+                body = fh.read(keys_len + payload_len)
+                if magic != _MAGIC or len(body) < keys_len + payload_len or zlib.crc32(body) != crc:
+                    # Torn or still being written; look again from here next time
+                    break
+                spans = _decode_keys(body[:keys_len])
+                block = _Block(name, offset, _HEADER.size + keys_len + payload_len, first_ts, last_ts)
+                with self._index_lock:
+                    if self._scanned.get(name, 0) != offset:
+                        return  # another thread indexed this part meanwhile
+                    self._add_block(block, spans)
+                    self._scanned[name] = offset + block.size
+                offset += block.size
+
+    # Reading
+
+    def _lines(self, block: _Block) -> List[str]:
+        with open(os.path.join(self.directory, block.segment), "rb") as fh:
+            fh.seek(block.offset)
+            data = fh.read(block.size)
+        keys_len = _HEADER.unpack_from(data)[1]
+        return zlib.decompress(data[_HEADER.size + keys_len:]).decode("utf-8").split("\n")
+
+    def _read(self, block: _Block, span: Optional[Tuple[int, int]] = None) -> List[dict]:
+        """A block's turns in time order, or only the caller's turns at `span`"""
+        lines = self._lines(block)
+        if span is not None:
+            start, count = span
+            return [json.loads(line) for line in lines[start:start + count]]
+        return sorted((json.loads(line) for line in lines), key=lambda record: record["ts"])
+
+    def _spans(self, session_id: str) -> List[Tuple[_Block, Tuple[int, int]]]:
+        self._open()
+        with self._index_lock:
+            return list(self._by_session.get(session_id, ()))
+
+    def __contains__(self, session_id: str) -> bool:
+        self._open()
+        with self._index_lock:
+            return session_id in self._by_session
+
+    def history(self, session_id: str, limit: Optional[int] = None, since: Optional[float] = None) -> List[Turn]:
+        """
+        The caller's most recent `limit` turns (all of them when None), oldest
+        first; with `since`, only turns recorded at or after that time
+        """
+        chunks: List[List[Turn]] = []
+        kept = 0
+        for block, span in sorted(self._spans(session_id), key=lambda entry: entry[0].last_ts, reverse=True):
+            if since is not None and block.last_ts < since:
+                break
+            chunk = [
+                {"user": record["user"], "agent": record["agent"]} for record in self._read(block, span)
+                if since is None or record["ts"] >= since
+            ]
+            chunks.append(chunk)
+            kept += len(chunk)
+            if limit and kept >= limit:
+                break
+        turns = [turn for chunk in reversed(chunks) for turn in chunk]
+        return turns[-limit:] if limit else turns
+
+    def export(self, session_id: Optional[str] = None, start: Optional[float] = None,
+               end: Optional[float] = None) -> Iterator[dict]:
+        """Recorded turns in time order, for one phone number and/or a [start, end) time range"""
+        if session_id is not None:
+            entries = self._spans(session_id)
+        else:
+            self._open()
+            with self._index_lock:
+                entries = [(block, None) for blocks in self._blocks.values() for block in blocks]
+        segments: Dict[str, list] = {}
+        for block, span in entries:
+            if (start is not None and block.last_ts < start) or (end is not None and block.first_ts >= end):
+                continue
+            segments.setdefault(block.segment, []).append((block, span))
+
+        def records(entries: list) -> Iterator[dict]:
+            for block, span in entries:
+                for record in self._read(block, span):
+                    if (start is not None and record["ts"] < start) or (end is not None and record["ts"] >= end):
+                        continue
+                    yield record
+
+        # Each segment is in time order; merge them since workers write side by side
+        return heapq.merge(*(records(entries) for entries in segments.values()), key=lambda record: record["ts"])
+
+    def restore(self, session_id: str, limit: Optional[int] = None, since: Optional[float] = None) -> List[Turn]:
+        """
+        Turns to seed an empty session with, the first time this process sees
+        the caller; empty afterwards so evicted sessions are not brought back.
+        Pass the session idle cutoff as `since` so a restart does not revive a
+        conversation the store would already have expired.
+        """
+        if not self.enabled or session_id in self._restored:
+            return []
+        self._restored.add(session_id)
+        if session_id not in self:
+            return []
+        return self.history(session_id, limit, since)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["compression_ratio"] = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0.0
+        with self._index_lock:
+            stats["segments"] = len(self._blocks)
+            stats["indexed_blocks"] = sum(len(blocks) for blocks in self._blocks.values())
+            stats["sessions"] = len(self._by_session)
+        return stats
+
+
+call_recorder = CallRecorder.from_settings()
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Look up and export recorded call transcripts")
+    parser.add_argument("command", choices=["export", "history", "stats"])
+    parser.add_argument("--dir", default=settings.RECORDING_DIR)
+    parser.add_argument("--phone", help="only this phone number")
+    parser.add_argument("--since", help="ISO date or time, inclusive")
+    parser.add_argument("--until", help="ISO date or time, exclusive")
+    parser.add_argument("--limit", type=int, help="history: most recent turns only")
+    args = parser.parse_args(argv)
+
+    recorder = CallRecorder(args.dir)
+    if args.command == "stats":
+        recorder._open()
+        print(json.dumps(recorder.stats()))
+    elif args.command == "history":
+        if not args.phone:
+            parser.error("history needs --phone")
+        for turn in recorder.history(args.phone, args.limit):
+            print(json.dumps(turn, ensure_ascii=False))
+    else:
+        for record in recorder.export(args.phone, _timestamp(args.since), _timestamp(args.until)):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Similarity-keyed cache for crew/LLM answers"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from .config import INTENT_KEYWORDS, settings
+from .specialty import SpecialtyMatcher, specialty_matcher
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Words that carry no meaning for "what is the caller asking for"
+STOPWORDS = frozenset("""
+a an and are am be can could do does for from get have having hi hello i i'd i'm in is it like me
+my need needs of on or please some that the there this to want wanted we with would you your
+doctor doctors help
+""".split())
+
+# Different ways of asking for the same thing collapse onto one intent feature
+INTENT_SYNONYMS = {word: intent for intent, words in INTENT_KEYWORDS.items() for word in words}
+
+NAME_PLACEHOLDER = "\x00patient_name\x00"
+
+# Answers to these issue types book, move or cancel something for one caller
+UNCACHEABLE_ISSUE_TYPES = frozenset({"appointment"})
+
+Partition = Tuple[str, str, str, str]  # specialty, issue type, preferred date, history fingerprint
+
+
+def history_fingerprint(turns: Iterable[Dict[str, Optional[str]]]) -> str:
+    """Digest of the conversation so far; "" for a caller's first turn"""
+    turns = list(turns)
+    if not turns:
+        return ""
+    encoded = json.dumps([[turn.get("user"), turn.get("agent")] for turn in turns], separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def _name_pattern(patient_name: str) -> "re.Pattern[str]":
+    # Whole words only: the name "Al" must not turn "Also" into a placeholder
+    return re.compile(rf"(?<!\w){re.escape(patient_name)}(?!\w)")
+
+
+def description_features(description: str, matcher: SpecialtyMatcher = specialty_matcher) -> Dict[str, float]:
+    """
+    Reduce a description to weighted intent/specialty/content features.
+
+    Specialty keywords ("heart", "cardiologist") and intent phrasings
+    ("book", "schedule", "appointment") are collapsed to one feature each, so
+    paraphrases of the same request end up with the same vector.
+    """
+    text = (description or "").lower()
+    features: Dict[str, float] = {}
+    covered = [False] * len(text)
+    for match in matcher.scan(text, lowered=True).matches:
+        if match.specialty != matcher.default:
+            features["specialty:" + match.specialty] = 2.0
+            covered[match.start:match.end] = [True] * (match.end - match.start)
+    for word in _WORD.finditer(text):
+        if covered[word.start()]:
+            continue
+        token = word.group()
+        if token in INTENT_SYNONYMS:
+            features["intent:" + INTENT_SYNONYMS[token]] = 2.0
+        elif token not in STOPWORDS:
+            features[token] = features.get(token, 0.0) + 1.0
+    return features
+
+
+def cosine(left: Dict[str, float], right: Dict[str, float]) -> float:
+    if not left or not right:
+        return 0.0
+    if len(left) > len(right):
+        left, right = right, left
+    dot = sum(weight * right.get(feature, 0.0) for feature, weight in left.items())
+    norm = math.sqrt(sum(w * w for w in left.values())) * math.sqrt(sum(w * w for w in right.values()))
+    return dot / norm
+
+
+@dataclass
+class _Entry:
+    partition: Partition
+    signature: frozenset
+    features: Dict[str, float]
+    template: str
+    expires_at: float
+    cost: float
+
+
+class ResponseCache:
+    """
+    LRU cache of crew answers partitioned by specialty, issue type,
+    preferred date and a fingerprint of the conversation so far, so an
+    answer is only reused for a caller in the same position.
+
+    Within a partition an exact feature-set match is an O(1) lookup; otherwise
+    the most recent `scan_limit` entries are compared by cosine similarity and
+    the best one at or above `threshold` is served. The patient name is
+    stored as a placeholder and filled in for the current caller on a hit.
+    Answers that act for one caller are never stored: appointment turns and
+    turns on which the crew called a tool (a booking, a callback).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, threshold: float = 0.85,
+                 scan_limit: int = 256, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.scan_limit = scan_limit
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._partitions: Dict[Partition, "OrderedDict[int, None]"] = {}
+        self._exact: Dict[Tuple[Partition, frozenset], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "evictions": 0, "expired": 0,
+                       "seconds_saved": 0.0}
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "ResponseCache":
+        return cls(
+            max_entries=app_settings.RESPONSE_CACHE_SIZE,
+            ttl=app_settings.RESPONSE_CACHE_TTL,
+            threshold=app_settings.RESPONSE_CACHE_SIMILARITY,
+            enabled=app_settings.RESPONSE_CACHE_ENABLED,
+        )
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        partition = self._partitions[entry.partition]
+        partition.pop(entry_id, None)
+        if not partition:
+            # Partitions include the conversation fingerprint, so most are used once
+            del self._partitions[entry.partition]
+        if self._exact.get((entry.partition, entry.signature)) == entry_id:
+            del self._exact[(entry.partition, entry.signature)]
+
+    def _find(self, partition: Partition, features: Dict[str, float]) -> Optional[int]:
+        exact = self._exact.get((partition, frozenset(features)))
+        if exact is not None:
+            return exact
+        best_id, best_score = None, self.threshold
+        candidates = self._partitions.get(partition, {})
+        for scanned, entry_id in enumerate(reversed(candidates)):
+            if scanned >= self.scan_limit:
+                break
+            score = cosine(features, self._entries[entry_id].features)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        return best_id
+
+    def lookup(self, specialty: str, issue_type: str, description: str, patient_name: str,
+               preferred_date: Optional[str] = None, history: str = "") -> Optional[str]:
+        """
+        Return a personalized cached answer for a similar earlier request, if
+        any; `history` is the conversation's history_fingerprint
+        """
+        if not self.enabled or issue_type in UNCACHEABLE_ISSUE_TYPES:
+            return None
+        features = description_features(description)
+        if not features:
+            # Greetings and small talk depend on the conversation, not the wording
+            return None
+        partition = (specialty, issue_type, preferred_date or "", history)
+        with self._lock:
+            entry_id = self._find(partition, features)
+            entry = self._entries.get(entry_id) if entry_id is not None else None
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._remove(entry_id)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self._partitions[partition].move_to_end(entry_id)
+            self._stats["hits"] += 1
+            self._stats["seconds_saved"] += entry.cost
+            template = entry.template
+        return template.replace(NAME_PLACEHOLDER, patient_name or "there")
+
+    def store(self, specialty: str, issue_type: str, description: str, patient_name: str,
+              response: str, cost: float = 0.0, preferred_date: Optional[str] = None, history: str = "",
+              tools_used: Sequence[str] = ()) -> None:
+        """
+        Cache an answer; `cost` is how long it took to produce, reported as
+        time saved on hits, and `tools_used` the tools called to produce it
+        """
+        if not self.enabled or not response:
+            return
+        if issue_type in UNCACHEABLE_ISSUE_TYPES or tools_used:
+            with self._lock:
+                self._stats["uncacheable"] += 1
+            return
+        features = description_features(description)
+        if not features:
+            return
+        partition = (specialty, issue_type, preferred_date or "", history)
+        template = _name_pattern(patient_name).sub(NAME_PLACEHOLDER, response) if patient_name else response
+        with self._lock:
+            signature = frozenset(features)
+            previous = self._exact.get((partition, signature))
+            if previous is not None:
+                self._remove(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(partition, signature, features, template,
+                                             time.monotonic() + self.ttl, cost)
+            self._partitions.setdefault(partition, OrderedDict())[entry_id] = None
+            self._exact[(partition, signature)] = entry_id
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+            self._exact.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["partitions"] = len(self._partitions)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache.from_settings()
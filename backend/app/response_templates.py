@@ -0,0 +1,150 @@
+"""Preparsed, localizable response templates for the deterministic tier"""
+
+import json
+import string
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from .config import RESPONSE_TEMPLATES, settings
+
+NextSteps = Tuple[str, ...]
+
+_FIELD = "patient_name"
+_BOOK, _DEFAULT, _FOLLOWUP, _GREETING = "book", "default", "followup", "greeting"
+
+
+class ResponseTemplate:
+    """
+    One response, split around its `{patient_name}` placeholders when loaded.
+
+    Rendering is a single join of the preparsed literals; `next_steps` is the
+    shared tuple chosen for this template, so nothing is derived per request.
+    """
+
+    __slots__ = ("key", "text", "next_steps", "fallback_name", "_literals")
+
+    def __init__(self, key: str, text: str, next_steps: NextSteps, fallback_name: str = "there"):
+        self.key = key
+        self.text = text
+        self.next_steps = next_steps
+        self.fallback_name = fallback_name
+        literals = [""]
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            literals[-1] += literal
+            if field is None:
+                continue
+            if field != _FIELD or spec or conversion:
+                raise ValueError(f"Template {key} may only use {{{_FIELD}}}, found {{{field}}}")
+            literals.append("")
+        self._literals = tuple(literals)
+
+    def render(self, patient_name: Optional[str]) -> str:
+        name = patient_name.strip() if patient_name else self.fallback_name
+        return name.join(self._literals)
+
+
+class _Locale:
+    """Templates and wording for one language, keyed by (specialty, variant)"""
+
+    def __init__(self, name: str, table: dict):
+        self.name = name
+        self.fallback_name = table.get("fallback_name", "there")
+        self.booking_cues = tuple(cue.lower() for cue in table.get("booking_cues", ()))
+        self.schedule_cues = tuple(cue.lower() for cue in table.get("schedule_cues", ()))
+        self.next_steps: Dict[str, NextSteps] = {
+            kind: tuple(steps) for kind, steps in table["next_steps"].items()
+        }
+        self.templates: Dict[str, Dict[str, ResponseTemplate]] = {}
+        for specialty, variants in table["templates"].items():
+            self.templates[specialty] = {
+                variant: self._template(f"{name}/{specialty}/{variant}", entry)
+                for variant, entry in variants.items()
+            }
+
+    def _template(self, key: str, entry: Union[str, dict]) -> ResponseTemplate:
+        if isinstance(entry, str):
+            entry = {"text": entry}
+        text = entry["text"]
+        kind = entry.get("next_steps") or self.next_steps_kind(text)
+        if kind not in self.next_steps:
+            raise ValueError(f"Template {key} uses unknown next_steps '{kind}'")
+        return ResponseTemplate(key, text, self.next_steps[kind], self.fallback_name)
+
+    def next_steps_kind(self, text: str) -> str:
+        """'schedule' when the text talks about scheduling, like the free-text rule for crew replies"""
+        return "schedule" if _contains_any(text.lower(), self.schedule_cues) else "details"
+
+
+def _contains_any(text: str, cues: Iterable[str]) -> bool:
+    for cue in cues:
+        if cue in text:
+            return True
+    return False
+
+
+class TemplateEngine:
+    """
+    Pick and render the deterministic response for a call turn.
+
+    Each locale maps specialty -> variant -> template. Specialties answer with
+    their "book" template when the description mentions a booking cue and
+    "default" otherwise; anything else gets the default specialty's "greeting"
+    on the first turn and "followup" after that. Templates are parsed once at
+    load time. Callers that already lowercased the description (the router
+    keeps it on RouteDecision.text) pass `lowered=True` so it is not copied
+    again.
+    """
+
+    def __init__(self, table: Dict[str, dict], locale: str = "en", default_specialty: str = "general"):
+        self.locales = {name: _Locale(name, entry) for name, entry in table.items()}
+        if locale not in self.locales:
+            raise ValueError(f"No response templates for locale '{locale}'")
+        self.locale = locale
+        self._default = self.locales[locale]
+        self.default_specialty = default_specialty
+        for entry in self.locales.values():
+            general = entry.templates.get(default_specialty, {})
+            if _GREETING not in general or _FOLLOWUP not in general:
+                raise ValueError(
+                    f"Locale '{entry.name}' needs '{_GREETING}' and '{_FOLLOWUP}' templates for {default_specialty}"
+                )
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "TemplateEngine":
+        """Built-in templates, with locales from RESPONSE_TEMPLATES_FILE added or replaced"""
+        table = dict(RESPONSE_TEMPLATES)
+        if app_settings.RESPONSE_TEMPLATES_FILE:
+            with open(app_settings.RESPONSE_TEMPLATES_FILE, encoding="utf-8") as fh:
+                table.update(json.load(fh))
+        return cls(table, locale=app_settings.RESPONSE_LOCALE, default_specialty=app_settings.DEFAULT_SPECIALTY)
+
+    def _locale(self, locale: Optional[str]) -> _Locale:
+        if locale is None:
+            return self._default
+        return self.locales.get(locale) or self._default
+
+    def select(self, specialty: str, description: Optional[str], history_length: int,
+               locale: Optional[str] = None, lowered: bool = False) -> ResponseTemplate:
+        """Template for the turn; `lowered=True` marks the description as already lowercase"""
+        entry = self._default if locale is None else self._locale(locale)
+        variants = entry.templates.get(specialty)
+        if variants is not None and specialty != self.default_specialty:
+            booking = False
+            if description:
+                text = description if lowered else description.lower()
+                for cue in entry.booking_cues:
+                    if cue in text:
+                        booking = True
+                        break
+            template = variants.get(_BOOK if booking else _DEFAULT)
+            if template is not None:
+                return template
+        general = entry.templates[self.default_specialty]
+        return general[_FOLLOWUP if history_length > 1 else _GREETING]
+
+    def next_steps_for(self, text: str, locale: Optional[str] = None) -> NextSteps:
+        """Next steps for free text with no template behind it, such as a crew reply"""
+        entry = self._locale(locale)
+        return entry.next_steps[entry.next_steps_kind(text)]
+
+
+response_templates = TemplateEngine.from_settings()
@@ -0,0 +1,132 @@
+"""Tiered call routing: deterministic templates first, the crew only when needed"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import INTENT_KEYWORDS, ISSUE_ROUTING, TEMPLATE_AGENT_FIT, settings
+from .specialty import SpecialtyMatcher, specialty_matcher
+
+DETERMINISTIC = "deterministic"
+CREW = "crew"
+
+# Intents the response templates know how to answer
+TEMPLATED_INTENTS = ("book", "unknown")
+
+_WORD = re.compile(r"[a-z]+")
+_INTENT_BY_WORD = {word: intent for intent, words in INTENT_KEYWORDS.items() for word in words}
+
+
+def intent_shares(description: Optional[str], lowered: bool = False) -> Dict[str, float]:
+    """Share of the description's intent words held by each intent, in order of first mention"""
+    text = description or ""
+    counts: Dict[str, int] = {}
+    for word in _WORD.findall(text if lowered else text.lower()):
+        intent = _INTENT_BY_WORD.get(word)
+        if intent:
+            counts[intent] = counts.get(intent, 0) + 1
+    total = sum(counts.values())
+    return {intent: count / total for intent, count in counts.items()}
+
+
+def detect_intent(description: Optional[str], lowered: bool = False) -> Tuple[str, float]:
+    """Return the dominant intent in the description and the share of intent words it holds"""
+    shares = intent_shares(description, lowered)
+    if not shares:
+        return "unknown", 0.0
+    intent = max(shares, key=shares.get)
+    return intent, shares[intent]
+
+
+@dataclass
+class RouteDecision:
+    """Which tier serves a call, and why"""
+    tier: str
+    specialty: str
+    intent: str
+    issue_type: str
+    agent: str
+    confidence: float
+    reason: str
+    text: str = ""  # the lowercased description, for later steps of the turn
+
+
+class TieredRouter:
+    """
+    Decide per turn whether the deterministic templates can answer.
+
+    Specialty (from the keyword matcher), intent and the agent ISSUE_ROUTING
+    assigns the caller's issue type (weighted by TEMPLATE_AGENT_FIT) give a
+    confidence score for the template tier; calls under `threshold`
+    escalate to the crew when crew escalation is enabled. Every decision is
+    counted per tier.
+    """
+
+    def __init__(self, matcher: SpecialtyMatcher = specialty_matcher, threshold: Optional[float] = None):
+        self.matcher = matcher
+        self._threshold = threshold
+        self._lock = threading.Lock()
+        self._served: Dict[str, int] = {DETERMINISTIC: 0, CREW: 0}
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold if self._threshold is not None else settings.ROUTER_CONFIDENCE_THRESHOLD
+
+    def _template_confidence(self, specialty: str, intent: str, history_length: int) -> Tuple[float, str]:
+        if intent not in TEMPLATED_INTENTS:
+            return 0.2, f"no template for '{intent}' requests"
+        if specialty != self.matcher.default:
+            return 0.9, f"{specialty} template"
+        if intent == "book":
+            return 0.7, "general booking template"
+        if history_length <= 1:
+            return 0.8, "greeting template"
+        return 0.3, "no specialty or intent recognised"
+
+    def _confidence(self, agent: str, specialty: str, intent: str, history_length: int) -> Tuple[float, str]:
+        confidence, reason = self._template_confidence(specialty, intent, history_length)
+        fit = TEMPLATE_AGENT_FIT.get(agent, 1.0)
+        if fit < 1.0:
+            return round(confidence * fit, 2), f"{reason}, weighted {fit:g} for {agent} calls"
+        return confidence, reason
+
+    def decide(self, issue_type: str, description: Optional[str], history_length: int,
+               crew_enabled: Optional[bool] = None) -> RouteDecision:
+        """Routing decision without counting it, for planning ahead of serving"""
+        issue_type = issue_type if issue_type in ISSUE_ROUTING else "other"
+        text = (description or "").lower()
+        specialty = self.matcher.classify(text, lowered=True)
+        intent, _ = detect_intent(text, lowered=True)
+        agent = ISSUE_ROUTING[issue_type]
+        confidence, reason = self._confidence(agent, specialty, intent, history_length)
+        if crew_enabled is None:
+            crew_enabled = settings.USE_CREW
+        tier = CREW if crew_enabled and confidence < self.threshold else DETERMINISTIC
+        return RouteDecision(
+            tier=tier,
+            specialty=specialty,
+            intent=intent,
+            issue_type=issue_type,
+            agent=agent,
+            confidence=confidence,
+            reason=reason,
+            text=text,
+        )
+
+    def route(self, issue_type: str, description: Optional[str], history_length: int,
+              crew_enabled: Optional[bool] = None) -> RouteDecision:
+        decision = self.decide(issue_type, description, history_length, crew_enabled)
+        with self._lock:
+            self._served[decision.tier] += 1
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            served = dict(self._served)
+        total = sum(served.values())
+        served["deterministic_share"] = served[DETERMINISTIC] / total if total else 0.0
+        return served
+
+
+call_router = TieredRouter()
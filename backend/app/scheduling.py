@@ -0,0 +1,559 @@
+"""In-memory appointment scheduling with bitmap slot indexes and a SQL backing store"""
+
+import heapq
+import json
+import logging
+import secrets
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import DEFAULT_DOCTORS, settings
+from .models import Appointment, PatientInfo, Service
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = (0, 1, 2, 3, 4)
+
+_TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p", "%I %p", "%I%p")
+
+
+class SlotUnavailable(RuntimeError):
+    """Raised when a booking overlaps time the doctor is not free"""
+
+
+@dataclass(frozen=True)
+class Doctor:
+    id: str
+    name: str
+    specialty: str
+    working_days: Tuple[int, ...] = WEEKDAYS
+
+
+@dataclass(frozen=True)
+class Slot:
+    """A bookable span of `duration` minutes with one doctor"""
+    doctor_id: str
+    specialty: str
+    start: datetime
+    duration: int
+
+    @property
+    def date(self) -> str:
+        return self.start.strftime("%Y-%m-%d")
+
+    @property
+    def time(self) -> str:
+        return self.start.strftime("%H:%M")
+
+
+def parse_when(day: str, time_of_day: str) -> datetime:
+    """Parse the date/time strings callers and agents pass around ("2024-05-02", "9:30 AM")"""
+    parsed_date = date.fromisoformat(day.strip())
+    text = time_of_day.strip().upper()
+    for fmt in _TIME_FORMATS:
+        try:
+            return datetime.combine(parsed_date, datetime.strptime(text, fmt).time())
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {time_of_day!r}")
+
+
+def _lowest_bits(bits: int) -> Iterator[int]:
+    """Positions of the set bits in `bits`, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _runs(bits: int, length: int) -> int:
+    """Bits whose position starts `length` consecutive set bits"""
+    result = bits
+    for shift in range(1, length):
+        result &= bits >> shift
+    return result
+
+
+class _SpecialtyIndex:
+    """
+    Per-slot view of one specialty's doctors.
+
+    `doctors_free[s]` has bit i set when the specialty's i-th doctor is free at
+    slot s, and `any_free` has bit s set when any of them is, so a search skips
+    fully booked time with a single bit scan.
+    """
+
+    __slots__ = ("doctor_ids", "positions", "doctors_free", "any_free")
+
+    def __init__(self, doctor_ids: List[str], doctors_free: List[int]):
+        self.doctor_ids = doctor_ids
+        self.positions = {doctor_id: position for position, doctor_id in enumerate(doctor_ids)}
+        self.doctors_free = doctors_free
+        self.any_free = sum(1 << slot for slot, free in enumerate(doctors_free) if free)
+
+
+class _AppointmentTables:
+    """SQL persistence; the (doctor_id, slot_start) key stops double booking across workers"""
+
+    def __init__(self, url: str):
+        from sqlalchemy import Column, Integer, MetaData, String, Table, Text, create_engine, event
+
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args, future=True)
+        if url.startswith("sqlite"):
+            @event.listens_for(self.engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, _record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+        metadata = MetaData()
+        self.appointments = Table(
+            "appointments", metadata,
+            Column("id", String(64), primary_key=True),
+            Column("doctor_id", String(64), nullable=False, index=True),
+            Column("start", String(32), nullable=False),
+            Column("duration", Integer, nullable=False),
+            Column("status", String(16), nullable=False),
+            Column("record", Text, nullable=False),
+        )
+        self.slots = Table(
+            "appointment_slots", metadata,
+            Column("doctor_id", String(64), primary_key=True),
+            Column("slot_start", String(32), primary_key=True),
+            Column("appointment_id", String(64), nullable=False, index=True),
+        )
+        metadata.create_all(self.engine)
+
+    def insert(self, appointment: Appointment, slot_starts: List[datetime]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(self.slots.insert(), [
+                {"doctor_id": appointment.doctor_id, "slot_start": start.isoformat(), "appointment_id": appointment.id}
+                for start in slot_starts
+            ])
+            conn.execute(self.appointments.insert().values(
+                id=appointment.id,
+                doctor_id=appointment.doctor_id,
+                start=f"{appointment.date}T{appointment.time}",
+                duration=appointment.duration,
+                status=appointment.status,
+                record=appointment.model_dump_json(),
+            ))
+
+    def cancel(self, appointment: Appointment) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(self.slots.delete().where(self.slots.c.appointment_id == appointment.id))
+            conn.execute(
+                self.appointments.update()
+                .where(self.appointments.c.id == appointment.id)
+                .values(status=appointment.status, record=appointment.model_dump_json())
+            )
+
+    def booked_slots(self, since: datetime, doctor_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        from sqlalchemy import select
+
+        slots = self.slots.c
+        query = select(slots.doctor_id, slots.slot_start).where(slots.slot_start >= since.isoformat())
+        if doctor_id is not None:
+            query = query.where(slots.doctor_id == doctor_id)
+        with self.engine.connect() as conn:
+            return [(row.doctor_id, row.slot_start) for row in conn.execute(query)]
+
+    def scheduled(self, since: datetime) -> List[Appointment]:
+        from sqlalchemy import select
+
+        table = self.appointments.c
+        query = select(table.record).where(table.status == "scheduled", table.start >= since.isoformat())
+        with self.engine.connect() as conn:
+            return [Appointment.model_validate_json(record) for record in conn.execute(query).scalars()]
+
+
+class SchedulingEngine:
+    """
+    Free-slot search and booking for every doctor over a rolling horizon.
+
+    Each day from `start_date` is cut into `slot_minutes` slots between
+    `day_start` and `day_end`. Every doctor's free time is one integer
+    bitmap over the whole horizon, and every specialty keeps a per-slot
+    bitmap of its free doctors plus a bitmap of slots where anyone is free.
+    Finding the next run of free slots is then a handful of word-parallel
+    shifts and ANDs over the horizon instead of a walk over appointments,
+    and booking clears a few bits under one lock.
+
+    Without a fixed `start_date` the horizon starts today and rolls forward
+    on the first request of each new day: past days are shifted out of the
+    bitmaps and the same number of fresh days appended.
+
+    With `db_url` set, bookings are written through to SQL before they are
+    applied in memory; the (doctor, slot) primary key rejects overlapping
+    bookings made by other workers, and the doctor's slots are reloaded.
+    """
+
+    def __init__(self, doctors: Iterable[Doctor], start_date: Optional[date] = None, horizon_days: int = 90,
+                 day_start: str = "08:00", day_end: str = "18:00", slot_minutes: int = 15,
+                 default_duration: int = 30, db_url: Optional[str] = None):
+        self.rolling = start_date is None
+        self.start_date = start_date or date.today()
+        self.horizon_days = horizon_days
+        self.slot_minutes = slot_minutes
+        self.default_duration = default_duration
+        self.day_start = self._minutes(day_start)
+        self.slots_per_day = (self._minutes(day_end) - self.day_start) // slot_minutes
+        if self.slots_per_day <= 0:
+            raise ValueError("SCHEDULE_DAY_END must be after SCHEDULE_DAY_START")
+        self.total_slots = horizon_days * self.slots_per_day
+        self._epoch = datetime.combine(self.start_date, datetime.min.time())
+
+        self._doctors: Dict[str, Doctor] = {}
+        self._free: Dict[str, int] = {}
+        self._specialties: Dict[str, _SpecialtyIndex] = {}
+        self._appointments: Dict[str, Appointment] = {}
+        self._valid_starts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "bookings": 0, "conflicts": 0, "cancellations": 0, "rolled_days": 0}
+        self._build(doctors)
+        self._tables = _AppointmentTables(db_url) if db_url else None
+        if self._tables is not None:
+            self._load()
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "SchedulingEngine":
+        return cls(
+            load_doctors(app_settings.SCHEDULE_DOCTORS_FILE),
+            horizon_days=app_settings.SCHEDULE_HORIZON_DAYS,
+            day_start=app_settings.SCHEDULE_DAY_START,
+            day_end=app_settings.SCHEDULE_DAY_END,
+            slot_minutes=app_settings.SCHEDULE_SLOT_MINUTES,
+            default_duration=app_settings.SCHEDULE_DEFAULT_DURATION,
+            db_url=app_settings.SCHEDULE_DB_URL,
+        )
+
+    @staticmethod
+    def _minutes(clock: str) -> int:
+        hours, minutes = clock.split(":")
+        return int(hours) * 60 + int(minutes)
+
+    def _working_bits(self, working_days: Tuple[int, ...], weekdays: Sequence[int], first_day: int = 0) -> int:
+        """Free-time bitmap of days `first_day`, `first_day + 1`, ... with the given weekdays"""
+        day_bits = (1 << self.slots_per_day) - 1
+        return sum(
+            day_bits << ((first_day + day) * self.slots_per_day)
+            for day, weekday in enumerate(weekdays) if weekday in working_days
+        )
+
+    def _slot_doctors(self, members: Sequence[Doctor], weekdays: Sequence[int]) -> List[int]:
+        """Per-slot bitmaps of the members free on each of `weekdays`"""
+        # Doctors free on each weekday; every slot of that weekday starts out the same
+        by_weekday = [0] * 7
+        for position, doctor in enumerate(members):
+            for weekday in doctor.working_days:
+                by_weekday[weekday] |= 1 << position
+        return [by_weekday[weekday] for weekday in weekdays for _ in range(self.slots_per_day)]
+
+    def _build(self, doctors: Iterable[Doctor]) -> None:
+        # Initial free time depends only on working days, so build one bitmap per pattern
+        weekdays = [(self.start_date + timedelta(days=day)).weekday() for day in range(self.horizon_days)]
+        patterns: Dict[Tuple[int, ...], int] = {}
+        grouped: Dict[str, List[Doctor]] = {}
+        for doctor in doctors:
+            if doctor.working_days not in patterns:
+                patterns[doctor.working_days] = self._working_bits(doctor.working_days, weekdays)
+            self._doctors[doctor.id] = doctor
+            self._free[doctor.id] = patterns[doctor.working_days]
+            grouped.setdefault(doctor.specialty, []).append(doctor)
+
+        for specialty, members in grouped.items():
+            self._specialties[specialty] = _SpecialtyIndex(
+                [doctor.id for doctor in members], self._slot_doctors(members, weekdays)
+            )
+
+    def _roll_forward(self) -> None:
+        """Start the horizon today when a new day has begun; called with the lock held"""
+        today = date.today()
+        if not self.rolling or today <= self.start_date:
+            return
+        days = min((today - self.start_date).days, self.horizon_days)
+        kept = self.horizon_days - days
+        dropped = days * self.slots_per_day
+        self._stats["rolled_days"] += (today - self.start_date).days
+        self.start_date = today
+        self._epoch = datetime.combine(today, datetime.min.time())
+        weekdays = [(today + timedelta(days=day)).weekday() for day in range(kept, self.horizon_days)]
+        for doctor_id, doctor in self._doctors.items():
+            self._free[doctor_id] = self._free[doctor_id] >> dropped | self._working_bits(
+                doctor.working_days, weekdays, kept
+            )
+        for index in self._specialties.values():
+            members = [self._doctors[doctor_id] for doctor_id in index.doctor_ids]
+            fresh = self._slot_doctors(members, weekdays)
+            index.doctors_free = index.doctors_free[dropped:] + fresh
+            first_fresh = kept * self.slots_per_day
+            index.any_free = index.any_free >> dropped | sum(
+                1 << (first_fresh + slot) for slot, free in enumerate(fresh) if free
+            )
+        if self._tables is not None:
+            # Workers that rolled first may already have booked the new days
+            since = self._epoch + timedelta(days=kept)
+            for doctor_id, slot_start in self._tables.booked_slots(since):
+                slot = self._slot_index(datetime.fromisoformat(slot_start))
+                if slot is not None and doctor_id in self._free:
+                    self._take(doctor_id, slot, 1)
+        logger.info(f"Scheduling horizon moved to start {today}")
+
+    def _current(self) -> None:
+        """Roll the horizon forward if the date changed since the last request"""
+        if self.rolling and date.today() > self.start_date:
+            with self._lock:
+                self._roll_forward()
+
+    def _load(self) -> None:
+        since = self._epoch
+        for doctor_id, slot_start in self._tables.booked_slots(since):
+            slot = self._slot_index(datetime.fromisoformat(slot_start))
+            if slot is not None and doctor_id in self._free:
+                self._take(doctor_id, slot, 1)
+        for appointment in self._tables.scheduled(since):
+            self._appointments[appointment.id] = appointment
+        logger.info(f"Scheduling engine loaded {len(self._appointments)} appointments for {len(self._doctors)} doctors")
+
+    # Slot arithmetic
+
+    def _slot_index(self, when: datetime) -> Optional[int]:
+        """Index of the slot starting at `when`, or None when it is off the grid"""
+        day = (when.date() - self.start_date).days
+        offset = when.hour * 60 + when.minute - self.day_start
+        if not 0 <= day < self.horizon_days or offset < 0 or offset % self.slot_minutes or when.second:
+            return None
+        slot = offset // self.slot_minutes
+        return day * self.slots_per_day + slot if slot < self.slots_per_day else None
+
+    def _slot_start(self, slot: int) -> datetime:
+        day, offset = divmod(slot, self.slots_per_day)
+        return self._epoch + timedelta(days=day, minutes=self.day_start + offset * self.slot_minutes)
+
+    def _first_slot_after(self, when: datetime) -> int:
+        """First slot starting at or after `when`"""
+        day = (when.date() - self.start_date).days
+        if day < 0:
+            return 0
+        offset = when.hour * 60 + when.minute + (1 if when.second or when.microsecond else 0) - self.day_start
+        slot = max(0, -(-offset // self.slot_minutes))
+        return min(self.total_slots, day * self.slots_per_day + min(slot, self.slots_per_day))
+
+    def _length(self, duration: Optional[int]) -> int:
+        return max(1, -(-(duration or self.default_duration) // self.slot_minutes))
+
+    def _starts(self, length: int) -> int:
+        """Slots where a run of `length` slots fits before the end of its day"""
+        mask = self._valid_starts.get(length)
+        if mask is None:
+            fits = max(0, self.slots_per_day - length + 1)
+            day_mask = (1 << fits) - 1
+            mask = sum(day_mask << (day * self.slots_per_day) for day in range(self.horizon_days))
+            self._valid_starts[length] = mask
+        return mask
+
+    def _take(self, doctor_id: str, slot: int, length: int) -> None:
+        mask = ((1 << length) - 1) << slot
+        self._free[doctor_id] &= ~mask
+        index = self._specialties[self._doctors[doctor_id].specialty]
+        bit = 1 << index.positions[doctor_id]
+        for position in range(slot, slot + length):
+            index.doctors_free[position] &= ~bit
+            if not index.doctors_free[position]:
+                index.any_free &= ~(1 << position)
+
+    def _give_back(self, doctor_id: str, slot: int, length: int) -> None:
+        doctor = self._doctors[doctor_id]
+        index = self._specialties[doctor.specialty]
+        bit = 1 << index.positions[doctor_id]
+        for position in range(slot, min(slot + length, self.total_slots)):
+            if self._slot_start(position).weekday() not in doctor.working_days:
+                continue
+            self._free[doctor_id] |= 1 << position
+            index.doctors_free[position] |= bit
+            index.any_free |= 1 << position
+
+    # Queries
+
+    def doctors(self, specialty: Optional[str] = None) -> List[Doctor]:
+        if specialty is None:
+            return list(self._doctors.values())
+        index = self._specialties.get(specialty)
+        return [self._doctors[doctor_id] for doctor_id in index.doctor_ids] if index else []
+
+    def is_free(self, doctor_id: str, start: datetime, duration: Optional[int] = None) -> bool:
+        self._current()
+        if start < datetime.now():
+            return False
+        slot = self._slot_index(start)
+        if slot is None or doctor_id not in self._free:
+            return False
+        length = self._length(duration)
+        if not self._starts(length) >> slot & 1:
+            return False
+        mask = ((1 << length) - 1) << slot
+        return self._free[doctor_id] & mask == mask
+
+    def _doctor_slots(self, doctor_id: str, first: int, length: int, limit: int) -> List[Slot]:
+        doctor = self._doctors[doctor_id]
+        starts = _runs(self._free[doctor_id], length) & self._starts(length)
+        slots = []
+        for slot in _lowest_bits(starts >> first):
+            slots.append(Slot(doctor_id, doctor.specialty, self._slot_start(first + slot), length * self.slot_minutes))
+            if len(slots) == limit:
+                break
+        return slots
+
+    def _specialty_slots(self, specialty: str, first: int, length: int, limit: int) -> List[Slot]:
+        index = self._specialties.get(specialty)
+        if index is None:
+            return []
+        # A run where somebody is free is necessary for a doctor to be free throughout
+        starts = _runs(index.any_free, length) & self._starts(length)
+        slots = []
+        for offset in _lowest_bits(starts >> first):
+            slot = first + offset
+            free = index.doctors_free[slot]
+            for position in range(slot + 1, slot + length):
+                free &= index.doctors_free[position]
+            start = self._slot_start(slot)
+            for position in _lowest_bits(free):
+                slots.append(Slot(index.doctor_ids[position], specialty, start, length * self.slot_minutes))
+                if len(slots) == limit:
+                    return slots
+        return slots
+
+    def find_slots(self, specialty: Optional[str] = None, doctor_id: Optional[str] = None,
+                   after: Optional[datetime] = None, duration: Optional[int] = None, limit: int = 5) -> List[Slot]:
+        """
+        The next `limit` free slots of `duration` minutes starting at or after `after`.
+
+        Filter by doctor, by specialty, or neither for the whole clinic; results
+        are ordered by start time, then by doctor.
+        """
+        after = max(after or datetime.now(), datetime.now())
+        length = self._length(duration)
+        with self._lock:
+            self._roll_forward()
+            first = self._first_slot_after(after)
+            self._stats["searches"] += 1
+            if doctor_id is not None:
+                return self._doctor_slots(doctor_id, first, length, limit) if doctor_id in self._free else []
+            if specialty is not None:
+                return self._specialty_slots(specialty, first, length, limit)
+            per_specialty = [self._specialty_slots(name, first, length, limit) for name in self._specialties]
+        return list(heapq.merge(*per_specialty, key=lambda slot: slot.start))[:limit]
+
+    # Booking
+
+    def book(self, doctor_id: str, start: datetime, patient_info: PatientInfo,
+             service: Optional[Service] = None, notes: Optional[str] = None) -> Appointment:
+        """Book `service` (a default consultation when None) with a doctor, or raise SlotUnavailable"""
+        doctor = self._doctors.get(doctor_id)
+        if doctor is None:
+            raise KeyError(f"Unknown doctor: {doctor_id}")
+        if service is None:
+            service = Service(id=f"{doctor.specialty}-consultation", name=f"{doctor.specialty.title()} consultation",
+                              duration=self.default_duration)
+        if start < datetime.now():
+            raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} has already passed")
+        length = self._length(service.duration)
+        with self._lock:
+            self._roll_forward()
+            slot = self._slot_index(start)
+            if slot is None:
+                raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} is outside bookable hours")
+            mask = ((1 << length) - 1) << slot
+            if not self._starts(length) >> slot & 1 or self._free[doctor_id] & mask != mask:
+                self._stats["conflicts"] += 1
+                raise SlotUnavailable(f"{doctor.name} is not free at {start:%Y-%m-%d %H:%M}")
+            appointment = Appointment(
+                id=f"APT-{uuid.uuid4().hex[:12].upper()}",
+                patient_info=patient_info,
+                service=service,
+                date=start.strftime("%Y-%m-%d"),
+                time=start.strftime("%H:%M"),
+                duration=service.duration,
+                status="scheduled",
+                confirmation_number=secrets.token_hex(4).upper(),
+                doctor_id=doctor_id,
+                notes=notes,
+            )
+            if self._tables is not None:
+                self._persist(appointment, slot, length)
+            self._take(doctor_id, slot, length)
+            self._appointments[appointment.id] = appointment
+            self._stats["bookings"] += 1
+        return appointment
+
+    def _persist(self, appointment: Appointment, slot: int, length: int) -> None:
+        from sqlalchemy.exc import IntegrityError
+
+        try:
+            self._tables.insert(appointment, [self._slot_start(position) for position in range(slot, slot + length)])
+        except IntegrityError:
+            # Another worker booked overlapping time; pick up its bookings for this doctor
+            for _, slot_start in self._tables.booked_slots(self._epoch, appointment.doctor_id):
+                booked = self._slot_index(datetime.fromisoformat(slot_start))
+                if booked is not None:
+                    self._take(appointment.doctor_id, booked, 1)
+            self._stats["conflicts"] += 1
+            raise SlotUnavailable(f"Doctor {appointment.doctor_id} was booked by another request")
+
+    def cancel(self, appointment_id: str) -> Appointment:
+        with self._lock:
+            self._roll_forward()
+            appointment = self._appointments.pop(appointment_id, None)
+            if appointment is None:
+                raise KeyError(f"Unknown appointment: {appointment_id}")
+            appointment = appointment.model_copy(update={"status": "cancelled"})
+            if self._tables is not None:
+                self._tables.cancel(appointment)
+            slot = self._slot_index(parse_when(appointment.date, appointment.time))
+            if slot is not None:
+                self._give_back(appointment.doctor_id, slot, self._length(appointment.duration))
+            self._stats["cancellations"] += 1
+        return appointment
+
+    def get_appointment(self, appointment_id: str) -> Optional[Appointment]:
+        return self._appointments.get(appointment_id)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                **self._stats,
+                "doctors": len(self._doctors),
+                "specialties": len(self._specialties),
+                "appointments": len(self._appointments),
+            }
+
+
+def load_doctors(path: Optional[str] = None) -> List[Doctor]:
+    """Doctor roster from a JSON file, or DEFAULT_DOCTORS"""
+    entries: Sequence[dict] = DEFAULT_DOCTORS
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            entries = json.load(fh)
+    return [
+        Doctor(entry["id"], entry["name"], entry["specialty"], tuple(entry.get("working_days", WEEKDAYS)))
+        for entry in entries
+    ]
+
+
+_engine: Optional[SchedulingEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_scheduler() -> SchedulingEngine:
+    """Process-wide scheduling engine built from settings on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SchedulingEngine.from_settings()
+        return _engine
@@ -0,0 +1,166 @@
+"""Production launcher: pre-forked uvicorn workers configured from Settings
+
+    cd backend && python -m app.server
+
+The master process imports the application (and, with USE_CREW, the
+CrewAI/LangChain stack) once, binds HOST:PORT and forks WORKERS children
+that serve the shared socket. Modules loaded before the fork are shared
+copy-on-write instead of being imported again by every worker. With more
+than one worker, SESSION_BACKEND=auto puts conversations in the shared SQL
+store so any worker can continue any call.
+
+SIGTERM or SIGINT drains the workers: each stops accepting connections and
+waits up to SHUTDOWN_GRACE_SECONDS for in-flight calls before exiting.
+Workers that die unexpectedly are replaced.
+"""
+
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def preload(app_settings=settings) -> None:
+    """Import everything the workers will need so the fork shares it"""
+    from . import main  # noqa: F401
+
+    if app_settings.USE_CREW or app_settings.STREAM_LLM_RESPONSES:
+        # Only the imports: clients and pools open sockets and threads, so each worker builds its own
+        import crewai  # noqa: F401
+        import langchain_ollama  # noqa: F401
+        from .agents import call_center_crew  # noqa: F401
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _after_fork() -> None:
+    """Replace state a forked worker must not share with the master"""
+    from . import main
+    from .executor import CallExecutor
+
+    main.session_store.after_fork()
+    main.call_recorder.after_fork()
+    main.call_ids.after_fork()
+    main.idempotency_cache.after_fork()
+    main.call_executor = CallExecutor.from_settings()
+
+
+def _serve_worker(sock: socket.socket, app_settings) -> None:
+    import uvicorn
+
+    from .main import app
+
+    _after_fork()
+    config = uvicorn.Config(
+        app,
+        log_level=app_settings.LOG_LEVEL.lower(),
+        timeout_graceful_shutdown=app_settings.SHUTDOWN_GRACE_SECONDS,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class WorkerSupervisor:
+    """Forks `workers` uvicorn processes on one socket and keeps that many running"""
+
+    def __init__(self, sock: socket.socket, workers: int, app_settings=settings):
+        self.sock = sock
+        self.workers = workers
+        self.settings = app_settings
+        self.children: Dict[int, int] = {}  # pid -> worker number
+        self.stopping = False
+
+    def _spawn(self, number: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _serve_worker(self.sock, self.settings)
+            except BaseException:
+                logger.exception(f"Worker {number} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = number
+        logger.info(f"Started worker {number} (pid {pid})")
+
+    def _stop(self, signum, _frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Received signal {signum}, draining {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for number in range(self.workers):
+            self._spawn(number)
+        deadline: Optional[float] = None
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if self.stopping:
+                    deadline = deadline or time.monotonic() + self.settings.SHUTDOWN_GRACE_SECONDS + 5
+                    if time.monotonic() > deadline:
+                        for child in self.children:
+                            os.kill(child, signal.SIGKILL)
+                time.sleep(0.1)
+                continue
+            number = self.children.pop(pid, None)
+            if number is not None and not self.stopping:
+                logger.warning(f"Worker {number} (pid {pid}) exited with status {status}, restarting")
+                self._spawn(number)
+        self.sock.close()
+        logger.info("All workers stopped")
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None, workers: Optional[int] = None,
+          app_settings=settings) -> None:
+    """Run the API with settings-driven host, port and worker count"""
+    host = host or app_settings.HOST
+    port = port if port is not None else app_settings.PORT
+    workers = max(1, workers or app_settings.WORKERS)
+    # SESSION_BACKEND=auto picks the shared store from WORKERS when the app is imported
+    app_settings.WORKERS = workers
+    if not hasattr(os, "fork"):
+        # No fork (Windows): let uvicorn spawn workers that each import the app
+        import uvicorn
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers,
+                    timeout_graceful_shutdown=app_settings.SHUTDOWN_GRACE_SECONDS)
+        return
+    started = time.perf_counter()
+    preload(app_settings)
+    logger.info(f"Preloaded application in {time.perf_counter() - started:.2f}s")
+    sock = bind_socket(host, port)
+    logger.info(f"Serving on http://{host}:{sock.getsockname()[1]} with {workers} workers")
+    WorkerSupervisor(sock, workers, app_settings).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    serve()
+    sys.exit(0)
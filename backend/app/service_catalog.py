@@ -0,0 +1,224 @@
+"""Service catalog shared by /api/services and the agents' service lookup tool"""
+
+import bisect
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import DEFAULT_SERVICES, settings
+from .models import Service
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _key(text: str) -> str:
+    """Lookup key; "Follow-up visit", "follow_up visit" and "FOLLOW UP VISIT" are the same key"""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def describe_service(service: Service) -> str:
+    """One line per service for agents, like the old tool's "Lab tests - 15 mins - $100" strings"""
+    if service.cost is None:
+        price = "price on request"
+    elif service.cost == 0:
+        price = "Free"
+    else:
+        price = f"${service.cost:g}"
+    text = f"{service.name} - {service.duration} mins - {price}"
+    return f"{text}. {service.description}" if service.description else text
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    One immutable version of the catalog with its indexes and HTTP body.
+
+    Every id and name is indexed under its normalized key and under each of
+    its trailing word runs ("dental checkup" is also "checkup"), so tool
+    lookups match exact keys, then key prefixes, then close spellings.
+    """
+    services: Tuple[Service, ...]
+    by_id: Dict[str, Service]
+    by_specialty: Dict[str, Tuple[Service, ...]]
+    keys: Dict[str, Tuple[str, ...]]  # lookup key -> service ids
+    sorted_keys: Tuple[str, ...]
+    body: bytes
+    etag: str
+    version: float
+
+    @classmethod
+    def build(cls, services: Sequence[Service], version: float = 0.0) -> "CatalogSnapshot":
+        by_id: Dict[str, Service] = {}
+        by_specialty: Dict[str, List[Service]] = {}
+        keys: Dict[str, Dict[str, None]] = {}  # ordered sets; common words are shared by many services
+        for service in services:
+            if service.id in by_id:
+                raise ValueError(f"Duplicate service id '{service.id}'")
+            by_id[service.id] = service
+            if service.specialty:
+                by_specialty.setdefault(service.specialty, []).append(service)
+            for text in (service.id, service.name):
+                words = _key(text).split()
+                for start in range(len(words)):
+                    keys.setdefault(" ".join(words[start:]), {})[service.id] = None
+        body = json.dumps(
+            {"services": [service.model_dump(exclude_none=True) for service in services]}, separators=(",", ":")
+        ).encode("utf-8")
+        return cls(
+            services=tuple(services),
+            by_id=by_id,
+            by_specialty={specialty: tuple(group) for specialty, group in by_specialty.items()},
+            keys={key: tuple(ids) for key, ids in keys.items()},
+            sorted_keys=tuple(sorted(keys)),
+            body=body,
+            etag=f'"{hashlib.sha1(body).hexdigest()[:16]}"',
+            version=version,
+        )
+
+    def search(self, query: str, limit: int = 5) -> List[Service]:
+        """Services matching `query` best first: id/name, specialty, prefix, then close spellings"""
+        key = _key(query)
+        if not key:
+            return []
+        ids: List[str] = list(self.keys.get(key, ()))
+        ids.extend(service.id for service in self.by_specialty.get(key, ()))
+        start = bisect.bisect_left(self.sorted_keys, key)
+        for candidate in self.sorted_keys[start:]:
+            if not candidate.startswith(key):
+                break
+            ids.extend(self.keys[candidate])
+        if not ids:
+            for candidate in difflib.get_close_matches(key, self.sorted_keys, n=limit, cutoff=0.75):
+                ids.extend(self.keys[candidate])
+        return [self.by_id[service_id] for service_id in dict.fromkeys(ids)][:limit]
+
+    def lookup(self, query: str) -> Optional[Service]:
+        matches = self.search(query, limit=1)
+        return matches[0] if matches else None
+
+
+def load_services(path: Optional[str] = None) -> List[Service]:
+    """Services from a JSON list in the Service model's shape, or DEFAULT_SERVICES"""
+    entries: Sequence[dict] = DEFAULT_SERVICES
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            entries = json.load(fh)
+    return [Service.model_validate(entry) for entry in entries]
+
+
+class ServiceCatalog:
+    """
+    The current catalog snapshot, reloaded from `path` when the file changes.
+
+    Readers take `current()` and use that snapshot for the whole request, so
+    they never see a half-built catalog and never wait on a reload: at most
+    every `reload_interval` seconds a reader starts a background check of
+    the file's mtime, and a changed file is parsed and indexed off the
+    request path before the snapshot reference is swapped. A file that
+    fails to load is logged and the previous snapshot stays in service.
+    """
+
+    def __init__(self, services: Iterable[Service], path: Optional[str] = None, reload_interval: float = 5,
+                 max_age: int = 60):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.cache_control = f"public, max-age={max_age}"
+        self._mtime = self._file_mtime()
+        self._snapshot = CatalogSnapshot.build(list(services), version=self._mtime or 0.0)
+        self._checked = time.monotonic()
+        self._reloading = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {"reloads": 0, "reload_errors": 0}
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "ServiceCatalog":
+        return cls(
+            load_services(app_settings.SERVICE_CATALOG_FILE),
+            path=app_settings.SERVICE_CATALOG_FILE,
+            reload_interval=app_settings.SERVICE_CATALOG_RELOAD_SECONDS,
+            max_age=app_settings.SERVICE_CATALOG_MAX_AGE,
+        )
+
+    def _file_mtime(self) -> Optional[float]:
+        if not self.path:
+            return None
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def current(self) -> CatalogSnapshot:
+        """The catalog in service now; starts a background reload check when one is due"""
+        if self.path and time.monotonic() - self._checked >= self.reload_interval:
+            self._checked = time.monotonic()
+            if self._reloading.acquire(blocking=False):
+                threading.Thread(target=self._reload_in_background, daemon=True).start()
+        return self._snapshot
+
+    def _reload_in_background(self) -> None:
+        try:
+            self.reload()
+        finally:
+            self._reloading.release()
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the catalog if the file changed (or `force`); returns whether a new snapshot is in service"""
+        mtime = self._file_mtime()
+        if mtime is None or (mtime == self._mtime and not force):
+            return False
+        try:
+            snapshot = CatalogSnapshot.build(load_services(self.path), version=mtime)
+        except Exception as e:
+            logger.error(f"Could not reload service catalog from {self.path}: {str(e)}")
+            with self._lock:
+                self._stats["reload_errors"] += 1
+            self._mtime = mtime  # do not retry until the file changes again
+            return False
+        self._mtime = mtime
+        self._snapshot = snapshot
+        with self._lock:
+            self._stats["reloads"] += 1
+        logger.info(f"Service catalog reloaded from {self.path}: {len(snapshot.services)} services")
+        return True
+
+    def get(self, service_id: str) -> Optional[Service]:
+        return self.current().by_id.get(service_id)
+
+    def by_specialty(self, specialty: str) -> Tuple[Service, ...]:
+        return self.current().by_specialty.get(specialty, ())
+
+    def search(self, query: str, limit: int = 5) -> List[Service]:
+        return self.current().search(query, limit)
+
+    def lookup(self, query: str) -> Optional[Service]:
+        return self.current().lookup(query)
+
+    def stats(self) -> Dict[str, float]:
+        snapshot = self._snapshot
+        with self._lock:
+            stats = dict(self._stats)
+        stats["services"] = len(snapshot.services)
+        stats["specialties"] = len(snapshot.by_specialty)
+        stats["version"] = snapshot.version
+        return stats
+
+
+service_catalog = ServiceCatalog.from_settings()
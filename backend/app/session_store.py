@@ -0,0 +1,439 @@
+"""Conversation session storage with bounded memory and pluggable backends"""
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Turn = Dict[str, str]
+
+
+def _turn_size(turn: Turn) -> int:
+    """Approximate payload size of a turn in bytes"""
+    return sum(len(key) + len(value or "") for key, value in turn.items())
+
+
+class SessionStore(ABC):
+    """
+    Storage for per-session conversation turns.
+
+    Backends cap the number of turns kept per session, evict idle sessions
+    after `idle_ttl` seconds and drop least-recently-used sessions once
+    `max_sessions` (or `max_bytes`, where supported) is exceeded.
+    """
+
+    def __init__(self, max_turns: int, max_sessions: int, idle_ttl: float):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+
+    @abstractmethod
+    def get_turns(self, session_id: str, limit: Optional[int] = None) -> List[Turn]:
+        """Return the most recent `limit` turns (all kept turns when None)"""
+
+    @abstractmethod
+    def append_turn(self, session_id: str, turn: Turn) -> None:
+        """Append a turn, trimming the session to `max_turns`"""
+
+    @abstractmethod
+    def turn_count(self, session_id: str) -> int:
+        """Number of turns currently kept for the session"""
+
+    @abstractmethod
+    def total_turns(self, session_id: str) -> int:
+        """Number of turns ever appended to the session, including trimmed ones"""
+
+    @abstractmethod
+    def version(self, session_id: str) -> Tuple[float, int]:
+        """
+        (start time, total turns) of the session, (0.0, 0) when there is none.
+        The start time changes when an evicted session is started over, so
+        the pair changes with every turn and with every new conversation.
+        """
+
+    @abstractmethod
+    def clear(self, session_id: str) -> None:
+        """Forget a session"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, float]:
+        """Session count, memory usage and eviction counters"""
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.turn_count(session_id) > 0
+
+    def after_fork(self) -> None:
+        """Called in a forked worker before it serves requests"""
+
+
+class _Session:
+    __slots__ = ("turns", "started", "last_access", "size", "total")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.started = time.time()
+        self.last_access = time.monotonic()
+        self.size = 0
+        self.total = 0
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; sessions are kept in LRU order by last access"""
+
+    def __init__(self, max_turns: int = 50, max_sessions: int = 10000,
+                 idle_ttl: float = 1800, max_bytes: Optional[int] = None):
+        super().__init__(max_turns, max_sessions, idle_ttl)
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._evicted_idle = 0
+        self._evicted_lru = 0
+
+    def _touch(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def _evict(self) -> None:
+        # Least recently used sessions sit at the front, so expired ones are found first
+        deadline = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access >= deadline:
+                break
+            self._drop(session_id)
+            self._evicted_idle += 1
+        while len(self._sessions) > self.max_sessions or (
+            self.max_bytes is not None and self._bytes > self.max_bytes and len(self._sessions) > 1
+        ):
+            self._drop(next(iter(self._sessions)))
+            self._evicted_lru += 1
+
+    def get_turns(self, session_id: str, limit: Optional[int] = None) -> List[Turn]:
+        with self._lock:
+            self._evict()
+            session = self._touch(session_id)
+            if session is None:
+                return []
+            turns = list(session.turns)
+        return turns[-limit:] if limit else turns
+
+    def append_turn(self, session_id: str, turn: Turn) -> None:
+        size = _turn_size(turn)
+        with self._lock:
+            self._evict()  # an expired session starts over instead of being revived
+            session = self._touch(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            if len(session.turns) == session.turns.maxlen:
+                dropped = _turn_size(session.turns[0])
+                session.size -= dropped
+                self._bytes -= dropped
+            session.turns.append(turn)
+            session.total += 1
+            session.size += size
+            self._bytes += size
+            self._evict()
+
+    def turn_count(self, session_id: str) -> int:
+        with self._lock:
+            self._evict()  # an idle-expired session has no turns left
+            session = self._sessions.get(session_id)
+            return len(session.turns) if session else 0
+
+    def total_turns(self, session_id: str) -> int:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            return session.total if session else 0
+
+    def version(self, session_id: str) -> Tuple[float, int]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            return (session.started, session.total) if session else (0.0, 0)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(session.turns) for session in self._sessions.values()),
+                "bytes": self._bytes,
+                "evicted_idle": self._evicted_idle,
+                "evicted_lru": self._evicted_lru,
+            }
+
+
+class SQLSessionStore(SessionStore):
+    """
+    SQLAlchemy-backed store shared by every worker pointing at the same database.
+
+    With SQLite the database runs in WAL mode so concurrent uvicorn workers
+    can read while one of them writes.
+    """
+
+    # Idle/LRU sweeps touch the whole table, so run them every N appends
+    SWEEP_INTERVAL = 100
+
+    def __init__(self, url: str, max_turns: int = 50, max_sessions: int = 10000, idle_ttl: float = 1800):
+        super().__init__(max_turns, max_sessions, idle_ttl)
+        from sqlalchemy import (Column, Float, Integer, MetaData, String, Table, Text,
+                                create_engine, event, inspect, text)
+
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self._engine = create_engine(url, connect_args=connect_args, future=True)
+        if url.startswith("sqlite"):
+            @event.listens_for(self._engine, "connect")
+            def _sqlite_pragmas(dbapi_connection, _record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA busy_timeout=5000")
+                cursor.close()
+
+        metadata = MetaData()
+        self._sessions = Table(
+            "call_sessions", metadata,
+            Column("session_id", String(64), primary_key=True),
+            Column("last_access", Float, nullable=False, index=True),
+            Column("size", Integer, nullable=False, default=0),
+            Column("total", Integer, nullable=False, default=0),
+            Column("started", Float, nullable=False, default=0.0),
+        )
+        self._turns = Table(
+            "call_session_turns", metadata,
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            Column("session_id", String(64), nullable=False, index=True),
+            Column("user", Text),
+            Column("agent", Text),
+        )
+        metadata.create_all(self._engine)
+        if "started" not in {column["name"] for column in inspect(self._engine).get_columns("call_sessions")}:
+            # Databases created before sessions recorded when they started
+            with self._engine.begin() as conn:
+                conn.execute(text("ALTER TABLE call_sessions ADD COLUMN started FLOAT NOT NULL DEFAULT 0"))
+        self._appends = 0
+        self._evicted_idle = 0
+        self._evicted_lru = 0
+
+    def after_fork(self) -> None:
+        # Pooled connections opened by the parent must not be shared with it
+        self._engine.dispose(close=False)
+
+    def _delete_sessions(self, conn, session_ids: List[str]) -> None:
+        if session_ids:
+            conn.execute(self._turns.delete().where(self._turns.c.session_id.in_(session_ids)))
+            conn.execute(self._sessions.delete().where(self._sessions.c.session_id.in_(session_ids)))
+
+    def _sweep(self, conn) -> None:
+        from sqlalchemy import func, select
+
+        sessions = self._sessions.c
+        # Wall-clock time, because last_access is compared across processes
+        expired = conn.execute(
+            select(sessions.session_id).where(sessions.last_access < time.time() - self.idle_ttl)
+        ).scalars().all()
+        self._delete_sessions(conn, expired)
+        self._evicted_idle += len(expired)
+        overflow = conn.execute(select(func.count()).select_from(self._sessions)).scalar_one() - self.max_sessions
+        if overflow > 0:
+            oldest = conn.execute(
+                select(sessions.session_id).order_by(sessions.last_access).limit(overflow)
+            ).scalars().all()
+            self._delete_sessions(conn, oldest)
+            self._evicted_lru += len(oldest)
+
+    def _live(self, session_id: str):
+        """Filter for rows of `session_id` that has not been idle longer than idle_ttl"""
+        from sqlalchemy import select
+
+        sessions = self._sessions.c
+        return self._turns.c.session_id.in_(
+            select(sessions.session_id).where(
+                sessions.session_id == session_id, sessions.last_access >= time.time() - self.idle_ttl
+            )
+        )
+
+    def get_turns(self, session_id: str, limit: Optional[int] = None) -> List[Turn]:
+        from sqlalchemy import select
+
+        turns = self._turns.c
+        # Sweeps run every SWEEP_INTERVAL appends, so expired sessions may still have rows
+        query = select(turns.user, turns.agent).where(self._live(session_id)).order_by(turns.id.desc())
+        if limit:
+            query = query.limit(limit)
+        with self._engine.begin() as conn:
+            rows = conn.execute(query).all()
+            if rows:
+                conn.execute(
+                    self._sessions.update()
+                    .where(self._sessions.c.session_id == session_id)
+                    .values(last_access=time.time())
+                )
+        return [{"user": row.user, "agent": row.agent} for row in reversed(rows)]
+
+    def _upsert_session(self, conn, session_id: str, size: int) -> None:
+        """Create the session row or bump it; workers appending at once must not both insert it"""
+        sessions = self._sessions.c
+        now = time.time()
+        values = {"session_id": session_id, "last_access": now, "size": size, "total": 1, "started": now}
+        dialect = self._engine.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            statement = insert(self._sessions).values(**values)
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=[sessions.session_id],
+                set_={
+                    "last_access": statement.excluded.last_access,
+                    "size": sessions.size + statement.excluded.size,
+                    "total": sessions.total + 1,
+                },
+            ))
+            return
+        from sqlalchemy.exc import IntegrityError
+
+        bump = (
+            self._sessions.update()
+            .where(sessions.session_id == session_id)
+            .values(last_access=now, size=sessions.size + size, total=sessions.total + 1)
+        )
+        if conn.execute(bump).rowcount:
+            return
+        try:
+            with conn.begin_nested():
+                conn.execute(self._sessions.insert().values(**values))
+        except IntegrityError:
+            # Another worker created the row after our update missed it
+            conn.execute(bump)
+
+    def append_turn(self, session_id: str, turn: Turn) -> None:
+        from sqlalchemy import select
+
+        size = _turn_size(turn)
+        sessions, turns = self._sessions.c, self._turns.c
+        with self._engine.begin() as conn:
+            # Every statement here writes, so SQLite takes the write lock up
+            # front instead of upgrading a read, which fails with SQLITE_BUSY
+            # when another worker commits in between
+            cutoff = time.time() - self.idle_ttl
+            expired = select(sessions.session_id).where(sessions.session_id == session_id, sessions.last_access < cutoff)
+            conn.execute(self._turns.delete().where(turns.session_id.in_(expired)))
+            if conn.execute(
+                self._sessions.delete().where(sessions.session_id == session_id, sessions.last_access < cutoff)
+            ).rowcount:
+                # Start the session over instead of reviving its old turns
+                self._evicted_idle += 1
+            self._upsert_session(conn, session_id, size)
+            conn.execute(self._turns.insert().values(session_id=session_id, user=turn.get("user"), agent=turn.get("agent")))
+            stale = conn.execute(
+                select(turns.id, turns.user, turns.agent)
+                .where(turns.session_id == session_id)
+                .order_by(turns.id.desc())
+                .offset(self.max_turns)
+            ).all()
+            if stale:
+                conn.execute(self._turns.delete().where(turns.id.in_([row.id for row in stale])))
+                freed = sum(_turn_size({"user": row.user, "agent": row.agent}) for row in stale)
+                conn.execute(
+                    self._sessions.update().where(sessions.session_id == session_id).values(size=sessions.size - freed)
+                )
+            self._appends += 1
+            if self._appends % self.SWEEP_INTERVAL == 0:
+                self._sweep(conn)
+
+    def turn_count(self, session_id: str) -> int:
+        from sqlalchemy import func, select
+
+        with self._engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(self._turns).where(self._live(session_id))
+            ).scalar_one()
+
+    def total_turns(self, session_id: str) -> int:
+        from sqlalchemy import select
+
+        with self._engine.connect() as conn:
+            total = conn.execute(
+                select(self._sessions.c.total).where(
+                    self._sessions.c.session_id == session_id,
+                    self._sessions.c.last_access >= time.time() - self.idle_ttl,
+                )
+            ).scalar_one_or_none()
+        return total or 0
+
+    def version(self, session_id: str) -> Tuple[float, int]:
+        from sqlalchemy import select
+
+        sessions = self._sessions.c
+        with self._engine.connect() as conn:
+            row = conn.execute(
+                select(sessions.started, sessions.total).where(
+                    sessions.session_id == session_id, sessions.last_access >= time.time() - self.idle_ttl
+                )
+            ).first()
+        return (row.started, row.total) if row else (0.0, 0)
+
+    def clear(self, session_id: str) -> None:
+        with self._engine.begin() as conn:
+            self._delete_sessions(conn, [session_id])
+
+    def stats(self) -> Dict[str, float]:
+        from sqlalchemy import func, select
+
+        with self._engine.connect() as conn:
+            sessions, size = conn.execute(
+                select(func.count(), func.coalesce(func.sum(self._sessions.c.size), 0))
+            ).one()
+            turns = conn.execute(select(func.count()).select_from(self._turns)).scalar_one()
+        return {
+            "sessions": sessions,
+            "turns": turns,
+            "bytes": size,
+            "evicted_idle": self._evicted_idle,
+            "evicted_lru": self._evicted_lru,
+        }
+
+
+def create_session_store(app_settings=settings) -> SessionStore:
+    """Build the session store selected by SESSION_BACKEND"""
+    backend = app_settings.SESSION_BACKEND
+    if backend == "auto":
+        # Per-process memory cannot be shared between uvicorn workers
+        backend = "sql" if app_settings.WORKERS > 1 else "memory"
+    if backend == "sql":
+        logger.info(f"Using SQL session store at {app_settings.SESSION_DB_URL}")
+        return SQLSessionStore(
+            app_settings.SESSION_DB_URL,
+            max_turns=app_settings.SESSION_MAX_TURNS,
+            max_sessions=app_settings.SESSION_MAX_SESSIONS,
+            idle_ttl=app_settings.SESSION_IDLE_TTL,
+        )
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return InMemorySessionStore(
+        max_turns=app_settings.SESSION_MAX_TURNS,
+        max_sessions=app_settings.SESSION_MAX_SESSIONS,
+        idle_ttl=app_settings.SESSION_IDLE_TTL,
+        max_bytes=app_settings.SESSION_MAX_BYTES,
+    )
@@ -0,0 +1,116 @@
+"""Precompiled specialty classifier for call descriptions"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from .config import settings, SPECIALTY_KEYWORDS
+
+
+@dataclass(frozen=True)
+class SpecialtyMatch:
+    """A single keyword hit inside a description"""
+    specialty: str
+    keyword: str
+    start: int
+    end: int
+
+
+@dataclass
+class SpecialtyScan:
+    """All keyword hits for one description, with per-specialty scores"""
+    matches: List[SpecialtyMatch] = field(default_factory=list)
+    scores: Dict[str, float] = field(default_factory=dict)
+    best: str = "general"
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Build a prefix-factored regex so the engine walks a trie, not a keyword list"""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and not terminal else "(?:" + "|".join(branches) + ")"
+        return body + "?" if terminal else body
+
+    return render(trie)
+
+
+class SpecialtyMatcher:
+    """
+    Match a description against every specialty keyword in a single pass.
+
+    The keyword table is compiled once into a trie-shaped regex wrapped in a
+    lookahead, so keywords overlapping at different offsets are all reported
+    and the cost per character scanned does not grow with the number of
+    keywords. The regex finds the longest keyword at each offset; the shorter
+    keywords it starts with are reported alongside it, so "heart disease"
+    yields both "heart" and "heart disease".
+    """
+
+    def __init__(self, table: Dict[str, List[str]], default: str = "general"):
+        self.default = default
+        self._priority = {specialty: rank for rank, specialty in enumerate(table)}
+        self._owner: Dict[str, str] = {}
+        for specialty, keywords in table.items():
+            for keyword in keywords:
+                # A keyword listed under several specialties belongs to the first one
+                self._owner.setdefault(keyword.lower(), specialty)
+        self._pattern = re.compile(f"(?=({_trie_pattern(self._owner)}))") if self._owner else None
+        # Keywords that are prefixes of a longer one, shortest first
+        self._prefixes: Dict[str, List[str]] = {
+            keyword: sorted((other for other in self._owner if other != keyword and keyword.startswith(other)), key=len)
+            for keyword in self._owner
+        }
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "SpecialtyMatcher":
+        """Build a matcher from SPECIALTY_KEYWORDS_FILE, falling back to the built-in table"""
+        table = SPECIALTY_KEYWORDS
+        if app_settings.SPECIALTY_KEYWORDS_FILE:
+            with open(app_settings.SPECIALTY_KEYWORDS_FILE, encoding="utf-8") as fh:
+                table = json.load(fh)
+        return cls(table, default=app_settings.DEFAULT_SPECIALTY)
+
+    def scan(self, description: Optional[str], lowered: bool = False) -> SpecialtyScan:
+        """Return every keyword hit, per-specialty scores and the winning specialty
+
+        Pass `lowered=True` when the description is already lowercase.
+        """
+        result = SpecialtyScan(best=self.default)
+        if not description or self._pattern is None:
+            return result
+        text = description if lowered else description.lower()
+        for hit in self._pattern.finditer(text):
+            longest = hit.group(1)
+            start = hit.start()
+            for keyword in self._prefixes[longest] + [longest]:
+                specialty = self._owner[keyword]
+                result.matches.append(SpecialtyMatch(specialty, keyword, start, start + len(keyword)))
+                # Longer keywords are more specific, so they weigh more
+                result.scores[specialty] = result.scores.get(specialty, 0.0) + len(keyword)
+        if result.scores:
+            result.best = min(result.scores, key=self._priority.__getitem__)
+        return result
+
+    def classify(self, description: Optional[str], lowered: bool = False) -> str:
+        """Return the highest-priority specialty mentioned in the description"""
+        return self.scan(description, lowered).best
+
+    def scan_batch(self, descriptions: Iterable[Optional[str]], lowered: bool = False) -> List[SpecialtyScan]:
+        return [self.scan(description, lowered) for description in descriptions]
+
+    def classify_batch(self, descriptions: Iterable[Optional[str]], lowered: bool = False) -> List[str]:
+        return [self.scan(description, lowered).best for description in descriptions]
+
+
+specialty_matcher = SpecialtyMatcher.from_settings()
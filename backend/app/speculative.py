@@ -0,0 +1,288 @@
+"""Speculative execution of the top candidate agents for ambiguous crew calls"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .config import INTENT_ISSUE_TYPES, ISSUE_ROUTING, settings
+from .executor import CallExecutor
+from .router import intent_shares
+
+logger = logging.getLogger(__name__)
+
+Kickoff = Callable[..., str]
+Validator = Callable[["Candidate", str], bool]
+
+# Agents whose tools change state (book_appointment); a losing or cancelled run
+# may already have booked, so they are never run alongside another agent
+SIDE_EFFECT_AGENTS = frozenset({"appointment_agent"})
+
+# Final answers that mean the agent gave up rather than answered
+_FAILED_ANSWERS = (
+    "agent stopped due to iteration limit",
+    "i don't know",
+    "i do not know",
+    "i cannot help",
+    "i'm unable to",
+)
+
+
+@dataclass(frozen=True)
+class Candidate:
+    """An agent that may answer the call, with the issue type its task is built for"""
+    issue_type: str
+    agent: str
+    score: float
+
+
+def rank_candidates(issue_type: str, description: Optional[str]) -> List[Candidate]:
+    """
+    Score every agent for the call, best first.
+
+    The caller's issue type and the intents in the description each carry
+    half of the score, so a description that contradicts the chosen issue
+    type puts both agents close together.
+    """
+    issue_type = issue_type if issue_type in ISSUE_ROUTING else "other"
+    scores: Dict[str, float] = {ISSUE_ROUTING[issue_type]: 0.5}
+    issue_types: Dict[str, str] = {ISSUE_ROUTING[issue_type]: issue_type}
+    for intent, share in intent_shares(description).items():
+        intent_issue = INTENT_ISSUE_TYPES.get(intent)
+        if intent_issue is None:
+            continue
+        agent = ISSUE_ROUTING[intent_issue]
+        scores[agent] = scores.get(agent, 0.0) + share / 2
+        issue_types.setdefault(agent, intent_issue)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [Candidate(issue_types[agent], agent, scores[agent]) for agent in ranked]
+
+
+def validate_answer(candidate: Candidate, answer: str, min_chars: int = 20) -> bool:
+    """Accept answers of a useful length that are not an agent giving up"""
+    text = answer.strip()
+    if len(text) < min_chars:
+        return False
+    lowered = text.lower()
+    return not any(marker in lowered for marker in _FAILED_ANSWERS)
+
+
+@dataclass
+class _Run:
+    candidate: Candidate
+    cancelled: threading.Event
+    started: float
+    task: "asyncio.Future[str]"
+    primary: bool
+
+
+@dataclass
+class SpeculativeResult:
+    """The accepted answer and what it cost"""
+    answer: str
+    winner: Candidate
+    candidates: List[Candidate]
+    started: List[str] = field(default_factory=list)
+    cancelled: List[str] = field(default_factory=list)
+    latency: float = 0.0
+    wasted_seconds: float = 0.0
+    primary_seconds: float = 0.0
+    budget_exhausted: bool = False
+
+
+class SpeculativeCrew:
+    """
+    Run the top-k candidate agents for one call and keep the first good answer.
+
+    Candidates scoring within `margin` of the best are started together, up
+    to `top_k`, each through the call executor. Extra agents only start on
+    idle executor slots, keeping one free for the next caller, and only
+    as many as the average run time fits in `budget_seconds`; when the extras
+    have used up the budget they are cancelled and the call waits for its
+    primary agent. The first answer that passes `validator` wins and the
+    other kickoffs are cancelled. Cancelled kickoffs stop at their next agent
+    step; their time up to the cancellation is counted as wasted. Agents in
+    SIDE_EFFECT_AGENTS are not speculated on: when one is the primary it
+    runs alone, and it is never started as an extra.
+    """
+
+    def __init__(self, top_k: int = 3, margin: float = 0.25, budget_seconds: float = 60,
+                 validator: Optional[Validator] = None, min_answer_chars: int = 20):
+        self.top_k = top_k
+        self.margin = margin
+        self.budget_seconds = budget_seconds
+        self.validator = validator or (lambda candidate, answer: validate_answer(candidate, answer, min_answer_chars))
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "speculated": 0,
+            "extra_agents": 0,
+            "extras_skipped": 0,
+            "cancelled": 0,
+            "budget_exhausted": 0,
+            "rejected_answers": 0,
+            "misroutes_avoided": 0,
+            "wasted_seconds": 0.0,
+            "latency_saved_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_settings(cls, app_settings=settings) -> "SpeculativeCrew":
+        return cls(
+            top_k=app_settings.SPECULATIVE_TOP_K,
+            margin=app_settings.SPECULATIVE_MARGIN,
+            budget_seconds=app_settings.SPECULATIVE_BUDGET_SECONDS,
+            min_answer_chars=app_settings.SPECULATIVE_MIN_ANSWER_CHARS,
+        )
+
+    def candidates(self, issue_type: str, description: Optional[str]) -> List[Candidate]:
+        """The agents worth running for this call, primary first"""
+        ranked = rank_candidates(issue_type, description)
+        primary = ranked[0]
+        if primary.agent in SIDE_EFFECT_AGENTS:
+            return [primary]
+        extras = [
+            candidate for candidate in ranked[1:]
+            if candidate.agent not in SIDE_EFFECT_AGENTS and primary.score - candidate.score <= self.margin
+        ]
+        return [primary] + extras[:self.top_k - 1]
+
+    def _extras_allowed(self, executor: CallExecutor, wanted: int) -> int:
+        stats = executor.stats()
+        average = stats["run_seconds_total"] / stats["completed"] if stats["completed"] else 0.0
+        if average <= 0:
+            return wanted
+        return min(wanted, int(self.budget_seconds // average))
+
+    def _start(self, executor: CallExecutor, kickoff: Kickoff, call_data: dict,
+               candidate: Candidate, primary: bool) -> _Run:
+        cancelled = threading.Event()
+        data = {**call_data, "issue_type": candidate.issue_type}
+        task = asyncio.ensure_future(executor.run(kickoff, data, cancelled=cancelled))
+        return _Run(candidate, cancelled, time.perf_counter(), task, primary)
+
+    @staticmethod
+    def _finish(run: _Run, result: SpeculativeResult) -> float:
+        """Account for a run whose answer is not used"""
+        elapsed = time.perf_counter() - run.started
+        if run.primary:
+            result.primary_seconds = elapsed
+        result.wasted_seconds += elapsed
+        return elapsed
+
+    def _cancel(self, run: _Run, result: SpeculativeResult) -> float:
+        run.cancelled.set()
+        run.task.cancel()
+        result.cancelled.append(run.candidate.agent)
+        return self._finish(run, result)
+
+    async def run(self, executor: CallExecutor, kickoff: Kickoff, call_data: dict) -> SpeculativeResult:
+        """
+        Answer the call with `kickoff(call_data, cancelled=event)` run on the
+        executor for each candidate. Raises the primary agent's error when no
+        candidate produced an answer.
+        """
+        started = time.perf_counter()
+        candidates = self.candidates(call_data.get("issue_type") or "other", call_data.get("description"))
+        # The primary agent takes a slot (or queues) like any call; extras only use idle slots,
+        # leaving one free so the next caller does not queue behind speculation
+        idle = executor.idle_slots() - 2
+        primary = self._start(executor, kickoff, call_data, candidates[0], primary=True)
+        runs = [primary]
+        extras = candidates[1:]
+        for candidate in extras[:max(0, min(idle, self._extras_allowed(executor, len(extras))))]:
+            runs.append(self._start(executor, kickoff, call_data, candidate, primary=False))
+        skipped = len(extras) - (len(runs) - 1)
+
+        result = SpeculativeResult(answer="", winner=candidates[0], candidates=candidates,
+                                   started=[run.candidate.agent for run in runs])
+        pending = {run.task: run for run in runs}
+        fallback: Optional[_Run] = None
+        fallback_seconds = 0.0
+        rejected = 0
+        extra_seconds = 0.0  # spent by extras that already finished
+        try:
+            while pending:
+                extras_running = [run for run in pending.values() if not run.primary]
+                timeout = None
+                if extras_running:
+                    spent = extra_seconds + sum(time.perf_counter() - run.started for run in extras_running)
+                    timeout = max(0.0, (self.budget_seconds - spent) / len(extras_running))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Extras used up the budget; keep waiting for the primary agent only
+                    result.budget_exhausted = True
+                    for run in extras_running:
+                        del pending[run.task]
+                        extra_seconds += self._cancel(run, result)
+                    continue
+                winner = None
+                for task in done:
+                    run = pending.pop(task)
+                    answered = task.exception() is None
+                    if answered and winner is None and self.validator(run.candidate, task.result()):
+                        winner = run
+                        if run.primary:
+                            result.primary_seconds = time.perf_counter() - run.started
+                        continue
+                    elapsed = self._finish(run, result)
+                    if not run.primary:
+                        extra_seconds += elapsed
+                    if answered and winner is None:
+                        rejected += 1
+                        if fallback is None or run.primary:
+                            fallback, fallback_seconds = run, elapsed
+                if winner is not None:
+                    result.winner = winner.candidate
+                    result.answer = winner.task.result()
+                    break
+        finally:
+            for run in pending.values():
+                self._cancel(run, result)
+
+        if not result.answer:
+            if fallback is None:
+                # Nothing answered; surface what went wrong with the primary agent
+                raise primary.task.exception()
+            # No answer passed validation; prefer the primary agent's over failing the call
+            result.winner = fallback.candidate
+            result.answer = fallback.task.result()
+            result.wasted_seconds -= fallback_seconds
+        result.latency = time.perf_counter() - started
+        self._record(result, skipped, rejected)
+        return result
+
+    def _record(self, result: SpeculativeResult, skipped: int, rejected: int) -> None:
+        misrouted = result.winner != result.candidates[0]
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["extras_skipped"] += skipped
+            self._stats["rejected_answers"] += rejected
+            if len(result.started) > 1:
+                self._stats["speculated"] += 1
+                self._stats["extra_agents"] += len(result.started) - 1
+            self._stats["cancelled"] += len(result.cancelled)
+            self._stats["budget_exhausted"] += int(result.budget_exhausted)
+            self._stats["wasted_seconds"] += result.wasted_seconds
+            if misrouted:
+                # Committing to the primary agent would have run it to the end before rerouting;
+                # the time it ran here is a lower bound on that
+                self._stats["misroutes_avoided"] += 1
+                self._stats["latency_saved_seconds"] += result.primary_seconds
+        if len(result.candidates) > 1:
+            logger.info(
+                f"Speculative routing: candidates={[c.agent for c in result.candidates]} "
+                f"started={result.started} winner={result.winner.agent} "
+                f"primary_won={not misrouted} cancelled={result.cancelled} "
+                f"latency={result.latency:.3f}s wasted={result.wasted_seconds:.3f}s "
+                f"budget_exhausted={result.budget_exhausted}"
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+speculative_crew = SpeculativeCrew.from_settings()
@@ -0,0 +1,103 @@
+"""Incremental response streaming helpers for the call endpoints"""
+
+import asyncio
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from .config import AGENT_CONFIGS, ISSUE_ROUTING
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class SentenceBuffer:
+    """Accumulate streamed text and release it one complete sentence at a time"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._pending += text
+        parts = _SENTENCE_END.split(self._pending)
+        self._pending = parts.pop()
+        return [part for part in parts if part]
+
+    def flush(self) -> Optional[str]:
+        rest, self._pending = self._pending.strip(), ""
+        return rest or None
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """Split a finished response into sentences, keeping trailing whitespace with each one"""
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        yield text[start:match.end()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+
+def _close_iterator(iterator: Iterator[str]) -> None:
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def stream_llm(llm: Any, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yield text chunks from a LangChain-style LLM without blocking the event loop.
+
+    Uses `astream` when the LLM provides it, otherwise drives the synchronous
+    `stream` iterator from the default thread pool one chunk at a time.
+    `model` overrides the LLM's own model for this prompt.
+
+    The synchronous iterator is closed when the stream stops early (the caller
+    closes it, or is cancelled mid-chunk), releasing whatever it holds, such as
+    an HTTP response or a concurrency slot, instead of waiting for GC.
+    """
+    kwargs = {"model": model} if model else {}
+    if hasattr(llm, "astream"):
+        async for chunk in llm.astream(prompt, **kwargs):
+            yield chunk
+        return
+    loop = asyncio.get_running_loop()
+    iterator = iter(llm.stream(prompt, **kwargs))
+    done = object()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            pending = loop.run_in_executor(None, next, iterator, done)
+            # Shielded so a cancelled caller leaves `pending` to finish with the thread
+            chunk = await asyncio.shield(pending)
+            pending = None
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        if pending is None:
+            _close_iterator(iterator)
+        else:
+            # A thread is still inside next(); a generator cannot be closed while it runs
+            def close_when_returned(future: asyncio.Future) -> None:
+                if not future.cancelled():
+                    future.exception()
+                loop.run_in_executor(None, _close_iterator, iterator)
+
+            pending.add_done_callback(close_when_returned)
+
+
+def build_agent_prompt(issue_type: str, patient_name: str, description: str, context: str) -> str:
+    """Render the single-shot prompt used when streaming straight from the LLM"""
+    agent = AGENT_CONFIGS[ISSUE_ROUTING.get(issue_type, ISSUE_ROUTING["other"])]
+    return (
+        f"You are a {agent['role']}. {agent['backstory']}\n"
+        f"Your goal: {agent['goal']}.\n\n"
+        f"{context}\n"
+        f"Patient {patient_name} says: {description}\n"
+        "Reply to the patient in a few short, spoken-style sentences."
+    )
+
+
+def ndjson_event(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event) + "\n").encode("utf-8")
+
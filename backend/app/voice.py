@@ -0,0 +1,219 @@
+"""Speculative, interruptible response generation for WebSocket voice sessions"""
+
+import asyncio
+import contextlib
+import logging
+import re
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .config import settings
+from .executor import CallQueueFull
+
+logger = logging.getLogger(__name__)
+
+Producer = Callable[[str], AsyncIterator[str]]
+Committer = Callable[[str, str], Dict[str, Any]]
+Sender = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_NON_WORD = re.compile(r"[^\w']+")
+
+
+def normalize_transcript(text: str) -> str:
+    """Compare transcripts on their words only; ASR finals often just add punctuation or casing"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+class _Speculation:
+    """A response generated ahead of time for one transcript, buffered until it is needed"""
+
+    def __init__(self, text: str, key: str):
+        self.text = text
+        self.key = key
+        self.chunks: List[str] = []
+        self.producing = False
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    async def run(self, produce: Producer, delay: float) -> None:
+        try:
+            if delay:
+                # Interim results arrive every few hundred ms; let the text settle first
+                await asyncio.sleep(delay)
+            self.producing = True
+            async for chunk in produce(self.text):
+                self.chunks.append(chunk)
+                self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._changed.set()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Replay the chunks produced so far, then the rest as they arrive"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+
+
+class VoiceSession:
+    """
+    One caller's turn-taking over a persistent channel.
+
+    Interim transcripts of at least `min_chars` start a speculative response
+    after `debounce` seconds, replacing any speculation for older text. When
+    the final transcript matches the speculated one, its buffered chunks are
+    sent at once; otherwise a fresh response starts. Anything the caller says
+    while a response is being sent cancels it (barge-in), and the cancelled
+    turn is not recorded.
+
+    `produce(text)` yields response chunks, `commit(text, response)` records a
+    completed turn and returns the fields of the "done" event, and `send`
+    delivers events to the client.
+    """
+
+    def __init__(self, send: Sender, produce: Producer, commit: Committer,
+                 min_chars: int = 12, debounce: float = 0.15):
+        self.send = send
+        self.produce = produce
+        self.commit = commit
+        self.min_chars = min_chars
+        self.debounce = debounce
+        self.turn = 0
+        self._speculation: Optional[_Speculation] = None
+        self._responding: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+        self._stats = {"turns": 0, "speculations": 0, "speculation_hits": 0, "barge_ins": 0}
+
+    @classmethod
+    def from_settings(cls, send: Sender, produce: Producer, commit: Committer,
+                      app_settings=settings) -> "VoiceSession":
+        return cls(
+            send, produce, commit,
+            min_chars=app_settings.VOICE_SPECULATION_MIN_CHARS,
+            debounce=app_settings.VOICE_SPECULATION_DEBOUNCE_MS / 1000,
+        )
+
+    async def _send(self, event: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self.send(event)
+
+    async def transcript(self, text: str, final: bool) -> None:
+        """Handle one speech recognition result"""
+        key = normalize_transcript(text)
+        if not key:
+            return
+        if self._responding is not None and not self._responding.done():
+            await self._barge_in()
+        if final:
+            self._respond(text, key)
+        else:
+            self._speculate(text, key)
+
+    def _start(self, text: str, key: str, delay: float) -> _Speculation:
+        speculation = _Speculation(text, key)
+        speculation.task = asyncio.ensure_future(speculation.run(self.produce, delay))
+        return speculation
+
+    def _speculate(self, text: str, key: str) -> None:
+        if len(key) < self.min_chars:
+            return
+        if self._speculation is not None:
+            if self._speculation.key == key:
+                return
+            self._speculation.cancel()
+        self._speculation = self._start(text, key, self.debounce)
+        self._stats["speculations"] += 1
+
+    def _respond(self, text: str, key: str) -> None:
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None and speculation.key == key:
+            self._stats["speculation_hits"] += 1
+            if not speculation.producing and not speculation.finished:
+                # Still waiting out the debounce; nothing more to wait for
+                speculation.cancel()
+                speculation = self._start(speculation.text, key, 0)
+        else:
+            if speculation is not None:
+                speculation.cancel()
+            speculation = self._start(text, key, 0)
+        self.turn += 1
+        self._stats["turns"] += 1
+        self._responding = asyncio.ensure_future(self._deliver(self.turn, speculation))
+
+    async def _deliver(self, turn: int, speculation: _Speculation) -> None:
+        parts = []
+        try:
+            async for chunk in speculation.follow():
+                parts.append(chunk)
+                await self._send({"type": "chunk", "turn": turn, "text": chunk})
+            done = self.commit(speculation.text, "".join(parts))
+            await self._send({"type": "done", "turn": turn, **done})
+        except asyncio.CancelledError:
+            speculation.cancel()
+            raise
+        except CallQueueFull as e:
+            await self._send({"type": "error", "turn": turn, "detail": "All agents are busy, please retry shortly",
+                              "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Error in voice turn {turn}: {str(e)}")
+            await self._send({"type": "error", "turn": turn, "detail": "Error processing call"})
+
+    async def _barge_in(self) -> None:
+        task, self._responding = self._responding, None
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        self._stats["barge_ins"] += 1
+        await self._send({"type": "cancelled", "turn": self.turn, "reason": "barge_in"})
+
+    async def close(self) -> None:
+        if self._speculation is not None:
+            self._speculation.cancel()
+            self._speculation = None
+        if self._responding is not None:
+            self._responding.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._responding
+        voice_stats.add(self._stats)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+class _VoiceStats:
+    """Totals across closed sessions, for /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, int] = {"sessions": 0}
+
+    def add(self, session_stats: Dict[str, int]) -> None:
+        with self._lock:
+            self._totals["sessions"] += 1
+            for key, value in session_stats.items():
+                self._totals[key] = self._totals.get(key, 0) + value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+
+voice_stats = _VoiceStats()
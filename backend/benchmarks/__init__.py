@@ -0,0 +1,4 @@
+"""Micro-benchmarks for AI Call Crew hot paths
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_specialty``.
+"""
@@ -0,0 +1,84 @@
+"""Batch throughput for app.batch across processes and crew latency
+
+Generates `--records` multi-turn callback records (several turns per phone
+number, spread over specialties and intents) and runs them through
+app.batch.run_parallel for each process count in `--processes`. Template
+turns are CPU-bound, so records/s should grow with processes up to the
+number of cores; turns escalated to the fake crew (``--llm-latency``)
+overlap within a process up to `--concurrency`.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from typing import List
+
+from app import main as app_main
+from app.batch import parse_records, run_parallel
+from app.config import settings
+
+from .fakes import FakeCrewPool
+
+DESCRIPTIONS = [
+    "I've been having chest pain when climbing stairs",
+    "I'd like to book an appointment with a cardiologist",
+    "My stomach hurts after every meal",
+    "Constant headaches for a week, can I see a neurologist?",
+    "My knee is swollen since the fall",
+    "How much does the visit cost with my insurance?",
+    "I need to cancel my appointment",
+    "Hello, returning your call",
+]
+
+
+def generate(records: int, turns_per_caller: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    lines = []
+    for index in range(records):
+        caller = index // turns_per_caller
+        lines.append(json.dumps({
+            "patient_name": f"Caller{caller}",
+            "phone_number": f"+1555{caller:07d}",
+            "issue_type": rng.choice(["consultation", "appointment", "billing", "other"]),
+            "description": rng.choice(DESCRIPTIONS),
+        }))
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=4, help="records per phone number")
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="seconds per escalated turn; 0 keeps every record on the template tier")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    settings.USE_CREW = args.llm_latency > 0
+    app_main.crew_pool = FakeCrewPool(args.llm_latency)
+    app_main.response_cache.enabled = False
+    records = list(parse_records(generate(args.records, args.turns, args.seed)))
+
+    print(f"{args.records} records, {os.cpu_count()} CPUs, concurrency {args.concurrency}, "
+          f"llm latency {args.llm_latency}s")
+    print(f"{'processes':>9} {'seconds':>9} {'records/s':>10} {'speedup':>8}  statuses")
+    baseline = None
+    for processes in (int(value) for value in args.processes.split(",")):
+        statuses = {}
+        start = time.perf_counter()
+        for result in run_parallel(records, processes, args.concurrency):
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+        elapsed = time.perf_counter() - start
+        rate = len(records) / elapsed
+        baseline = baseline or rate
+        print(f"{processes:>9} {elapsed:>9.2f} {rate:>10.0f} {rate / baseline:>7.2f}x  {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare per-call crew construction with pooled crew reuse
+
+Only construction and checkout are timed (no kickoff), so Ollama does not
+need to be running; crewai must be installed.
+"""
+
+import argparse
+import time
+
+from app.agents.call_center_crew import build_crew, crew_inputs
+from app.agents.crew_pool import CrewPool
+from app.config import ISSUE_ROUTING
+
+CALLS = [
+    {"issue_type": issue_type, "patient_name": "Alex", "description": "I need help"}
+    for issue_type in ISSUE_ROUTING
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=60)
+    args = parser.parse_args()
+    calls = [CALLS[index % len(CALLS)] for index in range(args.calls)]
+
+    start = time.perf_counter()
+    for call in calls:
+        build_crew(call["issue_type"], inputs=crew_inputs(call))
+    per_call = time.perf_counter() - start
+
+    pool = CrewPool()
+    start = time.perf_counter()
+    for call in calls:
+        with pool.acquire(call["issue_type"]):
+            pass
+    pooled = time.perf_counter() - start
+
+    print(f"per-call construction: {per_call / args.calls * 1000:8.2f} ms/call")
+    print(f"pooled reuse:          {pooled / args.calls * 1000:8.2f} ms/call")
+    print(f"pool stats: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
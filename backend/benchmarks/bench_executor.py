@@ -0,0 +1,124 @@
+"""Show that /health latency stays flat while slow crew calls are in flight
+
+A fake crew pool sleeps for `--llm-latency` seconds per kickoff, standing in
+for a blocking CrewAI/Ollama call. /health is probed while `--callers`
+concurrent calls hammer /api/call/process; calls beyond `--slots` plus
+`--queue` are answered with 503 + Retry-After. A second run sets a call
+timeout below the crew latency: every call gets 504, and the timed-out
+kickoffs must be cancelled and give their slots back well before they
+would have finished. Exits non-zero when either check fails.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+import httpx
+
+from app import main as app_main
+from app.config import settings
+from app.executor import CallExecutor
+
+from .fakes import FakeCrewPool, running_server
+
+
+async def probe_health(client: httpx.AsyncClient, base_url: str, samples: int) -> list:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await client.get(f"{base_url}/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def call(client: httpx.AsyncClient, base_url: str, index: int) -> Tuple[int, bool]:
+    """Status of one crew-tier call and whether it carried Retry-After"""
+    response = await client.post(f"{base_url}/api/call/process", json={
+        "patient_name": "Alex",
+        "phone_number": f"+1555{index:07d}",
+        "issue_type": "appointment",
+        # Reschedules have no template, so the call escalates to the crew
+        "description": "I need to reschedule my appointment",
+    })
+    return response.status_code, "retry-after" in response.headers
+
+
+async def scenario(base_url: str, callers: int, samples: int):
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=callers + 10)) as client:
+        idle = await probe_health(client, base_url, samples)
+        calls = [asyncio.create_task(call(client, base_url, index)) for index in range(callers)]
+        await asyncio.sleep(0.05)
+        loaded = await probe_health(client, base_url, samples)
+        statuses = await asyncio.gather(*calls)
+    return idle, loaded, statuses
+
+
+async def timeouts(base_url: str, callers: int) -> Tuple[List[int], float]:
+    """Statuses of `callers` calls that time out, and seconds until their slots are free again"""
+    async with httpx.AsyncClient(timeout=120) as client:
+        statuses = await asyncio.gather(*(call(client, base_url, index) for index in range(callers)))
+    answered = time.perf_counter()
+    while app_main.call_executor.stats()["running"] > 0:
+        await asyncio.sleep(0.005)
+    return [status for status, _ in statuses], time.perf_counter() - answered
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--callers", type=int, default=40)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=0.3, help="call timeout for the timeout run")
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--health-budget-ms", type=float, default=100, help="max /health p95 under load")
+    args = parser.parse_args()
+
+    settings.USE_CREW = True
+    app_main.response_cache.enabled = False
+    app_main.crew_pool = FakeCrewPool(args.llm_latency)
+    app_main.call_executor = CallExecutor(max_concurrent=args.slots, max_queue=args.queue, timeout=120)
+    failures: List[str] = []
+
+    with running_server(app_main.app) as base_url:
+        idle, loaded, results = asyncio.run(scenario(base_url, args.callers, args.samples))
+        print(f"{args.callers} callers, {args.slots} slots, queue {args.queue}")
+        for label, latencies in (("idle", idle), ("under load", loaded)):
+            ordered = sorted(latencies)
+            p95 = ordered[int(len(ordered) * 0.95) - 1] * 1000
+            print(f"/health {label:<11} p50 {statistics.median(ordered) * 1000:7.2f} ms  p95 {p95:7.2f} ms")
+        if p95 > args.health_budget_ms:
+            failures.append(f"/health p95 under load {p95:.1f} ms is over {args.health_budget_ms:.0f} ms")
+        statuses = [status for status, _ in results]
+        print(f"call statuses: { {code: statuses.count(code) for code in sorted(set(statuses))} }")
+        print(f"executor stats: {app_main.call_executor.stats()}")
+        admitted = min(args.callers, args.slots + args.queue)
+        if statuses.count(200) != admitted or statuses.count(503) != args.callers - admitted:
+            failures.append(f"expected {admitted} x 200 and {args.callers - admitted} x 503")
+        if not all(retry_after for status, retry_after in results if status == 503):
+            failures.append("503 without Retry-After")
+
+        app_main.call_executor = CallExecutor(max_concurrent=args.slots, max_queue=args.queue,
+                                              timeout=args.timeout)
+        statuses, freed = asyncio.run(timeouts(base_url, args.slots))
+        print(f"\ntimeout {args.timeout:.2f}s: statuses {statuses}, slots free {freed * 1000:.0f} ms after the 504s")
+        print(f"executor stats: {app_main.call_executor.stats()}")
+        if statuses != [504] * args.slots:
+            failures.append("calls over the timeout were not answered with 504")
+        # Cancelled kickoffs stop at their next step instead of running out their latency
+        if freed > (args.llm_latency - args.timeout) / 2:
+            failures.append(f"timed-out kickoffs held their slots for {freed:.2f}s after the 504s")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Retried call turns with and without Idempotency-Key, and call ID uniqueness
+
+Each caller submits the same crew-tier turn `--duplicates` times at once,
+the way a client that times out and retries (or a double-tap) does, against
+a fake crew that takes `--llm-latency` seconds. Without a key every copy
+runs the crew and appends a turn; with one, only the first runs and the
+rest get its response. The same duplicates are then sent to two forked
+workers, with keys kept per worker and in the shared table, and a keyed
+stream and batch are retried. A replay of a finished request is timed
+against running the turn again. Last, call IDs are generated on several
+threads and in forked workers, where the old f"CALL-{hash(session_id)}"
+gave every turn of a session the same ID.
+"""
+
+import argparse
+import asyncio
+import logging
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app import main as app_main
+from app.call_ids import CallIdGenerator
+from app.config import settings
+from app.context import ConversationContextManager
+from app.executor import CallExecutor
+from app.idempotency import IdempotencyCache
+from app.session_store import SQLSessionStore
+
+from .fakes import FakeCrewPool, free_port, launch_server
+
+
+class CountingCrewPool(FakeCrewPool):
+    """FakeCrewPool that counts kickoffs"""
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.kickoffs = 0
+        self._lock = threading.Lock()
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        with self._lock:
+            self.kickoffs += 1
+        return super().kickoff(call_data, timeout, cancelled)
+
+
+def turn(caller: int) -> dict:
+    return {
+        "patient_name": f"Caller {caller}",
+        "phone_number": f"+1-555-{caller:04d}",
+        "issue_type": "service_info",
+        "description": "I have a billing question about a charge on my last invoice",
+    }
+
+
+async def submit_duplicates(client: httpx.AsyncClient, callers: int, duplicates: int, keyed: bool) -> Dict[str, int]:
+    async def submit(caller: int) -> List[httpx.Response]:
+        headers = {"Idempotency-Key": f"turn-{caller}"} if keyed else {}
+        return await asyncio.gather(*(
+            client.post("/api/call/process", json=turn(caller), headers=headers) for _ in range(duplicates)
+        ))
+
+    results = await asyncio.gather(*(submit(caller) for caller in range(callers)))
+    responses = [response for group in results for response in group]
+    return {
+        "ok": sum(response.status_code == 200 for response in responses),
+        "replayed": sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses),
+        "distinct_per_caller": max(len({response.json()["call_id"] for response in group}) for group in results),
+    }
+
+
+def run_duplicates(callers: int, duplicates: int, keyed: bool, llm_latency: float) -> Dict[str, int]:
+    pool = CountingCrewPool(llm_latency)
+    app_main.crew_pool = pool
+    app_main.call_executor = CallExecutor(max_concurrent=callers * duplicates, max_queue=callers * duplicates,
+                                          timeout=60)
+    app_main.idempotency_cache = IdempotencyCache()
+    for caller in range(callers):
+        app_main.session_store.clear(turn(caller)["phone_number"])
+
+    async def go() -> Dict[str, int]:
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await submit_duplicates(client, callers, duplicates, keyed)
+
+    started = time.perf_counter()
+    result = asyncio.run(go())
+    result["seconds"] = time.perf_counter() - started
+    result["kickoffs"] = pool.kickoffs
+    result["turns"] = sum(app_main.session_store.turn_count(turn(caller)["phone_number"]) for caller in range(callers))
+    return result
+
+
+def run_workers(callers: int, duplicates: int, llm_latency: float, shared: bool, workdir: str) -> Dict[str, int]:
+    """Keyed duplicates sent to two forked workers, each copy on its own connection"""
+    name = "shared" if shared else "per-worker"
+    app_main.crew_pool = FakeCrewPool(llm_latency)
+    # Turns are counted in a store every worker writes to
+    app_main.session_store = SQLSessionStore(f"sqlite:///{workdir}/sessions-{name}.db")
+    app_main.context_manager = ConversationContextManager.from_settings(app_main.session_store)
+    app_main.idempotency_cache = IdempotencyCache(db_url=f"sqlite:///{workdir}/keys.db" if shared else None)
+    port = free_port()
+    process = launch_server(port, 2)
+
+    async def go() -> List[List[httpx.Response]]:
+        async def submit(caller: int) -> List[httpx.Response]:
+            async def once() -> httpx.Response:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+                    return await client.post("/api/call/process", json=turn(caller),
+                                             headers={"Idempotency-Key": f"turn-{caller}"})
+
+            return await asyncio.gather(*(once() for _ in range(duplicates)))
+
+        return await asyncio.gather(*(submit(caller) for caller in range(callers)))
+
+    try:
+        results = asyncio.run(go())
+    finally:
+        os.kill(process.pid, signal.SIGTERM)
+        process.join()
+    return {
+        "ok": sum(response.status_code == 200 for group in results for response in group),
+        "turns": sum(app_main.session_store.turn_count(turn(caller)["phone_number"]) for caller in range(callers)),
+        "distinct_per_caller": max(len({response.json()["call_id"] for response in group}) for group in results),
+    }
+
+
+def retry_streams() -> Dict[str, bool]:
+    """A keyed stream and a keyed batch, each sent twice: the retry must replay the first body"""
+    app_main.idempotency_cache = IdempotencyCache()
+    body = turn(900)
+    batch = "\n".join(json.dumps(turn(caller)) for caller in range(901, 905))
+    for caller in range(900, 905):
+        app_main.session_store.clear(turn(caller)["phone_number"])
+
+    async def go() -> Dict[str, bool]:
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            outcome = {}
+            for name, send in (
+                ("stream", lambda: client.post("/api/call/process/stream", json=body,
+                                               headers={"Idempotency-Key": "stream"})),
+                ("batch", lambda: client.post("/api/call/batch", content=batch, headers={"Idempotency-Key": "batch"})),
+            ):
+                first, retry = await send(), await send()
+                outcome[name] = (first.status_code == retry.status_code == 200 and first.text == retry.text
+                                 and retry.headers.get("Idempotent-Replayed") == "true")
+            return outcome
+
+    outcome = asyncio.run(go())
+    outcome["turns kept once"] = all(
+        app_main.session_store.turn_count(turn(caller)["phone_number"]) == 1 for caller in range(900, 905)
+    )
+    return outcome
+
+
+def per_request_ms(requests: int, key: Optional[str]) -> float:
+    """Mean time of a template-tier turn: a fresh run per request, or replays of `key`"""
+
+    async def go() -> float:
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            body = {**turn(0), "issue_type": "service_info", "description": "How much is a lab test?"}
+            if key:
+                await client.post("/api/call/process", json=body, headers={"Idempotency-Key": key})
+            start = time.perf_counter()
+            for _ in range(requests):
+                headers = {"Idempotency-Key": key} if key else {}
+                await client.post("/api/call/process", json=body, headers=headers)
+            return (time.perf_counter() - start) / requests
+
+    return asyncio.run(go()) * 1000
+
+
+def ids_on_threads(generator: CallIdGenerator, threads: int, per_thread: int) -> List[List[str]]:
+    batches: List[List[str]] = [[] for _ in range(threads)]
+
+    def work(batch: List[str]) -> None:
+        for _ in range(per_thread):
+            batch.append(generator.new())
+
+    workers = [threading.Thread(target=work, args=(batch,)) for batch in batches]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return batches
+
+
+def ids_in_forks(generator: CallIdGenerator, workers: int, per_worker: int) -> List[str]:
+    """IDs from `workers` forked children that all start from the parent's generator state"""
+    generator.new()  # the parent has minted an ID, as a pre-fork server would have
+    readers = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            generator.after_fork()
+            ids = "\n".join(generator.new() for _ in range(per_worker))
+            with os.fdopen(write_fd, "w") as fh:
+                fh.write(ids)
+            os._exit(0)
+        os.close(write_fd)
+        readers.append((pid, read_fd))
+    ids: List[str] = []
+    for pid, read_fd in readers:
+        with os.fdopen(read_fd) as fh:
+            ids.extend(fh.read().split("\n"))
+        os.waitpid(pid, 0)
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--duplicates", type=int, default=5, help="copies of each turn submitted at once")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ids", type=int, default=50000, help="IDs per thread or forked worker")
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.USE_CREW = True
+    app_main.response_cache.enabled = False
+    failures: List[str] = []
+
+    print(f"{args.callers} callers x {args.duplicates} concurrent copies of one turn, "
+          f"crew latency {args.llm_latency:.2f}s")
+    print(f"{'setup':<20} {'200s':>5} {'replayed':>9} {'crew runs':>10} {'turns kept':>11} {'IDs/caller':>11} "
+          f"{'seconds':>8}")
+    for keyed in (False, True):
+        name = "Idempotency-Key" if keyed else "no key"
+        result = run_duplicates(args.callers, args.duplicates, keyed, args.llm_latency)
+        print(f"{name:<20} {result['ok']:>5} {result['replayed']:>9} {result['kickoffs']:>10} {result['turns']:>11} "
+              f"{result['distinct_per_caller']:>11} {result['seconds']:>8.2f}")
+        if keyed and (result["kickoffs"] != args.callers or result["turns"] != args.callers
+                      or result["distinct_per_caller"] != 1 or result["ok"] != args.callers * args.duplicates):
+            failures.append("duplicates with the same key were not served by a single run")
+    print(f"{'':<20} {app_main.idempotency_cache.stats()}")
+
+    print(f"\nthe same keyed duplicates over 2 forked workers")
+    print(f"{'keys kept':<20} {'200s':>5} {'turns kept':>11} {'IDs/caller':>11}")
+    settings.MAX_CONCURRENT_CALLS = settings.CALL_QUEUE_SIZE = args.callers * args.duplicates
+    local_store, local_context = app_main.session_store, app_main.context_manager
+    workdir = tempfile.mkdtemp(prefix="bench-idempotency-")
+    for shared in (False, True):
+        result = run_workers(args.callers, args.duplicates, args.llm_latency, shared, workdir)
+        print(f"{'shared table' if shared else 'per worker':<20} {result['ok']:>5} {result['turns']:>11} "
+              f"{result['distinct_per_caller']:>11}")
+        if shared and (result["turns"] != args.callers or result["distinct_per_caller"] != 1
+                       or result["ok"] != args.callers * args.duplicates):
+            failures.append("duplicates on different workers were not served by a single run")
+    app_main.session_store, app_main.context_manager = local_store, local_context
+
+    outcome = retry_streams()
+    print(f"\nkeyed retries: {outcome}")
+    if not all(outcome.values()):
+        failures.append("a keyed stream or batch retry was not replayed")
+
+    settings.USE_CREW = False
+    fresh = per_request_ms(args.requests, None)
+    replay = per_request_ms(args.requests, "replay")
+    print(f"\ntemplate-tier turn, {args.requests} sequential requests")
+    print(f"{'run the turn':<20} {fresh:>8.3f} ms")
+    print(f"{'replay by key':<20} {replay:>8.3f} ms")
+
+    legacy = {f"CALL-{hash(turn(caller % 10)['phone_number'])}" for caller in range(1000)}
+    print(f"\ncall IDs\n{'hash(session_id)':<20} {len(legacy)} distinct IDs for 1000 turns of 10 sessions")
+
+    generator = CallIdGenerator()
+    started = time.perf_counter()
+    batches = ids_on_threads(generator, args.threads, args.ids)
+    elapsed = time.perf_counter() - started
+    total = args.threads * args.ids
+    everything = [call_id for batch in batches for call_id in batch]
+    ordered = all(batch == sorted(batch) for batch in batches)
+    print(f"{f'{args.threads} threads':<20} {total} IDs, {len(set(everything))} distinct, "
+          f"ordered per thread: {ordered}, {total / elapsed:,.0f} IDs/s")
+    if len(set(everything)) != total or not ordered:
+        failures.append("thread IDs collided or went backwards")
+
+    if hasattr(os, "fork"):
+        ids = ids_in_forks(generator, 4, args.ids // 5)
+        print(f"{'4 forked workers':<20} {len(ids)} IDs, {len(set(ids))} distinct")
+        if len(set(ids)) != len(ids):
+            failures.append("forked workers minted the same ID")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Import-time budget check for API startup
+
+Runs ``python -X importtime`` in a fresh interpreter for each module and
+exits non-zero when a module's cumulative import time exceeds its budget or
+when it drags in one of the heavy LLM packages, which must only load on
+first use. Intended for CI: ``python -m benchmarks.bench_import_time``.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> cumulative import budget in milliseconds
+BUDGETS_MS = {
+    "app.main": 1500,
+    "app.agents": 300,
+}
+
+HEAVY_MODULES = ("crewai", "crewai_tools", "langchain_ollama", "langchain_core")
+
+
+def import_profile(module: str):
+    """Return (cumulative microseconds per module, heavy modules loaded) for importing `module`"""
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cumulative_us.isdigit():
+            cumulative[name] = int(cumulative_us)
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative, heavy
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3, help="take the best of N cold imports")
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in BUDGETS_MS.items():
+        best, heavy = None, []
+        for _ in range(args.runs):
+            cumulative, heavy = import_profile(module)
+            elapsed = cumulative.get(module, 0) / 1000
+            best = elapsed if best is None else min(best, elapsed)
+        status = "ok" if best <= budget and not heavy else "FAIL"
+        print(f"{module:<12} {best:8.1f} ms (budget {budget} ms)  heavy: {heavy or '-'}  {status}")
+        if status != "ok":
+            failures.append(module)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
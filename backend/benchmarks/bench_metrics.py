@@ -0,0 +1,81 @@
+"""Check that metrics instrumentation stays within its per-call overhead budget
+
+Replays what one template-tier call records (the stage timers of
+process_call plus the calls_total counter) with recording on and off, and
+fails when the difference exceeds `--budget-us` microseconds per call. It
+then runs process_call itself with metrics on and off so the overhead can be
+read against the cost of a whole call.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from app import main as app_main
+from app.metrics import record_call, registry, stage
+
+# Stages process_call times on the template tier
+CALL_STAGES = ("routing", "template_response", "history_append", "response_build")
+
+
+def instrumented_call() -> None:
+    for name in CALL_STAGES:
+        with stage(name):
+            pass
+    record_call("cardiology", "consultation", "deterministic")
+
+
+def per_call_seconds(enabled: bool, calls: int) -> float:
+    registry.enabled = enabled
+    best = float("inf")
+    # Best of several rounds filters out scheduler noise
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(calls):
+            instrumented_call()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+async def process_calls(calls: int) -> float:
+    request = app_main.CallRequest(
+        patient_name="Alex", phone_number="+15550000001", issue_type="consultation",
+        description="I've been having chest pain when climbing stairs",
+    )
+    start = time.perf_counter()
+    for _ in range(calls):
+        await app_main.process_call(request)
+    return (time.perf_counter() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--budget-us", type=float, default=15.0,
+                        help="allowed instrumentation cost per call in microseconds")
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    off = per_call_seconds(False, args.calls)
+    on = per_call_seconds(True, args.calls)
+    overhead_us = (on - off) * 1e6
+    print(f"instrumentation per call: {on * 1e6:.2f}us on, {off * 1e6:.2f}us off, "
+          f"overhead {overhead_us:.2f}us (budget {args.budget_us:.2f}us)")
+
+    for enabled in (False, True):
+        registry.enabled = enabled
+        asyncio.run(process_calls(min(args.calls, 2000)))  # warm up
+        seconds = asyncio.run(process_calls(args.calls // 4))
+        print(f"process_call with metrics {'on' if enabled else 'off'}: {seconds * 1e6:.1f}us/call")
+
+    if overhead_us > args.budget_us:
+        print("FAIL: metrics overhead is over budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Turn latency on a CPU-only model server: always the large model vs per-turn model routing
+
+Replays a mix of LLM-served turns (price questions, confirmations, symptom
+descriptions) against a fake Ollama that generates one token at a time on a
+single core, with per-token costs in the ratio of the 7B and 2B models'
+CPU speeds. "fixed" sends every turn to mistral, as call_center_crew did;
+"routed" lets app.model_router.ModelRouter choose. Both are then rerun with
+mistral slowed down `--slowdown` times halfway through (another tenant on
+the box, a model swapped out), where the router should move turns to the
+fast model once mistral's p95 crosses the SLO. "large model share" is the
+share of complex turns (complexity >= 0.5) answered by the best model.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.model_router import ModelRouter, turn_complexity
+from app.streaming import stream_llm
+
+# (issue type, description, history length)
+TURNS: List[Tuple[str, str, int]] = [
+    ("service_info", "How much does a lab test cost?", 0),
+    ("service_info", "Do you do physical examinations on Saturdays and what do they cost?", 1),
+    ("appointment", "Yes, Tuesday works", 3),
+    ("appointment", "Can you book me in with the dermatologist next week, mornings only?", 1),
+    ("consultation", "Ok thanks", 4),
+    ("consultation", "I have had chest pain when climbing stairs for two weeks, and my father had heart "
+                     "disease, should I see a cardiologist or is this something my GP can look at first?", 2),
+    ("consultation", "My stomach hurts after every meal and I often feel bloated in the evening. It has been "
+                     "going on for a month and antacids do not help anymore.", 0),
+    ("other", "I got a letter about my results but I do not understand what it means for my treatment plan", 1),
+]
+
+REPLY_TOKENS = 40
+
+
+class FakeCpuOllama:
+    """
+    Stands in for OllamaClient on a single CPU core.
+
+    Each token holds the core for the model's per-token time, so concurrent
+    turns slow each other down like a real CPU-only server. `slowdown`
+    multiplies one model's token time.
+    """
+
+    def __init__(self, token_seconds: Dict[str, float], default_model: str = "mistral"):
+        self.token_seconds = token_seconds
+        self.default_model = default_model
+        self.slowdown: Dict[str, float] = {}
+        self._core = threading.Lock()
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        model = model or self.default_model
+        for index in range(REPLY_TOKENS):
+            with self._core:
+                time.sleep(self.token_seconds[model] * self.slowdown.get(model, 1.0))
+            yield f"token{index} "
+
+
+async def replay(routed: bool, turns: List[Tuple[str, str, int]], args, slowdown: float) -> dict:
+    llm = FakeCpuOllama({"mistral": args.mistral_ms / 1000, "gemma:2b": args.gemma_ms / 1000})
+    router = ModelRouter(["mistral", "llama2", "gemma:2b"], slo_seconds=args.slo, window=args.window,
+                         probe_seconds=args.probe)
+    queue = list(enumerate(turns))
+    queue.reverse()
+    latencies: List[float] = []
+    complex_turns = [0, 0]  # (complex turns, answered by the best model)
+    best = router.models[-1]
+
+    async def caller() -> None:
+        while queue:
+            index, (issue_type, description, history_length) = queue.pop()
+            if slowdown > 1 and index == len(turns) // 2:
+                llm.slowdown["mistral"] = slowdown
+            model = router.choose(issue_type, description, history_length).model if routed else None
+            started = time.perf_counter()
+            async for _ in stream_llm(llm, description, model):
+                pass
+            elapsed = time.perf_counter() - started
+            router.observe(model, elapsed)
+            latencies.append(elapsed)
+            if turn_complexity(issue_type, description, history_length) >= 0.5:
+                complex_turns[0] += 1
+                complex_turns[1] += int((model or llm.default_model) == best)
+
+    await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "over_slo": sum(1 for latency in latencies if latency > args.slo) / len(latencies),
+        "large_share": complex_turns[1] / complex_turns[0] if complex_turns[0] else 0.0,
+        "stats": router.stats() if routed else {},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mistral-ms", type=float, default=6, help="per-token time of the 7B model")
+    parser.add_argument("--gemma-ms", type=float, default=2, help="per-token time of the 2B model")
+    parser.add_argument("--slo", type=float, default=1.0, help="p95 latency SLO in seconds")
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--probe", type=float, default=2.5, help="seconds between probes of a model over its SLO")
+    parser.add_argument("--slowdown", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    turns = [rng.choice(TURNS) for _ in range(args.turns)]
+    print(f"{args.turns} turns, concurrency {args.concurrency}, {REPLY_TOKENS} tokens per reply on one core, "
+          f"mistral {args.mistral_ms:.0f} ms/token, gemma:2b {args.gemma_ms:.0f} ms/token, SLO {args.slo:.1f}s")
+    print(f"{'mode':<26} {'mean s':>7} {'p50 s':>7} {'p95 s':>7} {'over SLO':>9} {'large model share':>18}")
+    for slowdown in (1.0, args.slowdown):
+        for routed in (False, True):
+            name = ("routed" if routed else "fixed mistral") + (f", {slowdown:.0f}x slower" if slowdown > 1 else "")
+            result = asyncio.run(replay(routed, turns, args, slowdown))
+            print(f"{name:<26} {result['mean']:>7.2f} {result['p50']:>7.2f} {result['p95']:>7.2f} "
+                  f"{result['over_slo']:>9.0%} {result['large_share']:>18.0%}")
+            stats = result["stats"]
+            if stats:
+                turns_per_model = ", ".join(f"{key.split(':', 1)[1]} {value}" for key, value in stats.items()
+                                            if key.startswith("turns:"))
+                print(f"{'':<26} turns: {turns_per_model}; {stats['fallbacks']} fallbacks, {stats['probes']} probes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Connection reuse, single flight and throughput of the pooled Ollama client against a stub server
+
+Exits non-zero when the pooled client opens more connections than its pool
+holds, sends a request per call for identical concurrent prompts, or
+returns a wrong completion.
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from app.llm_client import OllamaClient
+
+from .fakes import DEFAULT_REPLY, StubOllamaServer
+
+
+def unpooled_generate(url: str, prompt: str) -> str:
+    """What a client without a shared session does: a fresh connection per call"""
+    response = requests.post(f"{url}/api/generate", json={"model": "mistral", "prompt": prompt, "stream": False})
+    return response.json()["response"]
+
+
+def timed(label: str, server: StubOllamaServer, func, prompts, threads: int) -> Dict[str, int]:
+    server.connections = server.requests = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        replies = list(pool.map(func, prompts))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<26} {len(prompts) / elapsed:8.1f} calls/s  "
+          f"{server.requests:5d} requests  {server.connections:5d} connections")
+    return {"requests": server.requests, "connections": server.connections,
+            "wrong_replies": sum(reply != DEFAULT_REPLY for reply in replies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    prompts = [f"prompt {index}" for index in range(args.calls)]
+    failures: List[str] = []
+
+    with StubOllamaServer(latency=args.latency) as server:
+        client = OllamaClient(server.url, "mistral", pool_size=args.threads, max_in_flight=args.threads)
+        timed("unpooled requests.post", server, lambda p: unpooled_generate(server.url, p), prompts, args.threads)
+
+        pooled = timed("pooled client", server, client.generate, prompts, args.threads)
+        if pooled["connections"] > args.threads:
+            failures.append(f"pooled client opened {pooled['connections']} connections for a pool of {args.threads}")
+        if pooled["requests"] != args.calls:
+            failures.append(f"{pooled['requests']} requests for {args.calls} distinct prompts")
+
+        coalesced_before = client.stats()["coalesced"]
+        duplicates = timed("pooled, duplicate prompts", server, client.generate, ["same prompt"] * args.calls,
+                           args.threads)
+        coalesced = client.stats()["coalesced"] - coalesced_before
+        if duplicates["requests"] + coalesced != args.calls:
+            failures.append(f"{duplicates['requests']} requests + {coalesced} coalesced != {args.calls} calls")
+        # Threads that arrive while the same prompt is in flight must share its request
+        if duplicates["requests"] > args.calls // 2:
+            failures.append(f"single flight sent {duplicates['requests']} requests for {args.calls} identical calls")
+        if duplicates["connections"] > args.threads:
+            failures.append(f"duplicate run opened {duplicates['connections']} connections")
+
+        for name, result in (("pooled", pooled), ("duplicates", duplicates)):
+            if result["wrong_replies"]:
+                failures.append(f"{result['wrong_replies']} wrong completions in the {name} run")
+        print(f"client stats: {client.stats()}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
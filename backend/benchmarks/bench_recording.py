@@ -0,0 +1,183 @@
+"""Transcript log: /api/call/process latency under write load, plus lookup and rebuild times
+
+Runs /api/call/process in-process in three setups: recording off, recording
+on, and recording on while a background thread records `--flood` extra
+turns per second, standing in for the rest of a busy call center. If the
+background writer's group commits stay off the request path, p99 should
+barely move. The log is then grown to `--log-turns` turns over `--phones`
+callers to time the index rebuild after a restart, per-caller history
+lookups and a date-range export.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+
+from app import main as app_main
+from app.recording import CallRecorder
+
+from .load import percentile
+
+DESCRIPTIONS = [
+    "Hello, my name is Alex",
+    "I've been having chest pain when climbing stairs",
+    "I'd like to book an appointment with a cardiologist",
+    "My stomach hurts after every meal",
+    "Morning works best for me",
+]
+AGENT_REPLY = (
+    "Thank you Alex. I understand you want to book a cardiology appointment. We have experienced "
+    "cardiologists available. Would you prefer a morning, afternoon, or evening appointment?"
+)
+
+
+async def drive(requests: int, concurrency: int, sessions: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = [requests]
+
+    async def caller(client: httpx.AsyncClient, index: int) -> None:
+        turn = 0
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            turn += 1
+            start = time.perf_counter()
+            response = await client.post("/api/call/process", json={
+                "patient_name": "Alex", "phone_number": f"+1555{(index * 7 + turn) % sessions:07d}",
+                "issue_type": "consultation", "description": DESCRIPTIONS[turn % len(DESCRIPTIONS)],
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(client, index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {"rps": len(ordered) / elapsed, "p50_ms": percentile(ordered, 0.5) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000}
+
+
+class Flood:
+    """Records `rate` turns per second on a background thread"""
+
+    def __init__(self, recorder: CallRecorder, rate: int, phones: int):
+        self.recorder = recorder
+        self.rate = rate
+        self.phones = phones
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        rng = random.Random(5)
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            due = int((time.perf_counter() - started) * self.rate)
+            for _ in range(due - self.sent):
+                self.recorder.record(f"+1666{rng.randrange(self.phones):07d}",
+                                     {"user": rng.choice(DESCRIPTIONS), "agent": AGENT_REPLY})
+                self.sent += 1
+            time.sleep(0.005)
+
+    def __enter__(self) -> "Flood":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def fill(recorder: CallRecorder, turns: int, phones: int) -> float:
+    rng = random.Random(9)
+    started = time.perf_counter()
+    for index in range(turns):
+        if index % 20000 == 0:
+            recorder.flush()  # stay under the queue limit instead of measuring drops
+        recorder.record(f"+1777{rng.randrange(phones):07d}", {"user": rng.choice(DESCRIPTIONS), "agent": AGENT_REPLY})
+    recorder.flush()
+    return turns / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--flood", type=int, default=5000, help="extra recorded turns per second")
+    parser.add_argument("--log-turns", type=int, default=200000)
+    parser.add_argument("--phones", type=int, default=10000)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    app_main.response_cache.enabled = False
+    directory = tempfile.mkdtemp(prefix="bench-recording-")
+    try:
+        recorder = CallRecorder(directory, fsync=not args.no_fsync)
+        asyncio.run(drive(500, args.concurrency, args.sessions))  # warm up
+
+        print(f"/api/call/process, {args.requests} requests, concurrency {args.concurrency}")
+        print(f"{'setup':<24} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name in ("recording off", "recording on", f"on + {args.flood} turns/s"):
+            recorder.enabled = name != "recording off"
+            app_main.call_recorder = recorder
+            before = recorder.stats()["records"]
+            started = time.perf_counter()
+            if name.startswith("on +"):
+                with Flood(recorder, args.flood, args.phones):
+                    result = asyncio.run(drive(args.requests, args.concurrency, args.sessions))
+            else:
+                result = asyncio.run(drive(args.requests, args.concurrency, args.sessions))
+            recorder.flush()
+            written = (recorder.stats()["records"] - before) / (time.perf_counter() - started)
+            print(f"{name:<24} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+                  f"   ({written:.0f} turns/s written)")
+
+        rate = fill(recorder, args.log_turns, args.phones)
+        stats = recorder.stats()
+        print(f"\nwrote {args.log_turns} turns at {rate:.0f}/s: {stats['blocks']} blocks, "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB on disk, compression {stats['compression_ratio']:.1f}x, "
+              f"{stats['dropped']} dropped")
+        recorder.close()
+
+        started = time.perf_counter()
+        reopened = CallRecorder(directory)
+        reopened._open()
+        print(f"index rebuild after restart: {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"({reopened.stats()['indexed_blocks']} blocks, {reopened.stats()['sessions']} callers)")
+
+        rng = random.Random(1)
+        lookups = []
+        for _ in range(200):
+            phone = f"+1777{rng.randrange(args.phones):07d}"
+            started = time.perf_counter()
+            reopened.history(phone, limit=50)
+            lookups.append(time.perf_counter() - started)
+        print(f"history lookup (last 50 turns): median {statistics.median(lookups) * 1000:.2f} ms, "
+              f"p99 {percentile(sorted(lookups), 0.99) * 1000:.2f} ms")
+
+        first = min(block.first_ts for blocks in reopened._blocks.values() for block in blocks)
+        last = max(block.last_ts for blocks in reopened._blocks.values() for block in blocks)
+        window = (last - first) / 10
+        started = time.perf_counter()
+        exported = sum(1 for _ in reopened.export(start=last - window, end=last + 1))
+        print(f"export of the last tenth of the time range: {exported} turns in "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
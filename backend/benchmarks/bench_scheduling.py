@@ -0,0 +1,151 @@
+"""Scheduling engine at clinic scale: 10k doctors x 90 days by default
+
+Builds the engine in memory, books a random share of the horizon to make
+searches realistic, then reports latency of "next N free slots" queries per
+doctor, per specialty and clinic-wide. Finally `--threads` threads race to
+book the same contested slots; the run fails if any doctor ends up with
+overlapping appointments.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app.models import PatientInfo
+from app.scheduling import Doctor, SchedulingEngine, SlotUnavailable
+
+SPECIALTIES = ("cardiology", "gastroenterology", "neurology", "orthopedics", "general")
+
+PATIENT = PatientInfo(name="Bench Patient", phone_number="+15550000000")
+
+
+def build(doctors: int, days: int) -> SchedulingEngine:
+    roster = [
+        Doctor(f"DR-{index:05d}", f"Doctor {index}", SPECIALTIES[index % len(SPECIALTIES)],
+               (0, 1, 2, 3, 4) if index % 3 else (1, 2, 3, 4, 5))
+        for index in range(doctors)
+    ]
+    return SchedulingEngine(roster, start_date=(datetime.now() + timedelta(days=1)).date(), horizon_days=days)
+
+
+def timed(func, samples: int):
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1e6, latencies[int(len(latencies) * 0.99) - 1] * 1e6
+
+
+def fill(engine: SchedulingEngine, bookings: int, rng: random.Random) -> int:
+    doctor_ids = [doctor.id for doctor in engine.doctors()]
+    booked = 0
+    for _ in range(bookings):
+        day = rng.randrange(engine.horizon_days)
+        start = engine._slot_start(day * engine.slots_per_day + rng.randrange(engine.slots_per_day))
+        try:
+            engine.book(rng.choice(doctor_ids), start, PATIENT)
+            booked += 1
+        except SlotUnavailable:
+            pass
+    return booked
+
+
+def race(engine: SchedulingEngine, threads: int, attempts: int, rng: random.Random):
+    """Threads book overlapping starts with the same few doctors; return (booked, rejected, seconds)"""
+    doctor_ids = [doctor.id for doctor in engine.doctors("cardiology")][:5]
+    first = engine.find_slots(doctor_id=doctor_ids[0], limit=1)[0].start
+    starts = [first + timedelta(minutes=engine.slot_minutes * offset) for offset in range(8)]
+    plans = [[(rng.choice(doctor_ids), rng.choice(starts)) for _ in range(attempts)] for _ in range(threads)]
+    counts = {"booked": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def worker(plan):
+        for doctor_id, start in plan:
+            try:
+                engine.book(doctor_id, start, PATIENT)
+                outcome = "booked"
+            except SlotUnavailable:
+                outcome = "rejected"
+            with lock:
+                counts[outcome] += 1
+
+    workers = [threading.Thread(target=worker, args=(plan,)) for plan in plans]
+    began = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return counts["booked"], counts["rejected"], time.perf_counter() - began
+
+
+def overlapping(engine: SchedulingEngine) -> int:
+    """Pairs of scheduled appointments that overlap for the same doctor"""
+    spans = {}
+    for appointment in engine._appointments.values():
+        start = datetime.fromisoformat(f"{appointment.date}T{appointment.time}")
+        spans.setdefault(appointment.doctor_id, []).append((start, start + timedelta(minutes=appointment.duration)))
+    overlaps = 0
+    for intervals in spans.values():
+        intervals.sort()
+        overlaps += sum(1 for (_, end), (start, _) in zip(intervals, intervals[1:]) if start < end)
+    return overlaps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--doctors", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--bookings", type=int, default=200000, help="random bookings made before searching")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = build(args.doctors, args.days)
+    built = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"built {args.doctors} doctors x {args.days} days ({engine.total_slots} slots each) "
+          f"in {built:.2f}s, {memory / 1e6:.1f} MB")
+
+    start = time.perf_counter()
+    booked = fill(engine, args.bookings, rng)
+    elapsed = time.perf_counter() - start
+    print(f"booked {booked}/{args.bookings} random slots at {args.bookings / elapsed:.0f} bookings/s")
+
+    doctor_ids = [doctor.id for doctor in engine.doctors()]
+    queries = {
+        "doctor next 5": lambda: engine.find_slots(doctor_id=rng.choice(doctor_ids), limit=5),
+        "specialty next 5": lambda: engine.find_slots(specialty=rng.choice(SPECIALTIES), limit=5),
+        "specialty next 5, 60 min, day 45": lambda: engine.find_slots(
+            specialty=rng.choice(SPECIALTIES), duration=60,
+            after=datetime.now() + timedelta(days=45, hours=rng.randrange(24)), limit=5),
+        "clinic-wide next 10": lambda: engine.find_slots(limit=10),
+    }
+    print(f"{'query':<36} {'p50 us':>9} {'p99 us':>9}")
+    for name, query in queries.items():
+        p50, p99 = timed(query, args.samples)
+        print(f"{name:<36} {p50:>9.1f} {p99:>9.1f}")
+
+    booked, rejected, elapsed = race(engine, args.threads, 200, rng)
+    overlaps = overlapping(engine)
+    print(f"race: {args.threads} threads, {booked} booked, {rejected} rejected in {elapsed:.2f}s, "
+          f"{overlaps} overlapping appointments")
+    if overlaps:
+        print("FAIL: double booking")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
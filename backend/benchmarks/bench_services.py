@@ -0,0 +1,176 @@
+"""/api/services: per-request dict building vs the pre-serialized catalog, 304s and hot reloads
+
+Drives GET /api/services in-process through the full middleware stack:
+the original handler (mounted next to the real one), the catalog's 200,
+and the 304 a polling frontend gets once it sends If-None-Match. A larger
+file-backed catalog is then served while another thread rewrites the file
+every `--reload-ms`, to check that reloads stay off the request path. Last,
+the agent tool's lookups are timed against the old dict.get.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app import main as app_main
+from app.service_catalog import ServiceCatalog, load_services
+
+from .load import percentile
+
+
+async def legacy_services():
+    """get_services before the catalog"""
+    services = [
+        {"id": "1", "name": "Cardiology", "duration": "45 mins"},
+        {"id": "2", "name": "Gastroenterology", "duration": "45 mins"},
+        {"id": "3", "name": "Neurology", "duration": "45 mins"},
+        {"id": "4", "name": "Orthopedics", "duration": "45 mins"},
+        {"id": "5", "name": "General Consultation", "duration": "30 mins"},
+    ]
+    return {"services": services}
+
+
+LEGACY_SERVICE_INFO = {
+    "consultation": "General consultation - 30 mins - Free initial",
+    "dental": "Dental checkup - 45 mins - $50",
+    "lab_tests": "Lab tests - 15 mins - $100",
+    "follow_up": "Follow-up visit - 20 mins - $30",
+    "physical": "Physical examination - 30 mins - $60"
+}
+
+
+async def drive(path: str, requests: int, concurrency: int, etag: Optional[str] = None) -> Dict[str, float]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = [requests]
+    headers = {"If-None-Match": etag} if etag else {}
+
+    async def caller(client: httpx.AsyncClient) -> None:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {"rps": len(ordered) / elapsed, "p50_ms": percentile(ordered, 0.5) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000, "statuses": statuses}
+
+
+def write_catalog(path: str, services: int, revision: int) -> None:
+    entries = [
+        {"id": f"svc_{index}", "name": f"Service {index} rev {revision}", "specialty": f"specialty_{index % 12}",
+         "duration": 15 + index % 4 * 15, "cost": index % 7 * 20}
+        for index in range(services)
+    ]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(entries, fh)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+class Rewriter:
+    """Rewrites the catalog file every `interval` seconds on a background thread"""
+
+    def __init__(self, path: str, services: int, interval: float):
+        self.path = path
+        self.services = services
+        self.interval = interval
+        self.revisions = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.revisions += 1
+            write_catalog(self.path, self.services, self.revisions)
+
+    def __enter__(self) -> "Rewriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def per_lookup_us(lookup, queries: List[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for query in queries:
+                lookup(query)
+        best = min(best, (time.perf_counter() - start) / (rounds * len(queries)))
+    return best * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--services", type=int, default=300, help="catalog size for the hot reload run")
+    parser.add_argument("--reload-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    app_main.app.add_api_route("/api/services/legacy", legacy_services, methods=["GET"])
+    asyncio.run(drive("/api/services", 500, args.concurrency))  # warm up
+
+    print(f"GET /api/services, {args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'setup':<34} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    def report(name: str, result: Dict[str, float]) -> None:
+        statuses = ", ".join(f"{count} x {status}" for status, count in sorted(result["statuses"].items()))
+        print(f"{name:<34} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}   ({statuses})")
+
+    report("original handler", asyncio.run(drive("/api/services/legacy", args.requests, args.concurrency)))
+    report("catalog, 200", asyncio.run(drive("/api/services", args.requests, args.concurrency)))
+    etag = app_main.service_catalog.current().etag
+    report("catalog, If-None-Match -> 304", asyncio.run(drive("/api/services", args.requests, args.concurrency, etag)))
+
+    directory = tempfile.mkdtemp(prefix="bench-services-")
+    try:
+        path = os.path.join(directory, "services.json")
+        write_catalog(path, args.services, 0)
+        catalog = ServiceCatalog(load_services(path), path=path, reload_interval=args.reload_ms / 2000)
+        app_main.service_catalog = catalog
+        report(f"{args.services} services, file unchanged",
+               asyncio.run(drive("/api/services", args.requests, args.concurrency)))
+        with Rewriter(path, args.services, args.reload_ms / 1000) as rewriter:
+            result = asyncio.run(drive("/api/services", args.requests, args.concurrency))
+        report(f"{args.services} services, rewritten /{args.reload_ms:.0f}ms", result)
+        stats = catalog.stats()
+        print(f"{'':<34} {rewriter.revisions} rewrites, {stats['reloads']} reloads, "
+              f"{stats['reload_errors']} reload errors")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    snapshot = ServiceCatalog(load_services()).current()
+    print("\nagent tool lookups")
+    print(f"{'original dict.get (exact id only)':<34} {per_lookup_us(LEGACY_SERVICE_INFO.get, ['lab_tests', 'dental'], 20000):>8.2f} us")
+    for name, queries in (("catalog, exact id or name", ["lab_tests", "Dental Checkup"]),
+                          ("catalog, prefix", ["lab", "follow"]),
+                          ("catalog, misspelled", ["dentl", "fisical examination"])):
+        print(f"{name:<34} {per_lookup_us(snapshot.search, queries, 2000):>8.2f} us   "
+              f"{[[service.id for service in snapshot.search(query, 3)] for query in queries]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark the compiled specialty matcher against the original keyword scan"""
+
+import argparse
+import random
+import time
+
+from app.config import SPECIALTY_KEYWORDS
+from app.specialty import SpecialtyMatcher
+
+
+def legacy_extract_specialty(description: str, specialties: dict) -> str:
+    """The pre-matcher implementation: substring scan per keyword per specialty"""
+    description_lower = description.lower() if description else ""
+    for specialty, keywords in specialties.items():
+        if any(keyword in description_lower for keyword in keywords):
+            return specialty
+    return "general"
+
+
+def synthetic_catalog(size: int, synonyms: int, seed: int = 7) -> dict:
+    """Grow the built-in table to `size` specialties with `synonyms` keywords each"""
+    rng = random.Random(seed)
+    table = {name: list(words) for name, words in SPECIALTY_KEYWORDS.items()}
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    for index in range(size - len(table)):
+        table[f"specialty_{index}"] = [
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(5, 12)))
+            for _ in range(synonyms)
+        ]
+    # Keep "general" last so it stays the lowest-priority catch-all
+    table["general"] = table.pop("general")
+    return table
+
+
+DESCRIPTIONS = [
+    "I have chest pain and want to book an appointment with a cardiologist",
+    "My stomach hurts after every meal and I feel bloated",
+    "I've been having headaches and migraines for two weeks",
+    "My knee is swollen and I think I have arthritis",
+    "Can I schedule a general checkup next week?",
+    "Hello, I'd like some information about your services",
+]
+
+
+def run(label: str, func, descriptions, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for description in descriptions:
+            func(description)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(descriptions)
+    print(f"{label:<28} {calls / elapsed:>12,.0f} calls/s  {elapsed / calls * 1e6:8.2f} us/call")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--specialties", type=int, default=300)
+    parser.add_argument("--synonyms", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    for table in (SPECIALTY_KEYWORDS, synthetic_catalog(args.specialties, args.synonyms)):
+        keywords = sum(len(words) for words in table.values())
+        print(f"\n{len(table)} specialties / {keywords} keywords")
+        matcher = SpecialtyMatcher(table)
+        for description in DESCRIPTIONS:
+            assert matcher.classify(description) == legacy_extract_specialty(description, table), description
+        legacy = run("legacy substring scan", lambda d: legacy_extract_specialty(d, table), DESCRIPTIONS, args.repeat)
+        compiled = run("compiled matcher", matcher.classify, DESCRIPTIONS, args.repeat)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            matcher.classify_batch(DESCRIPTIONS)
+        batched = time.perf_counter() - start
+        print(f"{'compiled matcher (batch)':<28} {args.repeat * len(DESCRIPTIONS) / batched:>12,.0f} calls/s")
+        print(f"speedup: {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Latency and wasted agent time: committing to one agent vs speculative top-k agents
+
+Replays crew calls whose issue type is sometimes wrong for what the caller
+describes, against a fake crew pool where the wrong agent gives up instead
+of answering. The sequential path runs the best-ranked agent and, when its
+answer fails validation, reroutes to the next one (the misroute round trip).
+The speculative path runs app.speculative.SpeculativeCrew and reroutes only
+when no speculated agent answered. Both report latency per call and agent
+seconds spent per call. The run fails if an agent with side effects (the
+appointment agent, which books) was ever started alongside another one.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+from app.executor import CallExecutor
+from app.speculative import SIDE_EFFECT_AGENTS, SpeculativeCrew, rank_candidates, validate_answer
+
+from .fakes import FakeAgentCrewPool
+
+# (issue type chosen by the caller, description, issue type that can answer it)
+CALLS = [
+    ("consultation", "I have had a cough and a fever since Monday", "consultation"),
+    ("consultation", "I'd like to book an appointment about my cough", "appointment"),
+    ("consultation", "How much does the visit cost with my insurance?", "service_info"),
+    ("appointment", "Can I book it, and what does the service cost?", "service_info"),
+    ("service_info", "Please schedule a checkup, what is the price?", "appointment"),
+    ("appointment", "Book me in for next Tuesday morning", "appointment"),
+    ("consultation", "My knee hurts, should I book a visit or is it billing related?", "consultation"),
+]
+
+
+async def reroute(executor: CallExecutor, pool: FakeAgentCrewPool, call_data: dict, tried: List[str]) -> str:
+    """Run the remaining ranked agents one after another until one answers"""
+    answer = ""
+    for candidate in rank_candidates(call_data["issue_type"], call_data["description"]):
+        if candidate.agent in tried:
+            continue
+        answer = await executor.run(pool.kickoff, {**call_data, "issue_type": candidate.issue_type})
+        if validate_answer(candidate, answer):
+            break
+    return answer
+
+
+async def speculative_then_reroute(speculative: SpeculativeCrew, executor: CallExecutor,
+                                   pool: FakeAgentCrewPool, call_data: dict, overlaps: List[List[str]]) -> str:
+    """Speculate over the close candidates; agents outside the margin still cost a reroute"""
+    result = await speculative.run(executor, pool.kickoff, call_data)
+    if len(result.started) > 1 and SIDE_EFFECT_AGENTS.intersection(result.started):
+        overlaps.append(result.started)
+    if validate_answer(result.winner, result.answer):
+        return result.answer
+    return await reroute(executor, pool, call_data, result.started)
+
+
+async def replay(mode: str, calls: List[Tuple[str, str, str]], concurrency: int, args) -> dict:
+    executor = CallExecutor(max_concurrent=args.slots, max_queue=len(calls), timeout=300)
+    pool = FakeAgentCrewPool(step_latency=args.step_latency, steps=args.steps)
+    speculative = SpeculativeCrew(top_k=args.top_k, margin=args.margin, budget_seconds=args.budget)
+    queue = list(enumerate(calls))
+    latencies: List[float] = []
+    overlaps: List[List[str]] = []
+
+    async def caller() -> None:
+        while queue:
+            index, (issue_type, description, expected) = queue.pop()
+            call_data = {"issue_type": issue_type, "patient_name": f"Caller{index}", "description": description,
+                         "preferred_date": None, "expected_issue_type": expected}
+            started = time.perf_counter()
+            if mode == "sequential":
+                await reroute(executor, pool, call_data, [])
+            else:
+                await speculative_then_reroute(speculative, executor, pool, call_data, overlaps)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Cancelled kickoffs finish their current step after the call returns
+    await asyncio.sleep(args.step_latency * 2)
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "agent_seconds": pool.busy_seconds / len(calls),
+        "calls_per_second": len(calls) / elapsed,
+        "stats": speculative.stats(),
+        "overlaps": overlaps,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="callers at once")
+    parser.add_argument("--slots", type=int, default=10, help="executor slots (MAX_CONCURRENT_CALLS)")
+    parser.add_argument("--step-latency", type=float, default=0.02, help="seconds per fake agent step")
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--margin", type=float, default=0.25)
+    parser.add_argument("--budget", type=float, default=60, help="extra agent seconds allowed per call")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    calls = [rng.choice(CALLS) for _ in range(args.calls)]
+    misrouted = sum(1 for issue_type, _, expected in calls if issue_type != expected)
+    print(f"{args.calls} calls ({misrouted} with the wrong issue type), concurrency {args.concurrency}, "
+          f"{args.slots} slots, {args.steps} x {args.step_latency * 1000:.0f} ms agent steps")
+    print(f"{'mode':<12} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'agent s/call':>13} {'calls/s':>8}")
+    results = {}
+    for mode in ("sequential", "speculative"):
+        results[mode] = result = asyncio.run(replay(mode, calls, args.concurrency, args))
+        print(f"{mode:<12} {result['mean'] * 1000:>8.1f} {result['p50'] * 1000:>8.1f} {result['p95'] * 1000:>8.1f} "
+              f"{result['agent_seconds']:>13.3f} {result['calls_per_second']:>8.1f}")
+    stats = results["speculative"]["stats"]
+    print(f"speculated {stats['speculated']}/{stats['calls']} calls, {stats['misroutes_avoided']} misroutes avoided, "
+          f"{stats['cancelled']} kickoffs cancelled, {stats['extras_skipped']} extras skipped, "
+          f"wasted {stats['wasted_seconds']:.2f}s vs saved at least {stats['latency_saved_seconds']:.2f}s")
+    overlaps = results["speculative"]["overlaps"]
+    if overlaps:
+        print(f"FAIL: side-effect agents were speculated on in {len(overlaps)} calls, e.g. {overlaps[0]}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
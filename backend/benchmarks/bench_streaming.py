@@ -0,0 +1,93 @@
+"""Measure time-to-first-audio for streamed vs whole-response call handling
+
+The fake LLM emits tokens with a fixed delay. "First audio" is the moment
+the client holds its first complete sentence, which is when chat.html can
+start speech synthesis. The streamed run reads /api/call/process/stream; the
+whole-response run posts the same turn to /api/call/process, whose crew
+answers through the same fake LLM, and can only speak once the reply arrives.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import httpx
+
+from app import main as app_main
+from app.config import settings
+from app.streaming import SentenceBuffer
+
+from .fakes import FakeStreamingLLM, LLMCrewPool, running_server
+
+PAYLOAD = {
+    "patient_name": "Alex",
+    "issue_type": "consultation",
+    # Reschedules have no template, so the turn escalates to the LLM
+    "description": "I need to reschedule, the chest pain is back when I climb stairs",
+}
+
+
+def measure_stream(client: httpx.Client, base_url: str, phone_number: str) -> float:
+    buffer = SentenceBuffer()
+    start = time.perf_counter()
+    with client.stream("POST", f"{base_url}/api/call/process/stream",
+                       json={**PAYLOAD, "phone_number": phone_number}) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "chunk" and buffer.feed(event["text"]):
+                return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+def measure_whole(client: httpx.Client, base_url: str, phone_number: str) -> float:
+    start = time.perf_counter()
+    response = client.post(f"{base_url}/api/call/process", json={**PAYLOAD, "phone_number": phone_number})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    settings.STREAM_LLM_RESPONSES = True
+    settings.USE_CREW = True
+    settings.SPECULATIVE_AGENTS = False
+    llm = FakeStreamingLLM(token_latency=args.token_latency)
+    crew = LLMCrewPool(llm)
+    app_main.streaming_llm = llm
+    app_main.crew_pool = crew
+    # A cached reply would skip the LLM on every run after the first
+    app_main.response_cache.enabled = False
+
+    with running_server(app_main.app) as base_url, httpx.Client(timeout=60) as client:
+        # A fresh caller per run, so both paths serve a first turn
+        streamed = [measure_stream(client, base_url, f"+1555000{run:04d}") for run in range(args.runs)]
+        whole = [measure_whole(client, base_url, f"+1556000{run:04d}") for run in range(args.runs)]
+
+    first_audio = statistics.median(streamed)
+    full = statistics.median(whole)
+    print(f"time to first audio (streaming):      {first_audio * 1000:8.1f} ms")
+    print(f"time to first audio (whole response): {full * 1000:8.1f} ms")
+    print(f"improvement: {full / first_audio:.1f}x")
+
+    failures = []
+    if crew.kickoffs != args.runs:
+        failures.append(f"/api/call/process reached the LLM on {crew.kickoffs} of {args.runs} runs")
+    if first_audio >= full:
+        failures.append("streaming did not start audio before the whole response arrived")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Memory and time per template-tier reply: preparsed templates vs the original if/elif
+
+Replays the deterministic part of a call (pick the response, render it,
+derive next_steps) for a mix of specialties, booking and non-booking
+descriptions and history lengths. tracemalloc reports the peak bytes
+allocated while building one reply, then both paths are timed without
+tracing. The run fails if any reply or next_steps differs from the original.
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from app.response_templates import response_templates
+
+
+def legacy_response(patient_name: str, description: str, specialty: str, history_length: int) -> str:
+    """generate_smart_response before the template engine"""
+    patient_name = patient_name.strip() if patient_name else "there"
+
+    if specialty == "cardiology":
+        if "appointment" in description.lower() or "book" in description.lower():
+            return f"Thank you {patient_name}. I understand you want to book a cardiology appointment. We have experienced cardiologists available. Would you prefer a morning, afternoon, or evening appointment? Also, do you have any specific dates in mind?"
+        else:
+            return f"Thank you {patient_name}. I understand you're experiencing heart-related issues. This requires a cardiologist's evaluation. I can help you schedule an appointment with our cardiology specialist. When would be the best time for you to visit?"
+
+    elif specialty == "gastroenterology":
+        if "appointment" in description.lower() or "book" in description.lower():
+            return f"Thank you {patient_name}. I'll help you book an appointment with our gastroenterologist. We have available slots next week. Would you prefer morning or afternoon? Any particular days that work best for you?"
+        else:
+            return f"Thank you {patient_name}. Digestive issues require proper evaluation by a specialist. I recommend scheduling a consultation with our gastroenterologist. They can provide a comprehensive assessment and treatment plan. Would you like to book an appointment?"
+
+    elif specialty == "neurology":
+        if "appointment" in description.lower() or "book" in description.lower():
+            return f"Thank you {patient_name}. Our neurologists have several availability slots. Would you prefer this week or next week? What time of day works best for you?"
+        else:
+            return f"Thank you {patient_name}. Neurological concerns should be evaluated by a specialist. I can connect you with our experienced neurologist. They can help diagnose and treat your condition. Shall we schedule an appointment?"
+
+    elif specialty == "orthopedics":
+        if "appointment" in description.lower() or "book" in description.lower():
+            return f"Thank you {patient_name}. Our orthopedic specialists are available for appointments. We have slots available Tuesday through Saturday. Which day suits you best?"
+        else:
+            return f"Thank you {patient_name}. Bone and joint issues require professional orthopedic care. I can help you schedule an evaluation with our orthopedic specialist. They'll assess your condition and recommend treatment. Would you like to proceed with booking?"
+
+    else:
+        if history_length > 1:
+            return f"Thank you {patient_name}. Based on what you've shared, I recommend booking a general consultation. Our doctors can assess your condition and refer you to a specialist if needed. Are you interested in scheduling an appointment this week?"
+        else:
+            return f"Hello {patient_name}! Thank you for contacting us. I'm here to help you with your medical needs. Could you tell me more about what brings you in today?"
+
+
+def legacy_next_steps(response_text: str) -> List[str]:
+    if "appointment" in response_text.lower():
+        return ["Choose preferred appointment time", "Confirm specialist preference", "Receive appointment confirmation"]
+    return ["Provide more details if needed", "Proceed to book appointment", "Receive appointment confirmation"]
+
+
+def legacy_reply(patient_name: str, description: str, specialty: str, history_length: int):
+    text = legacy_response(patient_name, description, specialty, history_length)
+    return text, legacy_next_steps(text)
+
+
+def template_reply(patient_name: str, description: str, specialty: str, history_length: int):
+    template = response_templates.select(specialty, description, history_length)
+    return template.render(patient_name), template.next_steps
+
+
+DESCRIPTIONS = [
+    "I'd like to book an appointment, I have had chest pain and shortness of breath when climbing the stairs "
+    "to my flat for the last two weeks and my father had heart disease",
+    "My stomach hurts after every meal and I often feel bloated in the evening, it has been going on for a month",
+    "Constant headaches for a week",
+    "Can I schedule a visit for my knee? It has been swollen since I fell while running last weekend",
+    "Hello, returning your call",
+]
+CASES: List[Tuple[str, str, str, int]] = [
+    (name, description, specialty, history)
+    for name in ("Alex", "  Jordan Lee ", "")
+    for description in DESCRIPTIONS
+    for specialty in ("cardiology", "gastroenterology", "neurology", "orthopedics", "general", "dermatology")
+    for history in (0, 2)
+]
+
+Reply = Callable[[str, str, str, int], Tuple[str, object]]
+
+
+def peak_bytes(reply: Reply) -> float:
+    """Mean peak of memory allocated while building one reply, including the reply itself"""
+    total = 0
+    tracemalloc.start()
+    for case in CASES:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = reply(*case)
+        total += tracemalloc.get_traced_memory()[1] - before
+        del result
+    tracemalloc.stop()
+    return total / len(CASES)
+
+
+def per_reply_seconds(reply: Reply, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for case in CASES:
+                reply(*case)
+        best = min(best, (time.perf_counter() - start) / (rounds * len(CASES)))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    mismatches = [
+        case for case in CASES
+        if legacy_reply(*case) != (lambda text, steps: (text, list(steps)))(*template_reply(*case))
+    ]
+    for case in mismatches:
+        print(f"MISMATCH for {case}")
+
+    print(f"{len(CASES)} cases")
+    print(f"{'':<10} {'peak bytes':>11} {'us/reply':>9}")
+    results = {}
+    for name, reply in (("legacy", legacy_reply), ("templates", template_reply)):
+        results[name] = (peak_bytes(reply), per_reply_seconds(reply, args.rounds))
+        print(f"{name:<10} {results[name][0]:>11.0f} {results[name][1] * 1e6:>9.2f}")
+    legacy, templates = results["legacy"], results["templates"]
+    print(f"allocated {1 - templates[0] / legacy[0]:.0%} less, {legacy[1] / templates[1]:.1f}x faster")
+
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} replies differ from the original")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""End-of-speech to first response chunk: HTTP streaming vs the WebSocket voice session
+
+A scripted caller "speaks" each utterance as speech recognition would report
+it: a growing interim transcript every `--word-interval` seconds, then
+`--endpointing` seconds of silence before the final result. The HTTP flow
+(what chat.html used to do) posts the final text to
+/api/call/process/stream; the WebSocket flow streams every interim result to
+/api/call/session so the server can start on the text early. Both are timed
+from the final result to the first response chunk, against a real uvicorn
+server and a fake LLM with `--prefill` seconds before its first token.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from typing import List
+
+import httpx
+import websockets
+
+from app import main as app_main
+from app.config import settings
+from app.executor import CallExecutor
+
+from .fakes import FakeStreamingLLM, running_server
+
+# Mix of turns the templates answer and turns that go to the LLM
+UTTERANCES = [
+    "Hello my name is Alex",
+    "How much does the visit cost with my insurance",
+    "I have had chest pain when climbing stairs",
+    "Can I pay the bill online or only at the front desk",
+    "I need to cancel my appointment for next week",
+]
+
+
+def summarize(name: str, latencies: List[float]) -> None:
+    ordered = sorted(latencies)
+    print(f"{name:<10} p50 {statistics.median(ordered) * 1000:7.1f} ms   "
+          f"p95 {ordered[int(len(ordered) * 0.95) - 1] * 1000:7.1f} ms   max {ordered[-1] * 1000:7.1f} ms")
+
+
+async def http_caller(base_url: str, caller: int, args) -> List[float]:
+    latencies = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for text in UTTERANCES:
+            words = text.split()
+            # Speech time passes the same way, the client just has nothing to send until the final result
+            await asyncio.sleep(args.word_interval * len(words) + args.endpointing)
+            start = time.perf_counter()
+            first = None
+            async with client.stream("POST", "/api/call/process/stream", json={
+                "patient_name": "Alex", "phone_number": f"+1555{caller:07d}",
+                "issue_type": "consultation", "description": text,
+            }) as response:
+                async for line in response.aiter_lines():
+                    if line and first is None and json.loads(line)["type"] == "chunk":
+                        first = time.perf_counter() - start
+            latencies.append(first)
+    return latencies
+
+
+async def websocket_caller(base_url: str, caller: int, args) -> List[float]:
+    latencies = []
+    async with websockets.connect(base_url.replace("http", "ws") + "/api/call/session") as ws:
+        await ws.send(json.dumps({"type": "start", "patient_name": "Alex",
+                                  "phone_number": f"+1555{1000000 + caller:07d}", "issue_type": "consultation"}))
+        assert json.loads(await ws.recv())["type"] == "ready"
+        for turn, text in enumerate(UTTERANCES, start=1):
+            words = text.split()
+            for count in range(1, len(words) + 1):
+                await asyncio.sleep(args.word_interval)
+                await ws.send(json.dumps({"type": "transcript", "text": " ".join(words[:count]), "final": False}))
+            await asyncio.sleep(args.endpointing)
+            start = time.perf_counter()
+            await ws.send(json.dumps({"type": "transcript", "text": text + ".", "final": True}))
+            first = None
+            while True:
+                event = json.loads(await ws.recv())
+                if event.get("turn") != turn:
+                    continue
+                if event["type"] == "chunk" and first is None:
+                    first = time.perf_counter() - start
+                if event["type"] in ("done", "error"):
+                    break
+            latencies.append(first)
+        await ws.send(json.dumps({"type": "end"}))
+    return latencies
+
+
+async def run(base_url: str, args) -> None:
+    http = await asyncio.gather(*(http_caller(base_url, caller, args) for caller in range(args.callers)))
+    ws = await asyncio.gather(*(websocket_caller(base_url, caller, args) for caller in range(args.callers)))
+    http_latencies = [value for values in http for value in values]
+    ws_latencies = [value for values in ws for value in values]
+    print(f"{args.callers} callers x {len(UTTERANCES)} turns, prefill {args.prefill * 1000:.0f} ms, "
+          f"endpointing {args.endpointing * 1000:.0f} ms")
+    summarize("http", http_latencies)
+    summarize("websocket", ws_latencies)
+    print(f"median improvement: {(statistics.median(http_latencies) - statistics.median(ws_latencies)) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callers", type=int, default=4)
+    parser.add_argument("--word-interval", type=float, default=0.12, help="seconds between interim results")
+    parser.add_argument("--endpointing", type=float, default=0.4, help="silence before the final result")
+    parser.add_argument("--prefill", type=float, default=0.3, help="fake LLM delay before its first token")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    settings.STREAM_LLM_RESPONSES = True
+    app_main.streaming_llm = FakeStreamingLLM(args.token_latency, first_token_latency=args.prefill)
+    with running_server(app_main.app) as base_url:
+        app_main.call_executor = CallExecutor.from_settings(settings)
+        asyncio.run(run(base_url, args))
+    voice = app_main.voice_stats.stats()
+    print(f"speculation hits {voice.get('speculation_hits', 0)}/{voice.get('turns', 0)} turns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Throughput scaling of app.server with WORKERS, plus a graceful-drain check
+
+Each escalated call burns `--cpu-ms` of CPU in a fake crew (a stand-in for a
+CPU-bound local model), so one worker is limited by the GIL and throughput
+should grow close to linearly with workers up to the number of cores.
+Sessions live in a shared SQLite store, so a caller's turns may land on any
+worker. After the scaling runs, SIGTERM is sent to the launcher while calls
+are in flight; every one of them must still complete.
+
+Exits non-zero when any call fails, or when on a multi-core host the speedup
+at N workers is below `--min-efficiency` times min(N, cores).
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from app import main as app_main
+from app.config import settings
+from app.context import ConversationContextManager
+from app.session_store import SQLSessionStore
+
+from .fakes import CpuBoundCrewPool, free_port, launch_server
+
+# Billing questions have no template, so they escalate to the (fake) crew
+DESCRIPTION = "How much does the visit cost with my insurance?"
+
+
+async def load(base_url: str, requests: int, concurrency: int, sessions: int) -> Dict[str, object]:
+    statuses: Dict[int, int] = {}
+    latencies: List[float] = []
+    remaining = [requests]
+
+    async def worker(client: httpx.AsyncClient, index: int) -> None:
+        turn = 0
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            turn += 1
+            start = time.perf_counter()
+            response = await client.post("/api/call/process", json={
+                "patient_name": "Alex", "phone_number": f"+1555{(index + turn) % sessions:07d}",
+                "issue_type": "billing", "description": DESCRIPTION,
+            })
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"rps": requests / elapsed, "p50_ms": latencies[len(latencies) // 2] * 1000, "statuses": statuses}
+
+
+async def drain_check(base_url: str, process: multiprocessing.Process, calls: int) -> Dict[int, int]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=calls)) as client:
+        pending = [asyncio.ensure_future(client.post("/api/call/process", json={
+            "patient_name": "Alex", "phone_number": f"+1666{index:07d}",
+            "issue_type": "billing", "description": DESCRIPTION,
+        })) for index in range(calls)]
+        await asyncio.sleep(0.05)
+        os.kill(process.pid, signal.SIGTERM)
+        results = await asyncio.gather(*pending, return_exceptions=True)
+    outcome: Dict[object, int] = {}
+    for result in results:
+        key = result.status_code if isinstance(result, httpx.Response) else type(result).__name__
+        outcome[key] = outcome.get(key, 0) + 1
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--cpu-ms", type=float, default=20)
+    parser.add_argument("--min-efficiency", type=float, default=0.6,
+                        help="required speedup per usable core on multi-core hosts")
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.LOG_LEVEL = "WARNING"
+    settings.USE_CREW = True
+    settings.MAX_CONCURRENT_CALLS = args.concurrency
+    app_main.crew_pool = CpuBoundCrewPool(args.cpu_ms / 1000)
+    app_main.response_cache.enabled = False
+    workdir = tempfile.mkdtemp(prefix="bench-workers-")
+    # Shared store, as SESSION_BACKEND=auto would pick for WORKERS > 1
+    app_main.session_store = SQLSessionStore(f"sqlite:///{workdir}/sessions.db")
+    app_main.context_manager = ConversationContextManager.from_settings(app_main.session_store)
+
+    print(f"{os.cpu_count()} CPUs, {args.cpu_ms:.0f} ms CPU per call, {args.requests} calls, "
+          f"concurrency {args.concurrency}")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'speedup':>8}  statuses")
+    failures: List[str] = []
+    cpus = os.cpu_count() or 1
+    baseline = None
+    workers = [int(value) for value in args.workers.split(",")]
+    for count in workers:
+        port = free_port()
+        process = launch_server(port, count)
+        try:
+            result = asyncio.run(load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.sessions))
+        finally:
+            os.kill(process.pid, signal.SIGTERM)
+            process.join()
+        baseline = baseline or result["rps"]
+        print(f"{count:>7} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} {result['rps'] / baseline:>7.2f}x  "
+              f"{result['statuses']}")
+        if result["statuses"] != {200: args.requests}:
+            failures.append(f"{count} workers: calls did not all return 200: {result['statuses']}")
+        usable = min(count, cpus)
+        if usable > 1 and result["rps"] / baseline < args.min_efficiency * usable:
+            failures.append(f"{count} workers on {cpus} CPUs scaled {result['rps'] / baseline:.2f}x, "
+                            f"below {args.min_efficiency * usable:.2f}x")
+
+    port = free_port()
+    process = launch_server(port, workers[-1])
+    outcome = asyncio.run(drain_check(f"http://127.0.0.1:{port}", process, args.concurrency))
+    process.join()
+    print(f"drain: SIGTERM with {args.concurrency} calls in flight -> {outcome}")
+    if outcome != {200: args.concurrency}:
+        failures.append(f"calls in flight during the drain did not all complete: {outcome}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
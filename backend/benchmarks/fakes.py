@@ -0,0 +1,231 @@
+"""Shared fakes and server helpers for the benchmarks"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import socket
+import threading
+import time
+from typing import Iterator, Optional
+
+DEFAULT_REPLY = (
+    "Thank you for calling. I understand you are having chest pain, which needs a cardiologist's evaluation. "
+    "I can book you with our cardiology specialist this week. "
+    "Would a morning or an afternoon appointment suit you better?"
+)
+
+
+class FakeStreamingLLM:
+    """Stands in for OllamaLLM: emits a fixed reply word by word with a per-token delay"""
+
+    def __init__(self, token_latency: float = 0.02, reply: str = DEFAULT_REPLY, first_token_latency: float = 0.0):
+        self.token_latency = token_latency
+        self.reply = reply
+        # Extra delay before the first token, like prompt evaluation in a real model
+        self.first_token_latency = first_token_latency
+
+    def _tokens(self):
+        words = self.reply.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield token
+
+    async def astream(self, prompt: str, model: Optional[str] = None):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            yield token
+
+    def invoke(self, prompt: str, model: Optional[str] = None) -> str:
+        time.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return self.reply
+
+
+class FakeCrewPool:
+    """
+    Stands in for CrewPool: each kickoff blocks its worker thread for
+    `latency` seconds, split into `steps` agent steps, and stops between
+    steps once `cancelled` is set
+    """
+
+    def __init__(self, latency: float = 1.0, steps: int = 10):
+        self.latency = latency
+        self.steps = steps
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        from app.agents.crew_pool import KickoffCancelled
+
+        for _ in range(self.steps):
+            if cancelled is not None and cancelled.is_set():
+                raise KickoffCancelled("Kickoff cancelled")
+            time.sleep(self.latency / self.steps)
+        return f"Thank you {call_data['patient_name']}. Let's book your appointment."
+
+
+class LLMCrewPool:
+    """Stands in for CrewPool with one whole-response call to an LLM fake, so crew and stream paths share a model"""
+
+    def __init__(self, llm: FakeStreamingLLM):
+        self.llm = llm
+        self.kickoffs = 0
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        self.kickoffs += 1
+        return self.llm.invoke(call_data["description"], call_data.get("model"))
+
+
+class FakeAgentCrewPool:
+    """
+    Stands in for CrewPool with agents that can be wrong for a call.
+
+    A kickoff takes `steps` agent steps of `step_latency` seconds and stops
+    between steps once `cancelled` is set, like CrewPool's step callback.
+    Calls carry the issue type that can really answer them in
+    "expected_issue_type"; any other agent gives up instead of answering.
+    """
+
+    def __init__(self, step_latency: float = 0.1, steps: int = 10):
+        from app.config import ISSUE_ROUTING
+
+        self.step_latency = step_latency
+        self.steps = steps
+        self._routing = ISSUE_ROUTING
+        self._lock = threading.Lock()
+        self.busy_seconds = 0.0
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        from app.agents.crew_pool import KickoffCancelled
+
+        started = time.perf_counter()
+        try:
+            for _ in range(self.steps):
+                if cancelled is not None and cancelled.is_set():
+                    raise KickoffCancelled("Kickoff cancelled")
+                time.sleep(self.step_latency)
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+        expected = call_data.get("expected_issue_type", call_data["issue_type"])
+        if self._routing.get(call_data["issue_type"]) != self._routing.get(expected):
+            return "I'm unable to help with that request."
+        return f"Thank you {call_data['patient_name']}. I can take care of your {expected} request today."
+
+
+class CpuBoundCrewPool:
+    """Stands in for CrewPool on a CPU-bound model: each kickoff spins for `cpu_seconds` holding the GIL"""
+
+    def __init__(self, cpu_seconds: float = 0.01):
+        self.cpu_seconds = cpu_seconds
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        deadline = time.thread_time() + self.cpu_seconds
+        while time.thread_time() < deadline:
+            pass
+        return f"Thank you {call_data['patient_name']}. Let's book your appointment."
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_server(app, port: int = 0):
+    """Serve an ASGI app with uvicorn on a background thread for the duration of the block"""
+    import uvicorn
+
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def launch_server(port: int, workers: int) -> multiprocessing.Process:
+    """Run app.server with `workers` forked workers in a child process; returns once /health answers"""
+    import httpx
+
+    from app.server import serve
+
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, kwargs={"host": "127.0.0.1", "port": port, "workers": workers}, daemon=False
+    )
+    process.start()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+class StubOllamaServer:
+    """Minimal Ollama look-alike that counts TCP connections and requests"""
+
+    def __init__(self, latency: float = 0.01, reply: str = DEFAULT_REPLY):
+        import json
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stub = self
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Buffer the response so headers and body leave in one segment
+            wbufsize = -1
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body: bytes, content_type: str = "application/json"):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.latency)
+                if payload.get("stream", True):
+                    lines = [json.dumps({"response": word + " ", "done": False}) for word in reply.split()]
+                    lines.append(json.dumps({"response": "", "done": True}))
+                    self._send(("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+                else:
+                    self._send(json.dumps({"response": reply if payload.get("prompt") else "", "done": True}).encode())
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "StubOllamaServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
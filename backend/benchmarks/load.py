@@ -0,0 +1,223 @@
+"""Load test for the FastAPI endpoints
+
+Drives /api/call/process, /api/services and /health either in-process
+through httpx's ASGI transport or over HTTP against a real uvicorn server
+(``--transport both`` runs each in turn). Callers are grouped into
+multi-turn sessions that share phone numbers, and turns the router sends to
+the crew hit a fake crew with ``--llm-latency`` seconds of blocking work.
+
+Reports p50/p95/p99 latency and throughput per endpoint, session store
+growth and CPU time per request. ``--output`` writes the same numbers as
+JSON so results can be diffed between releases, e.g.::
+
+    python -m benchmarks.load --concurrency 32 --requests 2000 --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from app import main as app_main
+from app.config import settings
+from app.executor import CallExecutor
+
+from .fakes import FakeCrewPool, running_server
+
+# Turns each simulated caller works through, in order
+CONVERSATION = [
+    "Hello, my name is Alex",
+    "I've been having chest pain when climbing stairs",
+    "I'd like to book an appointment with a cardiologist",
+    "How much does the visit cost with my insurance?",
+    "Morning works best for me",
+]
+
+# Relative weight of each endpoint in the request mix
+DEFAULT_MIX = {"process": 8, "services": 1, "health": 1}
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": len(ordered) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+class LoadRun:
+    def __init__(self, client: httpx.AsyncClient, sessions: int, mix: Dict[str, int], seed: int):
+        self.client = client
+        self.sessions = sessions
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.turns = [0] * sessions
+        self.latencies: Dict[str, List[float]] = {name: [] for name in mix}
+        self.errors: Dict[str, int] = {}
+
+    def _request(self):
+        endpoint = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if endpoint == "health":
+            return endpoint, self.client.get("/health")
+        if endpoint == "services":
+            return endpoint, self.client.get("/api/services")
+        session = self.rng.randrange(self.sessions)
+        turn = self.turns[session]
+        self.turns[session] += 1
+        return endpoint, self.client.post("/api/call/process", json={
+            "patient_name": f"Caller{session}",
+            "phone_number": f"+1555{session:07d}",
+            "issue_type": "consultation",
+            "description": CONVERSATION[turn % len(CONVERSATION)],
+        })
+
+    async def worker(self, remaining: List[int]) -> None:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            endpoint, request = self._request()
+            start = time.perf_counter()
+            try:
+                response = await request
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            self.latencies[endpoint].append(time.perf_counter() - start)
+            if status != 200:
+                key = f"{endpoint}:{status}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    async def run(self, total: int, concurrency: int) -> float:
+        remaining = [total]
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(remaining) for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+async def run_transport(transport: str, args) -> Dict[str, object]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if transport == "asgi":
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app),
+                                   base_url="http://bench", timeout=120)
+        return await measure(transport, client, args)
+    with running_server(app_main.app) as base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits)
+        return await measure(transport, client, args)
+
+
+async def measure(transport: str, client: httpx.AsyncClient, args) -> Dict[str, object]:
+    async with client:
+        # Warm up routes, pools and the event loop before measuring
+        await LoadRun(client, args.sessions, DEFAULT_MIX, args.seed).run(min(50, args.requests), 4)
+        for session in range(args.sessions):
+            app_main.session_store.clear(f"+1555{session:07d}")
+
+        store_before = app_main.session_store.stats()
+        cpu_before = time.process_time()
+        load = LoadRun(client, args.sessions, DEFAULT_MIX, args.seed)
+        elapsed = await load.run(args.requests, args.concurrency)
+        cpu = time.process_time() - cpu_before
+        store_after = app_main.session_store.stats()
+
+    all_latencies = [value for values in load.latencies.values() for value in values]
+    return {
+        "transport": transport,
+        "elapsed_s": elapsed,
+        "overall": summarize(all_latencies, elapsed),
+        "endpoints": {name: summarize(values, elapsed) for name, values in load.latencies.items()},
+        "errors": load.errors,
+        # Client and server share this process, so this is an upper bound on server CPU
+        "cpu_ms_per_request": cpu / len(all_latencies) * 1000 if all_latencies else 0.0,
+        "session_store": {
+            "before": store_before,
+            "after": store_after,
+            "bytes_growth": store_after["bytes"] - store_before["bytes"],
+        },
+        "router": app_main.call_router.stats(),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: Dict[str, object]) -> None:
+    print(f"\n[{result['transport']}] {result['overall']['requests']} requests in {result['elapsed_s']:.2f}s "
+          f"({result['overall']['throughput_rps']:.0f} req/s), {result['cpu_ms_per_request']:.2f} ms CPU/request")
+    print(f"{'endpoint':<10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in result["endpoints"].items():
+        print(f"{name:<10} {stats['requests']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    store = result["session_store"]
+    print(f"session store: {store['after']['sessions']} sessions, {store['after']['turns']} turns, "
+          f"+{store['bytes_growth']} bytes")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=("asgi", "uvicorn", "both"), default="both")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=50, help="distinct phone numbers sharing the load")
+    parser.add_argument("--llm-latency", type=float, default=0.05,
+                        help="seconds of blocking work per escalated (crew) turn; 0 disables the crew tier")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    # Per-call INFO logging (ours and httpx's request lines) would dominate the numbers
+    logging.getLogger("app").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.USE_CREW = args.llm_latency > 0
+    app_main.crew_pool = FakeCrewPool(args.llm_latency)
+    app_main.response_cache.enabled = False
+
+    results = []
+    for transport in (("asgi", "uvicorn") if args.transport == "both" else (args.transport,)):
+        # A fresh executor per run: its semaphore binds to the running event loop
+        app_main.call_executor = CallExecutor.from_settings(settings)
+        result = asyncio.run(run_transport(transport, args))
+        print_report(result)
+        results.append(result)
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "config": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
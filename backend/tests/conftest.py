@@ -0,0 +1,43 @@
+"""Fixtures shared by the API tests: fresh components swapped into app.main per test"""
+
+import httpx
+import pytest
+
+from app import main as app_main
+from app.config import settings
+from app.context import ConversationContextManager
+from app.executor import CallExecutor
+from app.idempotency import IdempotencyCache
+from app.recording import CallRecorder
+from app.session_store import InMemorySessionStore
+
+PAYLOAD = {
+    "patient_name": "Alex",
+    "phone_number": "+15550000001",
+    "issue_type": "consultation",
+    # Reschedules have no template, so with USE_CREW the turn goes to the crew
+    "description": "I need to reschedule, the chest pain is back when I climb stairs",
+}
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """app.main with its own session store, executor and idempotency cache; LLM components are left to the test"""
+    store = InMemorySessionStore()
+    monkeypatch.setattr(app_main, "session_store", store)
+    monkeypatch.setattr(app_main, "context_manager", ConversationContextManager.from_settings(store))
+    monkeypatch.setattr(app_main, "call_executor", CallExecutor(max_concurrent=2, max_queue=2, timeout=5))
+    monkeypatch.setattr(app_main, "idempotency_cache", IdempotencyCache())
+    monkeypatch.setattr(app_main, "call_recorder", CallRecorder(str(tmp_path / "recordings"), enabled=False))
+    monkeypatch.setattr(app_main, "crew_pool", None)
+    monkeypatch.setattr(app_main, "streaming_llm", None)
+    monkeypatch.setattr(app_main.response_cache, "enabled", False)
+    monkeypatch.setattr(settings, "USE_CREW", True)
+    monkeypatch.setattr(settings, "STREAM_LLM_RESPONSES", True)
+    monkeypatch.setattr(settings, "SPECULATIVE_AGENTS", False)
+    return app_main
+
+
+def client() -> httpx.AsyncClient:
+    """Async client calling the app in-process, so concurrent requests share one event loop"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://testserver", timeout=30)
@@ -0,0 +1,37 @@
+"""The cached context block tracks the session the store holds, even after it expired and started over"""
+
+import time
+
+import pytest
+
+from app.context import ConversationContextManager
+from app.session_store import InMemorySessionStore, SQLSessionStore
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, tmp_path):
+    if request.param == "sql":
+        return SQLSessionStore(f"sqlite:///{tmp_path}/sessions.db", idle_ttl=0.2)
+    return InMemorySessionStore(idle_ttl=0.2)
+
+
+def test_context_is_rebuilt_when_an_expired_session_starts_over(store):
+    context = ConversationContextManager(store)
+    store.append_turn("caller", {"user": "OLD question", "agent": "OLD answer"})
+    assert "OLD question" in context.render("caller")
+
+    time.sleep(0.3)
+    store.append_turn("caller", {"user": "NEW question", "agent": "NEW answer"})
+    rendered = context.render("caller")
+
+    assert "NEW question" in rendered
+    assert "OLD" not in rendered
+
+
+def test_context_picks_up_new_turns(store):
+    context = ConversationContextManager(store, window=2)
+    for index in range(4):
+        store.append_turn("caller", {"user": f"question {index}", "agent": f"answer {index}"})
+        rendered = context.render("caller")
+        assert f"question {index}" in rendered
+    assert "question 0" not in rendered.split("Previous messages in this conversation:")[-1]
@@ -0,0 +1,66 @@
+"""Admission control and timeouts for crew calls (CallExecutor behind /api/call/process)"""
+
+import asyncio
+import time
+
+from app.executor import CallExecutor
+from benchmarks.fakes import FakeCrewPool
+
+from .conftest import PAYLOAD, client
+
+
+async def post_calls(count: int):
+    async with client() as http:
+        return await asyncio.gather(*(
+            http.post("/api/call/process", json={**PAYLOAD, "phone_number": f"+1555000{index:04d}"})
+            for index in range(count)
+        ))
+
+
+def test_calls_beyond_slots_and_queue_get_503_with_retry_after(app):
+    app.crew_pool = FakeCrewPool(latency=0.3)
+    app.call_executor = CallExecutor(max_concurrent=2, max_queue=2, timeout=5)
+
+    responses = asyncio.run(post_calls(7))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] * 4 + [503] * 3
+    assert all(int(response.headers["Retry-After"]) >= 1 for response in responses if response.status_code == 503)
+    assert app.call_executor.stats()["rejected"] == 3
+
+
+def test_slow_call_gets_504_and_gives_its_slot_back(app):
+    app.crew_pool = FakeCrewPool(latency=2.0, steps=40)
+    app.call_executor = CallExecutor(max_concurrent=1, max_queue=0, timeout=0.1)
+
+    async def scenario():
+        responses = await post_calls(1)
+        answered = time.perf_counter()
+        # The kickoff is cancelled, so it stops at its next step instead of running out its latency
+        while app.call_executor.stats()["running"]:
+            await asyncio.sleep(0.01)
+        return responses[0], time.perf_counter() - answered
+
+    response, freed = asyncio.run(scenario())
+
+    assert response.status_code == 504
+    assert freed < 0.5
+    assert app.call_executor.stats()["timed_out"] == 1
+
+
+def test_streamed_turn_over_the_timeout_ends_with_an_error_event(app):
+    from benchmarks.fakes import FakeStreamingLLM
+
+    app.streaming_llm = FakeStreamingLLM(token_latency=0.05)
+    app.call_executor = CallExecutor(max_concurrent=1, max_queue=0, timeout=0.2)
+
+    async def scenario():
+        async with client() as http:
+            return await http.post("/api/call/process/stream", json=PAYLOAD)
+
+    response = asyncio.run(scenario())
+
+    lines = response.text.splitlines()
+    assert '"type": "chunk"' in lines[0]
+    assert lines[-1] == '{"type": "error", "detail": "Error processing call"}'
+    assert app.call_executor.stats()["running"] == 0
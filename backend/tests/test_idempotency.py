@@ -0,0 +1,143 @@
+"""Idempotency-Key handling: concurrent duplicates, conflicts and takeover from a crashed worker"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+
+from app.idempotency import IdempotencyCache
+from benchmarks.fakes import FakeCrewPool, FakeStreamingLLM
+
+from .conftest import PAYLOAD, client
+
+
+class CountingCrewPool(FakeCrewPool):
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.kickoffs = 0
+
+    def kickoff(self, call_data: dict, timeout=None, cancelled=None) -> str:
+        self.kickoffs += 1
+        return super().kickoff(call_data, timeout, cancelled)
+
+
+def test_concurrent_duplicates_run_the_call_once(app):
+    app.crew_pool = CountingCrewPool(latency=0.2)
+
+    async def submit():
+        async with client() as http:
+            return await asyncio.gather(*(
+                http.post("/api/call/process", json=PAYLOAD, headers={"Idempotency-Key": "retry-1"})
+                for _ in range(5)
+            ))
+
+    responses = asyncio.run(submit())
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert app.crew_pool.kickoffs == 1
+    assert len({response.json()["call_id"] for response in responses}) == 1
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 4
+
+
+def test_concurrent_duplicate_streams_replay_the_first(app):
+    app.streaming_llm = FakeStreamingLLM(token_latency=0.01)
+
+    async def submit():
+        async with client() as http:
+            return await asyncio.gather(*(
+                http.post("/api/call/process/stream", json=PAYLOAD, headers={"Idempotency-Key": "stream-1"})
+                for _ in range(3)
+            ))
+
+    responses = asyncio.run(submit())
+
+    assert len({response.text for response in responses}) == 1
+    assert '"type": "done"' in responses[0].text.splitlines()[-1]
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == 2
+    assert app.session_store.turn_count(PAYLOAD["phone_number"]) == 1
+
+
+def test_key_reused_for_another_request_is_rejected(app):
+    app.crew_pool = CountingCrewPool(latency=0)
+
+    async def submit():
+        async with client() as http:
+            first = await http.post("/api/call/process", json=PAYLOAD, headers={"Idempotency-Key": "reused"})
+            second = await http.post("/api/call/process", json={**PAYLOAD, "description": "Something else entirely"},
+                                     headers={"Idempotency-Key": "reused"})
+            return first, second
+
+    first, second = asyncio.run(submit())
+
+    assert first.status_code == 200
+    assert second.status_code == 422
+    assert app.crew_pool.kickoffs == 1
+
+
+def _hold_claim(db_url: str, lease: float, claimed, result) -> None:
+    """Worker that claims `key` and then either hangs (to be killed) or finishes with `result`"""
+
+    async def run():
+        cache = IdempotencyCache(db_url=db_url, lease=lease)
+        claim = await cache.begin("key", "fingerprint")
+        claimed.set()
+        if result is None:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(lease * 3)
+        cache.finish(claim, result)
+        # Let the background table write land before the process exits
+        await asyncio.gather(*cache._writes)
+
+    asyncio.run(run())
+
+
+def _start_worker(db_url: str, lease: float, result=None) -> multiprocessing.Process:
+    context = multiprocessing.get_context("fork")
+    claimed = context.Event()
+    process = context.Process(target=_hold_claim, args=(db_url, lease, claimed, result))
+    process.start()
+    assert claimed.wait(10)
+    return process
+
+
+def test_key_held_by_a_crashed_worker_is_taken_over(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/idempotency.db"
+    process = _start_worker(db_url, lease=0.5)
+    os.kill(process.pid, signal.SIGKILL)
+    process.join()
+
+    async def retry():
+        cache = IdempotencyCache(db_url=db_url, lease=0.5)
+
+        async def compute():
+            return {"ran": "here"}
+
+        outcome = await cache.run("key", "fingerprint", compute)
+        await asyncio.gather(*cache._writes)
+        return outcome, cache.stats()
+
+    (result, replayed), stats = asyncio.run(retry())
+
+    assert (result, replayed) == ({"ran": "here"}, False)
+    assert stats["takeovers"] == 1
+
+
+def test_key_held_by_a_live_worker_waits_for_its_result(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/idempotency.db"
+    # The worker holds the key for three leases, renewing it as it goes
+    process = _start_worker(db_url, lease=0.3, result={"ran": "there"})
+
+    async def retry():
+        cache = IdempotencyCache(db_url=db_url, lease=0.3)
+
+        async def compute():
+            return {"ran": "here"}
+
+        return await cache.run("key", "fingerprint", compute), cache.stats()
+
+    (result, replayed), stats = asyncio.run(retry())
+    process.join(10)
+
+    assert (result, replayed) == ({"ran": "there"}, True)
+    assert stats["takeovers"] == 0
+    assert stats["shared_waits"] == 1
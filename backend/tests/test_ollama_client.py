@@ -0,0 +1,117 @@
+"""Connection pooling, single flight and stream cleanup in the shared Ollama client"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+from app.llm_client import OllamaClient
+from app.streaming import stream_llm
+from benchmarks.fakes import DEFAULT_REPLY, StubOllamaServer
+
+
+def test_sequential_requests_reuse_one_connection():
+    with StubOllamaServer(latency=0) as stub:
+        client = OllamaClient(stub.url, "test-model")
+        replies = [client.generate(f"prompt {index}") for index in range(20)]
+        client.close()
+
+    assert replies == [DEFAULT_REPLY] * 20
+    assert stub.requests == 20
+    assert stub.connections == 1
+
+
+def test_identical_concurrent_generates_share_one_request():
+    with StubOllamaServer(latency=0.2) as stub:
+        client = OllamaClient(stub.url, "test-model")
+        with ThreadPoolExecutor(8) as pool:
+            replies = list(pool.map(lambda _: client.generate("same prompt"), range(8)))
+        client.close()
+
+    assert replies == [DEFAULT_REPLY] * 8
+    assert stub.requests == 1
+    assert client.stats()["coalesced"] == 7
+
+
+def test_stream_stopped_early_gives_back_its_slot():
+    with StubOllamaServer(latency=0) as stub:
+        client = OllamaClient(stub.url, "test-model", max_in_flight=1, timeout=5)
+
+        async def first_chunks():
+            chunks = []
+            for _ in range(3):
+                async with aclosing(stream_llm(client, "prompt")) as stream:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        break
+            return chunks
+
+        chunks = asyncio.run(first_chunks())
+        # With the slot still held by an abandoned stream this would block until the timeout
+        assert client._in_flight.acquire(timeout=1)
+        client._in_flight.release()
+        client.close()
+
+    assert chunks == [DEFAULT_REPLY.split()[0] + " "] * 3
+
+
+class ClosableLLM:
+    """
+    Synchronous streaming LLM that records when its iterator is closed. It
+    keeps every iterator it hands out, so garbage collection cannot close
+    one on stream_llm's behalf.
+    """
+
+    def __init__(self, token_latency: float):
+        self.token_latency = token_latency
+        self.closed = threading.Event()
+        self.streams = []
+
+    def stream(self, prompt: str, model=None):
+        stream = self._tokens()
+        self.streams.append(stream)
+        return stream
+
+    def _tokens(self):
+        try:
+            for index in range(100):
+                time.sleep(self.token_latency)
+                yield f"token{index} "
+        finally:
+            self.closed.set()
+
+
+def test_stream_stopped_early_closes_the_iterator():
+    llm = ClosableLLM(token_latency=0)
+
+    async def first_chunk():
+        async with aclosing(stream_llm(llm, "prompt")) as stream:
+            async for chunk in stream:
+                return chunk
+
+    assert asyncio.run(first_chunk()) == "token0 "
+    assert llm.closed.is_set()
+
+
+def test_cancelled_stream_is_closed_once_the_pending_chunk_returns():
+    llm = ClosableLLM(token_latency=0.1)
+
+    async def cancel_mid_chunk():
+        async def consume():
+            async for _ in stream_llm(llm, "prompt"):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.15)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The worker thread is still inside next(), so the iterator cannot be closed yet
+        closed_at_cancel = llm.closed.is_set()
+        await asyncio.sleep(0.2)
+        return closed_at_cancel
+
+    closed_at_cancel = asyncio.run(cancel_mid_chunk())
+
+    assert not closed_at_cancel
+    assert llm.closed.is_set()
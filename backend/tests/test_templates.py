@@ -0,0 +1,28 @@
+"""Template replies follow the booking cues in the caller's words, as the original keyword rules did"""
+
+import asyncio
+
+import pytest
+
+from .conftest import PAYLOAD, client
+
+
+@pytest.mark.parametrize("description, reply", [
+    ("I want to book an appointment, chest pain", "I understand you want to book a cardiology appointment"),
+    ("gut issues, how much does it cost to book?", "I'll help you book an appointment with our gastroenterologist"),
+    # "schedule" reads as a booking intent to the router, but is not a booking cue
+    ("Can you schedule me with a neurologist for my migraine?", "Neurological concerns should be evaluated"),
+    ("schedule a visit for my knee", "Bone and joint issues require professional"),
+    ("chest pain", "I understand you're experiencing heart-related"),
+])
+def test_template_reply_matches_the_booking_cues(app, monkeypatch, description, reply):
+    monkeypatch.setattr(app.settings, "USE_CREW", False)
+
+    async def submit():
+        async with client() as http:
+            return await http.post("/api/call/process", json={**PAYLOAD, "description": description})
+
+    response = asyncio.run(submit())
+
+    assert response.status_code == 200
+    assert response.json()["assistant_response"].startswith(f"Thank you {PAYLOAD['patient_name']}. {reply}")
@@ -0,0 +1,69 @@
+"""Multi-worker mode: graceful drain on SIGTERM and restart of a crashed worker"""
+
+import asyncio
+import os
+import signal
+import time
+
+import httpx
+import pytest
+
+from benchmarks.fakes import FakeCrewPool, free_port, launch_server
+
+from .conftest import PAYLOAD
+
+
+def worker_pids(pid: int):
+    with open(f"/proc/{pid}/task/{pid}/children") as fh:
+        return [int(child) for child in fh.read().split()]
+
+
+async def post_calls(base_url: str, count: int, first: int = 0):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        return await asyncio.gather(*(
+            http.post("/api/call/process", json={**PAYLOAD, "phone_number": f"+1555000{index:04d}"})
+            for index in range(first, first + count)
+        ), return_exceptions=True)
+
+
+def test_sigterm_lets_calls_in_flight_finish(app):
+    app.crew_pool = FakeCrewPool(latency=0.5)
+    port = free_port()
+    process = launch_server(port, workers=2)
+
+    async def drain():
+        pending = asyncio.ensure_future(post_calls(f"http://127.0.0.1:{port}", 6))
+        await asyncio.sleep(0.2)
+        os.kill(process.pid, signal.SIGTERM)
+        return await pending
+
+    try:
+        responses = asyncio.run(drain())
+    finally:
+        process.join(30)
+
+    assert [getattr(response, "status_code", response) for response in responses] == [200] * 6
+    assert process.exitcode == 0
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="needs /proc to find the workers")
+def test_crashed_worker_is_replaced(app):
+    app.crew_pool = FakeCrewPool(latency=0.05)
+    port = free_port()
+    process = launch_server(port, workers=2)
+    try:
+        crashed = worker_pids(process.pid)[0]
+        os.kill(crashed, signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            workers = worker_pids(process.pid)
+            if len(workers) == 2 and crashed not in workers:
+                break
+            time.sleep(0.05)
+        responses = asyncio.run(post_calls(f"http://127.0.0.1:{port}", 4))
+    finally:
+        os.kill(process.pid, signal.SIGTERM)
+        process.join(30)
+
+    assert len(workers) == 2 and crashed not in workers
+    assert [getattr(response, "status_code", response) for response in responses] == [200] * 4